@@ -9,13 +9,16 @@ import owlrobot
 import time
 import dabble
 import os
-import detect_object
+import tracepoints
 
  
 app = dabble.Dabble('hci-socket:0')
 #app = dabble.Dabble('usb:0')
 robot = owlrobot.Robot()
 
+# make sure motors are stopped at startup
+robot.motorSpeedDifferential(0, 0, 0)
+
 VISIBLE = False
 MAX_SPEED = 100.0  # rpm
 
@@ -26,27 +29,49 @@ toolMotorSpeed = 0
 circleButtonTime = 0
 nextCanTime = 0
 followMe = False
+lastSeq = None
 trackTimeout = 0
 oscillateLeft = True
 oscillateTimeout = 0
+wasConnected = False
 
 
 while True:
-    time.sleep(0.01)
-
-    if not dabble.connected: continue    
+    # wait for new joystick input (or timeout: periodic CAN update / follow-me)
+    state = app.waitInput(lastSeq, 0.01 if followMe else 0.1)
+    newInput = state.seq != lastSeq    # otherwise: stale input sample
+    lastSeq = state.seq
+    if newInput: tracepoints.point('pickup', state.seq)
+
+    if not followMe and 'detect_object' in globals():
+        # release camera/DNN when follow-me is idle (reacquired by captureVideoImage)
+        detect_object.releaseIdle()
+
+    if not state.connected:
+        if wasConnected:
+            # connection lost: stop motors (otherwise they keep the last commanded speed)
+            print('disconnected: stopping motors')
+            toolMotorSpeed = 0
+            robot.traceSeq = None
+            try:
+                robot.motorSpeedDifferential(0, 0, 0)
+            except:
+                print('error sending CAN')
+        wasConnected = False
+        continue
+    wasConnected = True
     #print('.', end="", flush=True)
 
-    if app.extraButton == 'select':
+    if state.extraButton == 'select':
         if time.time() > circleButtonTime:
             circleButtonTime = time.time() + 0.5
             followMe = not followMe
             print('followMe', followMe)
-    elif app.extraButton == 'triangle':
+    elif state.extraButton == 'triangle':
         MAX_SPEED = 300.0
-    elif app.extraButton == 'cross':
+    elif state.extraButton == 'cross':
         MAX_SPEED = 100.0
-    elif app.extraButton == 'circle':
+    elif state.extraButton == 'circle':
         if time.time() > circleButtonTime:
             circleButtonTime = time.time() + 0.5
             if toolMotorSpeed == 0:            
@@ -55,7 +80,7 @@ while True:
                 toolMotorSpeed = 300
             else: toolMotorSpeed = 0
             print('toolMotorSpeed', toolMotorSpeed)
-    elif app.extraButton == 'rectangle':
+    elif state.extraButton == 'rectangle':
         os.system('shutdown now')
 
 
@@ -63,9 +88,8 @@ while True:
     speedRight = 0
 
     if followMe: 
-        stopTime = time.time() + 0.1
-        while time.time() < stopTime:
-            img = detect_object.captureVideoImage()
+        import detect_object   # lazy import (OpenCV), only needed for follow-me
+        img = detect_object.captureVideoImage()   # newest frame (from capture thread)
         if not img is None:
             cx,cy,y = detect_object.detectObject(img, "person", VISIBLE)
             if y > 0 and cx > 0 and cy > 0:
@@ -97,39 +121,40 @@ while True:
 
     else:
 
-        if app.analogMode:
-            if app.y_value >= 0:
-                speedLeft = (app.y_value + app.x_value*0.3) * MAX_SPEED
-                speedRight = (app.y_value - app.x_value*0.3) * MAX_SPEED
+        if state.analogMode:
+            if state.y_value >= 0:
+                speedLeft = (state.y_value + state.x_value*0.3) * MAX_SPEED
+                speedRight = (state.y_value - state.x_value*0.3) * MAX_SPEED
             else:
-                speedLeft = (app.y_value - app.x_value*0.3) * MAX_SPEED
-                speedRight = (app.y_value + app.x_value*0.3) * MAX_SPEED            
+                speedLeft = (state.y_value - state.x_value*0.3) * MAX_SPEED
+                speedRight = (state.y_value + state.x_value*0.3) * MAX_SPEED            
 
         else:
-            if app.joystickButton == 'up':
+            if state.joystickButton == 'up':
                 speedLeft = MAX_SPEED
                 speedRight = MAX_SPEED
 
-            elif app.joystickButton == 'down':        
+            elif state.joystickButton == 'down':        
                 speedLeft = -MAX_SPEED
                 speedRight = -MAX_SPEED
 
-            elif app.joystickButton == 'right':        
+            elif state.joystickButton == 'right':        
                 speedLeft = MAX_SPEED
                 speedRight = -MAX_SPEED
 
-            elif app.joystickButton == 'left':        
+            elif state.joystickButton == 'left':        
                 speedLeft = -MAX_SPEED
                 speedRight = MAX_SPEED
 
-            elif app.joystickButton == 'released':
+            elif state.joystickButton == 'released':
                 speedLeft = 0
                 speedRight = 0
 
 
 
-    if time.time() > nextCanTime:
+    if newInput or time.time() > nextCanTime:
         nextCanTime = time.time() + 0.1
+        robot.traceSeq = state.seq if newInput else None
         try:
             robot.motorSpeedDifferential(-speedLeft, speedRight, toolMotorSpeed)
         except:
@@ -7,138 +7,239 @@
 
 import owlrobot as owl
 import time
-import dabble
 import os
 import config
-import detect_object
+import startup
+import telemetry
+import tracepoints
+import tracker
+import scheduler
 
 
-# create robot from database
-robot = config.createRobot()
-if robot is None: exit()
+VISIBLE = False
+PRELOAD_VISION = True    # load camera and DNN model at startup (in background), so follow-me starts instantly
+FOLLOW_CAN_INTERVAL = 1.0 / 30    # follow-me: CAN update interval (target estimate at camera rate)
+STARTUP_TIMEOUT = 10.0   # max. time until CAN and BLE are up (sec)
+
+
+# create robot (fails if the CAN bus cannot be opened)
+def startCan(robotId, profile):
+    robot = config.createRobotFromProfile(robotId, profile)
+    if robot is None or robot.bus is None: raise RuntimeError('CAN bus not available')
+    return robot
+
+# create dabble app interface (returns when advertising)
+def startBle(profile):
+    app = config.createDabbleFromProfile(profile)
+    app.advertising.wait()
+    if not app.error is None: raise app.error
+    return app
+
+def startVision():
+    import detect_worker   # lazy import (OpenCV), only needed for follow-me
+    detect_worker.preload()
+
+# camera open and DNN worker process loaded (and neither released after idle timeout)?
+def visionReady():
+    if not bringup.ready('vision'): return False
+    import detect_worker
+    return detect_worker.isModelLoaded() and detect_worker.isCameraOpen()
+
+
+if __name__ == "__main__":
+    # find robot in database
+    robotId, profile = config.findProfile()
+    if profile is None: exit()
+
+    # bring up CAN bus (robot), BLE GATT server and (optional) camera/DNN concurrently
+    bringup = startup.Bringup()
+    bringup.start('can', startCan, robotId, profile)
+    bringup.start('ble', startBle, profile)
+    if PRELOAD_VISION: bringup.start('vision', startVision)
+
+    # robot is drivable as soon as CAN + BLE are up
+    if not bringup.wait('can', 'ble', timeout=STARTUP_TIMEOUT): 
+        bringup.report()
+        exit()
+    robot = bringup.result('can')
+    app = bringup.result('ble')
+    bringup.report()
+
+    # make sure motors are stopped at startup
+    robot.setRobotSpeed(0, 0, 0)
+
+    # hot-reload speed limits on robot database changes
+    watcher = config.watchDatabase(robot)
+
+    # live robot state to the phone
+    publisher = telemetry.TelemetryPublisher(app)
+
+    # max. robot body speeds (translation / angular), taken from robot database unless selected by button
+    linearSpeedOverride = None
+
+
+    print('press CTRL+C to exit...')
+
+    toolMotorSpeed = 0
+    circleButtonTime = 0
+    nextCanTime = 0
+    followMe = False
+    lastSeq = None
+    trackTimeout = 0
+    oscillateLeft = True
+    oscillateTimeout = 0
+    sideways = False 
+    wasConnected = False
+    targetTracker = tracker.Tracker()    # follow-me: person tracks (corrected by detections)
+    detectionScheduler = scheduler.DetectionScheduler()    # follow-me: detection rate and crop region
+
+
+    while True:
+        # wait for new joystick input (or timeout: periodic CAN update / follow-me)
+        state = app.waitInput(lastSeq, 0.01 if followMe else 0.1)
+        newInput = state.seq != lastSeq    # otherwise: stale input sample
+        lastSeq = state.seq
+        if newInput: tracepoints.point('pickup', state.seq)
+
+        if not followMe and bringup.ready('vision'):
+            # release camera/DNN when follow-me is idle
+            import detect_worker
+            detect_worker.releaseIdle()
+
+        if not state.connected:
+            if wasConnected:
+                # connection lost: stop motors (otherwise they keep the last commanded speed)
+                print('disconnected: stopping motors')
+                toolMotorSpeed = 0
+                robot.traceSeq = None
+                robot.setRobotSpeed(0, 0, 0)
+                if not robot.toolMotor is None:
+                    robot.toolMotor.setSpeed(0)
+            wasConnected = False
+            continue
+        wasConnected = True
+        #print('.', end="", flush=True)
+
+        MAX_LINEAR_SPEED = robot.maxSpeedX if linearSpeedOverride is None else linearSpeedOverride  # m/s
+        MAX_ANGULAR_SPEED = robot.maxSpeedTheta  # rad/s 
+
+        if state.extraButton == 'select':
+            if time.time() > circleButtonTime:
+                circleButtonTime = time.time() + 0.5
+                followMe = not followMe
+                targetTracker = tracker.Tracker()
+                detectionScheduler = scheduler.DetectionScheduler()
+                print('followMe', followMe)
+        elif state.extraButton == 'start':
+            if time.time() > circleButtonTime:
+                circleButtonTime = time.time() + 0.5
+                sideways = not sideways
+                print('sideways', sideways)
+        elif state.extraButton == 'triangle':
+            linearSpeedOverride = 0.3
+        elif state.extraButton == 'cross':
+            linearSpeedOverride = 0.5
+        elif state.extraButton == 'circle':
+            if time.time() > circleButtonTime:
+                circleButtonTime = time.time() + 0.5
+                if toolMotorSpeed == 0:            
+                    toolMotorSpeed = 100
+                elif toolMotorSpeed == 100:
+                    toolMotorSpeed = 300
+                else: toolMotorSpeed = 0
+                print('toolMotorSpeed', toolMotorSpeed)
+        elif state.extraButton == 'rectangle':
+            os.system('shutdown now')
+
+
+        speedLinearX = 0      # forward speed
+        speedLinearY = 0      # sideward speed
+        speedAngular = 0      # rotational speed
+
+
+        if followMe and not visionReady():
+            # camera/DNN not loaded yet (or released): load in background, robot stands still meanwhile
+            if bringup.state('vision') in (None, startup.READY):
+                bringup.restart('vision', startVision)
+            elif bringup.state('vision') == startup.FAILED:
+                print('follow-me not available')
+                followMe = False
+
+        elif followMe: 
+            import detect_worker   # lazy import (OpenCV), only needed for follow-me
+            # detections (from detection process, rate and crop region by scheduler) correct the tracker, target estimate at each loop
+            interval, roi, size = detectionScheduler.plan(time.monotonic(), targetTracker, scheduler.moving(robot.odoVelX, robot.odoVelTheta))
+            detection = detect_worker.detect("person", interval, roi, size)
+            if not detection is None: 
+                targetTracker.update(detection.detections, detection.captureTime)
+                detectionScheduler.onResult(detection, time.monotonic())
+            target = targetTracker.target(time.monotonic())
+            if not target is None:
+                cx,cy,y = target.estimate(time.monotonic())
+                if y > 0 and cx > 0 and cy > 0:
+                    if cx > 0.6:
+                        # rotate right
+                        speedAngular = MAX_ANGULAR_SPEED 
+                        trackTimeout = time.time() + 2.0
+                    elif cx < 0.4:
+                        # rotate left
+                        speedAngular = -MAX_ANGULAR_SPEED
+                        trackTimeout = time.time() + 2.0
+                    elif y > 0.2 and y < 0.7:
+                        # forward
+                        speedLinearX = MAX_LINEAR_SPEED
+                        trackTimeout = time.time() + 2.0       
+            if time.time() > trackTimeout:
+                # oscillate
+                if time.time() > oscillateTimeout:
+                    oscillateTimeout = time.time() + 2.0       
+                    oscillateLeft = not oscillateLeft
+                speedAngular = MAX_ANGULAR_SPEED
+                if oscillateLeft: 
+                    speedAngular *= -1
 
-# create dabble app interface
-app = config.createDabble(robot)
 
+        else:
 
-VISIBLE = False
+            if state.analogMode:
+                # analog values are speeds (Sunray app sends m/s, rad/s): limit to the robot's max. speeds
+                speedLinearX = max(-MAX_LINEAR_SPEED, min(MAX_LINEAR_SPEED, state.y_value))
+                if sideways:
+                    speedLinearY = max(-MAX_LINEAR_SPEED, min(MAX_LINEAR_SPEED, state.x_value))
+                else:
+                    speedAngular = max(-MAX_ANGULAR_SPEED, min(MAX_ANGULAR_SPEED, state.x_value))
 
-# max. robot body speeds (translation / angular)
-MAX_LINEAR_SPEED = robot.maxSpeedX  # m/s
-MAX_ANGULAR_SPEED = robot.maxSpeedTheta  # rad/s 
-
-
-print('press CTRL+C to exit...')
-
-toolMotorSpeed = 0
-circleButtonTime = 0
-nextCanTime = 0
-followMe = False
-trackTimeout = 0
-oscillateLeft = True
-oscillateTimeout = 0
-sideways = False 
-
-
-while True:
-    time.sleep(0.01)
-
-    if not dabble.connected: continue    
-    #print('.', end="", flush=True)
-
-    if app.extraButton == 'select':
-        if time.time() > circleButtonTime:
-            circleButtonTime = time.time() + 0.5
-            followMe = not followMe
-            print('followMe', followMe)
-    elif app.extraButton == 'start':
-        if time.time() > circleButtonTime:
-            circleButtonTime = time.time() + 0.5
-            sideways = not sideways
-            print('sideways', sideways)
-    elif app.extraButton == 'triangle':
-        MAX_LINEAR_SPEED = 0.3
-    elif app.extraButton == 'cross':
-        MAX_LINEAR_SPEED = 0.5
-    elif app.extraButton == 'circle':
-        if time.time() > circleButtonTime:
-            circleButtonTime = time.time() + 0.5
-            if toolMotorSpeed == 0:            
-                toolMotorSpeed = 100
-            elif toolMotorSpeed == 100:
-                toolMotorSpeed = 300
-            else: toolMotorSpeed = 0
-            print('toolMotorSpeed', toolMotorSpeed)
-    elif app.extraButton == 'rectangle':
-        os.system('shutdown now')
-
-
-    speedLinearX = 0      # forward speed
-    speedLinearY = 0      # sideward speed
-    speedAngular = 0      # rotational speed
-
-
-    if followMe: 
-        stopTime = time.time() + 0.1
-        while time.time() < stopTime:
-            img = detect_object.captureVideoImage()
-        if not img is None:
-            cx,cy,y = detect_object.detectObject(img, "person", VISIBLE)
-            if y > 0 and cx > 0 and cy > 0:
-                if cx > 0.6:
-                    # rotate right
-                    speedAngular = MAX_ANGULAR_SPEED 
-                    trackTimeout = time.time() + 2.0
-                elif cx < 0.4:
-                    # rotate left
-                    speedAngular = -MAX_ANGULAR_SPEED
-                    trackTimeout = time.time() + 2.0
-                elif y > 0.2 and y < 0.7:
-                    # forward
-                    speedLinearX = MAX_LINEAR_SPEED
-                    trackTimeout = time.time() + 2.0       
-        if time.time() > trackTimeout:
-            # oscillate
-            if time.time() > oscillateTimeout:
-                oscillateTimeout = time.time() + 2.0       
-                oscillateLeft = not oscillateLeft
-            speedAngular = MAX_ANGULAR_SPEED
-            if oscillateLeft: 
-                speedAngular *= -1
-                
-
-    else:
-
-        if app.analogMode:
-            speedLinearX = app.y_value
-            if sideways:
-                speedLinearY = app.x_value 
             else:
-                speedAngular = app.x_value
+                if state.joystickButton == 'up':
+                    speedLinearX = MAX_LINEAR_SPEED
 
-        else:
-            if app.joystickButton == 'up':
-                speedLinearX = MAX_LINEAR_SPEED
+                elif state.joystickButton == 'down':        
+                    speedLinearX = -MAX_LINEAR_SPEED
 
-            elif app.joystickButton == 'down':        
-                speedLinearX = -MAX_LINEAR_SPEED
+                elif state.joystickButton == 'right':        
+                    speedAngular = -MAX_ANGULAR_SPEED
 
-            elif app.joystickButton == 'right':        
-                speedAngular = -MAX_ANGULAR_SPEED
+                elif state.joystickButton == 'left':        
+                    speedAngular = MAX_ANGULAR_SPEED
 
-            elif app.joystickButton == 'left':        
-                speedAngular = MAX_ANGULAR_SPEED
+                elif state.joystickButton == 'released':
+                    pass
 
-            elif app.joystickButton == 'released':
-                pass
 
+        if newInput or time.time() > nextCanTime:
+            nextCanTime = time.time() + (FOLLOW_CAN_INTERVAL if followMe else 0.1)
+            robot.traceSeq = state.seq if newInput else None
+            robot.setRobotSpeed(speedLinearX, speedLinearY, speedAngular)
+            if not robot.toolMotor is None:
+                robot.toolMotor.setSpeed(toolMotorSpeed)
+            robot.requestMotorStatus()
+            robot.forwardKinematics()
+            status = { 'odometry': (robot.odoX, robot.odoY, robot.odoTheta),
+                'velocity': (robot.odoVelX, robot.odoVelY, robot.odoVelTheta),
+                'battery': robot.batteryVoltage(), 'motorErrors': robot.motorErrors(), 'followMe': followMe }
+            publisher.update(**status)
+            app.updateStatus(**status)
 
-    if time.time() > nextCanTime:
-        nextCanTime = time.time() + 0.1
-        robot.setRobotSpeed(speedLinearX, speedLinearY, speedAngular)
-        if not robot.toolMotor is None:
-            robot.toolMotor.setSpeed(toolMotorSpeed)
-        
 
 
 
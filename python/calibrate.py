@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - wheel geometry calibration from recorded drive sessions
+# fits effective wheel radius and track width/length (wheelDiameter, wheelToBodyCenterX/Y)
+# by least squares over a whole recorded log (vectorized with NumPy)
+#
+# usage: python calibrate.py <robot-id> <telemetry.csv> [segments.csv]
+#    robot-id: robot database ID (e.g. 1c:1b:b5:d7:48:c2), used for robot type and nominal values
+#
+# telemetry CSV (header line with column names, one row per sample):
+#    time                                              (sec)
+#    left, right                                       (diff drive)  measured wheel speeds (rad/s)
+#    leftFront, rightFront, leftBack, rightBack        (mecanum)     measured wheel speeds (rad/s)
+#    gtX, gtY, gtTheta   (optional)  ground-truth pose (m, m, rad), empty or 'nan' where not available
+#
+# segments CSV (optional, e.g. loop closures or tape-measured runs):
+#    startTime, endTime, dx, dy, dtheta    pose change in robot frame at startTime (m, m, rad)
+#    (loop closure: robot returned to its start pose: 0, 0, 0  or  0, 0, +-2*pi*turns)
+
+# model (wheel speeds o (rad/s), wheel radius R):
+#    diff drive:  vx = R * (oL + oR) / 2             oz = R / (2 * wheelToBodyCenterY) * (oR - oL)
+#    mecanum:     vx = R * (o1 + o2 + o3 + o4) / 4   vy = R * (-o1 + o2 + o3 - o4) / 4
+#                 oz = R / (4 * (l1 + l2)) * (-o1 + o2 - o3 + o4)
+# both have the form  vx = R * s,  vy = R * q,  oz = c * d  =>  the heading change of a segment is linear in c,
+# the translation (given the heading) is linear in R: two scalar least-squares problems over all segments.
+# for mecanum only the sum l1 + l2 is observable, the nominal ratio l1 : l2 is kept.
+
+import json
+import sys
+import time
+import numpy as np
+
+import config
+
+
+DIFF_DRIVE_WHEELS = ('left', 'right')
+MECANUM_WHEELS = ('leftFront', 'rightFront', 'leftBack', 'rightBack')
+MIN_EXCITATION = 1e-6    # min. fit denominator / heading gain (below: segments contain no heading/translation information)
+
+
+# read telemetry log into dict of column arrays
+def readLog(fileName):
+    with open(fileName, 'r') as f:
+        names = [name.strip() for name in f.readline().split(',')]
+        data = np.loadtxt(f, delimiter=',', ndmin=2,
+            converters=lambda s: float(s) if s.strip() else np.nan)
+    return { name: data[:, i] for i, name in enumerate(names) }
+
+
+# wheel speed combinations of the model (see above):  returns s, q, d
+def wheelTerms(robotType, log):
+    if robotType == config.ROBOT_TYPE_DIFF_DRIVE:
+        oL, oR = (log[name] for name in DIFF_DRIVE_WHEELS)
+        return (oL + oR) / 2.0, np.zeros_like(oL), oR - oL
+    o1, o2, o3, o4 = (log[name] for name in MECANUM_WHEELS)
+    return (o1 + o2 + o3 + o4) / 4.0, (-o1 + o2 + o3 - o4) / 4.0, -o1 + o2 - o3 + o4
+
+
+# build segments from ground-truth samples at least 'minDuration' seconds apart
+#    returns array of rows: startIdx, endIdx, dx, dy, dtheta   (pose change in robot frame at start)
+def groundTruthSegments(log, minDuration = 1.0):
+    if not 'gtX' in log: return np.zeros((0, 5))
+    t = log['time']
+    anchors = np.flatnonzero(np.isfinite(log['gtX']) & np.isfinite(log['gtY']) & np.isfinite(log['gtTheta']))
+    if len(anchors) < 2: return np.zeros((0, 5))
+    gtTheta = np.unwrap(log['gtTheta'][anchors])
+    # pick anchors greedily, each at least minDuration after the previous one
+    picked = [0]
+    while True:
+        nxt = np.searchsorted(t[anchors], t[anchors[picked[-1]]] + minDuration)
+        if nxt >= len(anchors): break
+        picked.append(nxt)
+    picked = np.array(picked)
+    start = picked[:-1]
+    end = picked[1:]
+    dxWorld = log['gtX'][anchors[end]] - log['gtX'][anchors[start]]
+    dyWorld = log['gtY'][anchors[end]] - log['gtY'][anchors[start]]
+    c = np.cos(gtTheta[start])
+    s = np.sin(gtTheta[start])
+    return np.column_stack((anchors[start], anchors[end],
+        c * dxWorld + s * dyWorld, -s * dxWorld + c * dyWorld, gtTheta[end] - gtTheta[start]))
+
+
+# read segments file (times are mapped to log sample indices)
+def readSegments(fileName, log):
+    rows = np.loadtxt(fileName, delimiter=',', skiprows=1, ndmin=2)
+    t = log['time']
+    return np.column_stack((np.searchsorted(t, rows[:, 0]), np.searchsorted(t, rows[:, 1]), rows[:, 2:5]))
+
+
+# fit wheel geometry
+#    cfg: nominal robot database entry
+#    returns corrected copy of cfg and fit statistics
+def calibrate(robotType, log, segments, cfg):
+    if len(segments) == 0: raise ValueError('no segments (ground truth or loop closures) found')
+    t = log['time']
+    dt = np.diff(t, append=t[-1])   # sample i is held until sample i+1
+    s, q, d = wheelTerms(robotType, log)
+    startIdx = segments[:, 0].astype(int)
+    endIdx = segments[:, 1].astype(int)
+    dx, dy, dtheta = segments[:, 2], segments[:, 3], segments[:, 4]
+
+    # heading:  dtheta_k = c * sum(d * dt)   over segment k
+    cumD = np.concatenate(([0.0], np.cumsum(d * dt)))
+    headingTerm = cumD[endIdx] - cumD[startIdx]
+    norm = np.dot(headingTerm, headingTerm)
+    if not norm > MIN_EXCITATION: raise ValueError('segments do not excite heading (no turns)')
+    c = np.dot(headingTerm, dtheta) / norm
+    if not abs(c) > MIN_EXCITATION: raise ValueError('segments do not excite heading (no measured heading change)')
+
+    # translation: rotate body velocity terms into the segment start frame using the fitted heading
+    #    heading of sample i in segment k:  c * (cumD[i] - cumD[start_k])
+    segmentId = np.full(len(t), -1)
+    for k in range(len(segments)):   # mark sample ranges (segments may overlap in a segments file: last wins)
+        segmentId[startIdx[k]:endIdx[k]] = k
+    inSegment = segmentId >= 0
+    ids = segmentId[inSegment]
+    heading = c * (cumD[:-1][inSegment] - cumD[startIdx[ids]])
+    ch = np.cos(heading)
+    sh = np.sin(heading)
+    w = dt[inSegment]
+    termX = np.bincount(ids, weights=(s[inSegment] * ch - q[inSegment] * sh) * w, minlength=len(segments))
+    termY = np.bincount(ids, weights=(s[inSegment] * sh + q[inSegment] * ch) * w, minlength=len(segments))
+    A = np.concatenate((termX, termY))
+    b = np.concatenate((dx, dy))
+    norm = np.dot(A, A)
+    if not norm > MIN_EXCITATION: raise ValueError('segments do not excite translation (no driving)')
+    R = np.dot(A, b) / norm
+
+    result = dict(cfg)
+    result['wheelDiameter'] = round(float(2.0 * R), 5)
+    if robotType == config.ROBOT_TYPE_DIFF_DRIVE:
+        result['wheelToBodyCenterY'] = round(float(R / (2.0 * c)), 5)
+    else:
+        l12 = R / (4.0 * c)
+        nominal = cfg['wheelToBodyCenterX'] + cfg['wheelToBodyCenterY']
+        result['wheelToBodyCenterX'] = round(float(l12 * cfg['wheelToBodyCenterX'] / nominal), 5)
+        result['wheelToBodyCenterY'] = round(float(l12 * cfg['wheelToBodyCenterY'] / nominal), 5)
+
+    stats = {
+        'segments': len(segments),
+        'headingRmse': float(np.sqrt(np.mean((c * headingTerm - dtheta) ** 2))),        # rad
+        'translationRmse': float(np.sqrt(np.mean((R * A - b) ** 2))),                   # m
+    }
+    return result, stats
+
+
+# print corrected config entry (robot database format, see robots.json)
+def printConfigEntry(robotId, cfg):
+    entry = dict(cfg)
+    entry['type'] = [name for name, value in config.ROBOT_TYPES.items() if value == cfg['type']][0]
+    print('"' + config.formatRobotId(robotId) + '": ' + json.dumps(entry, indent=4))
+
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print('usage: calibrate.py <robot-id> <telemetry.csv> [segments.csv]')
+        exit()
+
+    robotId = config.parseRobotId(sys.argv[1])
+    if not robotId in config.ROBOTS:
+        print('error finding robot in database!')
+        exit()
+    cfg = config.ROBOTS[robotId]
+
+    startTime = time.time()
+    log = readLog(sys.argv[2])
+    print('samples:', len(log['time']), 'duration:', round(log['time'][-1] - log['time'][0]), 'sec')
+    segments = groundTruthSegments(log)
+    if len(sys.argv) > 3:
+        segments = np.concatenate((segments, readSegments(sys.argv[3], log)))
+
+    result, stats = calibrate(cfg['type'], log, segments, cfg)
+    print('fit:', stats, 'time:', round(time.time() - startTime, 2), 'sec')
+    for key in ('wheelDiameter', 'wheelToBodyCenterX', 'wheelToBodyCenterY'):
+        if key in cfg: print(key, cfg[key], '=>', result[key])
+    print('corrected config entry:')
+    printConfigEntry(robotId, result)
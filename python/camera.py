@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - background camera frame grabber
+#
+# a capture thread reads continuously from cv2.VideoCapture into a pool of three preallocated buffers
+# (triple buffering: one being written by the thread, one holding the latest frame, one held by the consumer).
+# only the newest frame is published, with its capture time (time.monotonic) and a frame sequence number.
+# consumers get the newest frame without waiting for the camera (or wait for the next new one) and never
+# get a frame they have already seen. Frames are not copied: a returned frame stays valid until the
+# consumer's next latest()/wait() call.
+#
+# several cameras (e.g. front and rear): CameraSet, one grabber per camera configuration (see config.py 'cameras')
+#
+# run 'python camera.py' to measure frame rate, frame age and consumer access time
+
+
+import collections
+import threading
+import time
+import cv2
+import numpy as np
+
+
+class FrameGrabber():
+    def __init__(self, device = 0, width = 640, height = 480, fps = 30, fourcc = 'MJPG', name = None):
+        self.name = str(device) if name is None else name
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc
+        self.cap = None
+        self.buffers = [np.zeros((height, width, 3), np.uint8) for i in range(3)]
+        self.times = [0.0] * 3
+        self.seqs = [0] * 3
+        self.writeIdx = 0
+        self.latestIdx = 1
+        self.readIdx = 2
+        self.seq = 0                        # sequence number of latest frame (0: none yet)
+        self.frameReady = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.readErrors = 0
+
+    # open camera and start capture thread, returns False if the camera cannot be opened
+    def start(self):
+        if self.running: return True
+        self.cap = cv2.VideoCapture(self.device)
+        if not self.cap.isOpened():
+            self.cap = None
+            return False
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)     # driver queue: keep as few old frames as possible
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if not self.running: return
+        self.running = False
+        self.thread.join()
+        self.cap.release()
+        self.cap = None
+        with self.frameReady:
+            self.frameReady.notify_all()
+
+    def isRunning(self):
+        return self.running
+
+    def run(self):
+        while self.running:
+            ret, frame = self.cap.read(self.buffers[self.writeIdx])
+            captureTime = time.monotonic()
+            if not ret:
+                self.readErrors += 1
+                time.sleep(0.01)
+                continue
+            with self.frameReady:
+                self.buffers[self.writeIdx] = frame     # same buffer unless the camera delivered another size
+                self.times[self.writeIdx] = captureTime
+                self.seq += 1
+                self.seqs[self.writeIdx] = self.seq
+                self.writeIdx, self.latestIdx = self.latestIdx, self.writeIdx
+                self.frameReady.notify_all()
+
+    # take latest frame (caller holds frameReady)
+    def take(self):
+        self.readIdx, self.latestIdx = self.latestIdx, self.readIdx
+        return self.buffers[self.readIdx], self.times[self.readIdx], self.seqs[self.readIdx]
+
+    # latest buffer holds a frame newer than lastSeq (caller holds frameReady)
+    # after take() it holds the frame read before (older), so compare its own sequence number, not self.seq
+    def isNewer(self, lastSeq):
+        return self.seqs[self.latestIdx] > lastSeq
+
+    # newest frame if newer than lastSeq:  (frame, captureTime, seq)  or None
+    def latest(self, lastSeq = 0):
+        with self.frameReady:
+            if not self.isNewer(lastSeq): return None
+            return self.take()
+
+    # wait for frame newer than lastSeq (or timeout):  (frame, captureTime, seq)  or None
+    def wait(self, lastSeq = 0, timeout = 1.0):
+        with self.frameReady:
+            if not self.isNewer(lastSeq):
+                self.frameReady.wait_for(lambda: self.isNewer(lastSeq) or not self.running, timeout)
+                if not self.isNewer(lastSeq): return None
+            return self.take()
+
+
+
+# grabbers of several cameras, configs: camera configurations (name, device, width, height, fps, fourcc)
+class CameraSet():
+    def __init__(self, configs):
+        self.grabbers = collections.OrderedDict((cfg['name'], FrameGrabber(cfg['device'], cfg['width'], cfg['height'],
+            cfg['fps'], cfg['fourcc'], cfg['name'])) for cfg in configs)
+        self.lastSeqs = dict((name, 0) for name in self.grabbers)
+
+    # start all cameras, returns names of cameras that could not be opened
+    def start(self):
+        return [name for name, grabber in self.grabbers.items() if not grabber.start()]
+
+    def stop(self):
+        for grabber in self.grabbers.values(): grabber.stop()
+
+    def isRunning(self):
+        return any(grabber.isRunning() for grabber in self.grabbers.values())
+
+    # newest frame of each running camera not returned yet (waits up to 'timeout' per camera for a new one):
+    #    name => (frame, captureTime, seq)
+    def latest(self, timeout = 0):
+        frames = collections.OrderedDict()
+        for name, grabber in self.grabbers.items():
+            if not grabber.isRunning(): continue
+            result = grabber.wait(self.lastSeqs[name], timeout) if timeout > 0 else grabber.latest(self.lastSeqs[name])
+            if result is None: continue
+            self.lastSeqs[name] = result[2]
+            frames[name] = result
+        return frames
+
+
+
+if __name__ == "__main__":
+    grabber = FrameGrabber()
+    if not grabber.start():
+        print('error opening camera')
+        exit()
+    result = grabber.wait(0, 5.0)
+    seq = result[2]
+    frames = 0
+    ages = []
+    accessTimes = []
+    startTime = time.monotonic()
+    while time.monotonic() < startTime + 10.0:
+        t = time.perf_counter()
+        result = grabber.wait(seq)
+        accessTimes.append(time.perf_counter() - t)
+        if result is None: continue
+        frame, captureTime, seq = result
+        ages.append(time.monotonic() - captureTime)
+        frames += 1
+        time.sleep(0.05)    # slow consumer (e.g. DNN): must still get the newest frame
+        t = time.perf_counter()
+        grabber.latest(seq)
+        accessTimes.append(time.perf_counter() - t)
+    grabber.stop()
+    ages.sort()
+    accessTimes.sort()
+    print('consumed frames/s:', round(frames / 10.0, 1), 'camera frames/s:', round(seq / 10.0, 1), 'read errors:', grabber.readErrors)
+    print('frame age at pickup (ms): p50', round(ages[len(ages) // 2] * 1000.0, 1), 'max', round(ages[-1] * 1000.0, 1))
+    print('latest() access (us): p50', round(accessTimes[len(accessTimes) // 2] * 1e6, 1))
@@ -3,19 +3,19 @@
 # owlRobotics robot platform config 
 # robot database and robot object factory
 
+import asyncio
 import diffdrive
 import mecanum
 import uuid
 import platform
-import dabble
+import json
+import math
+import os
+import threading
+import types
 import owlrobot as owl
 
 
-# robot IDs (WiFi MAC address):
-ROBOT_ID_DIFF_DRIVE    = 0x1c1bb5d748c1
-ROBOT_ID_MECANUM       = 0x1c1bb5d748c2 
-ROBOT_ID_ALEX          = 0x1c1bb5d748c6
-
 # owlRobot types
 ROBOT_TYPE_DIFF_DRIVE = 0
 ROBOT_TYPE_MECANUM    = 1
@@ -33,74 +33,230 @@ ROBOT_TYPE_MECANUM    = 1
 #
 
 
-# define robot type, wheel-to-center-x distance (m), and wheel-to-center-y distance (m), wheel diameter (m), max speed (m/s) 
-        
-ROBOTS = {
-    ROBOT_ID_DIFF_DRIVE: { 
-        "name": "owlRobot (DiffDrive)",
-        "type": ROBOT_TYPE_DIFF_DRIVE,
-        "bluetoothAddr": "F0:F1:F2:F3:F4:F5",
-        "bluetoothUSB": False,
-        "wheelToBodyCenterY": 0.2,
-        "wheelDiameter": 0.15,
-        "maxSpeedX": 0.4,
-        "maxSpeedY": 0.4,
-        "maxSpeedTheta": 0.2,
-        "toolMotor": True,
-    },
-
-    ROBOT_ID_ALEX: { 
-        "name": "owlRobot (Alex)",
-        "type": ROBOT_TYPE_DIFF_DRIVE,
-        "bluetoothAddr": "F0:F1:F2:F3:F4:F4",        
-        "bluetoothUSB": True, 
-        "wheelToBodyCenterY": 0.2,
-        "wheelDiameter": 0.15,
-        "maxSpeedX": 0.4,        
-        "maxSpeedY": 0.4,
-        "maxSpeedTheta": 0.2,
-        "toolMotor": True,
-    },
-
-    ROBOT_ID_MECANUM: { 
-        "name": "owlRobot (Mecanum)",
-        "type": ROBOT_TYPE_MECANUM,
-        "bluetoothAddr": "F0:F1:F2:F3:F4:F3",        
-        "bluetoothUSB": False, 
-        "wheelToBodyCenterX": 0.25,
-        "wheelToBodyCenterY": 0.25,
-        "wheelDiameter": 0.15,
-        "maxSpeedX": 0.4,      
-        "maxSpeedY": 0.4,
-        "maxSpeedTheta": 0.2,  
-        "toolMotor": False, 
-    },
+# robot database (JSON file, see robots.json):
+#   "defaults": values used for all robots (unless given in the robot entry)
+#   "robots":   robot entries by robot ID (WiFi MAC address, e.g. "1c:1b:b5:d7:48:c1")
+# the file is parsed once into an immutable profile cache (robot ID => read-only profile mapping),
+# a DatabaseWatcher can hot-reload 'safe' fields (speed limits) into a running robot
+
+ROBOTS_FILE = os.environ.get('OWL_ROBOTS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'robots.json'))
+
+ROBOT_TYPES = {
+    'diffdrive': ROBOT_TYPE_DIFF_DRIVE,
+    'mecanum':   ROBOT_TYPE_MECANUM,
+}
+
+# profile fields:  name => (value type(s), required for robot types)
+PROFILE_FIELDS = {
+    'name':               (str,          (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'type':               (int,          (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'bluetoothAddr':      (str,          (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'bluetoothUSB':       (bool,         (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'bluetoothApp':       (str,          (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'wheelToBodyCenterX': ((int, float), (ROBOT_TYPE_MECANUM,)),
+    'wheelToBodyCenterY': ((int, float), (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'wheelDiameter':      ((int, float), (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'maxSpeedX':          ((int, float), (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'maxSpeedY':          ((int, float), (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'maxSpeedTheta':      ((int, float), (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'toolMotor':          (bool,         (ROBOT_TYPE_DIFF_DRIVE, ROBOT_TYPE_MECANUM)),
+    'cameras':            (list,         ()),
+}
 
+# camera configuration fields ('cameras' list, see camera.CameraSet):  name => (value type(s), default)
+CAMERA_FIELDS = {
+    'name':   (str,        None),      # e.g. 'front', 'rear'
+    'device': ((int, str), 0),         # video device index or path
+    'width':  (int,        640),
+    'height': (int,        480),
+    'fps':    (int,        30),
+    'fourcc': (str,        'MJPG'),
 }
 
+# phone app protocols ('bluetoothApp' field, see dabble.py)
+BLUETOOTH_APPS = ('dabble', 'sunray')
+
+# fields that can be changed in a running robot (hot reload)
+HOT_RELOAD_FIELDS = ('maxSpeedX', 'maxSpeedY', 'maxSpeedTheta')
+
+
+# parse robot ID (WiFi MAC):  "1c:1b:b5:d7:48:c1" or "0x1c1bb5d748c1"
+def parseRobotId(text):
+    text = text.strip().lower()
+    if text.startswith('0x'): return int(text, 16)
+    parts = text.replace('-', ':').split(':')
+    if len(parts) != 6 or any(len(p) != 2 for p in parts): raise ValueError('invalid robot ID: ' + text)
+    return int(''.join(parts), 16)
+
+
+def formatRobotId(robotId):
+    return ':'.join('%02x' % ((robotId >> shift) & 0xff) for shift in range(40, -8, -8))
+
+
+# validate robot entry (merged with defaults) and convert into read-only profile
+def validateProfile(robotId, entry):
+    entry = dict(entry)
+    if not isinstance(entry.get('type'), str) or not entry['type'] in ROBOT_TYPES: raise ValueError(formatRobotId(robotId) + ': invalid robot type: ' + str(entry.get('type')))
+    entry['type'] = ROBOT_TYPES[entry['type']]
+    for key, value in entry.items():
+        if not key in PROFILE_FIELDS: raise ValueError(formatRobotId(robotId) + ': unknown field: ' + key)
+        valueType, requiredFor = PROFILE_FIELDS[key]
+        if not isinstance(value, valueType) or (valueType != bool and isinstance(value, bool)):
+            raise ValueError(formatRobotId(robotId) + ': invalid value for ' + key + ': ' + repr(value))
+        if valueType == (int, float) and (value < 0 or not math.isfinite(value)):
+            raise ValueError(formatRobotId(robotId) + ': invalid value for ' + key + ': ' + repr(value))
+    for key, (valueType, requiredFor) in PROFILE_FIELDS.items():
+        if entry['type'] in requiredFor and not key in entry:
+            raise ValueError(formatRobotId(robotId) + ': missing field: ' + key)
+    if not entry['bluetoothApp'] in BLUETOOTH_APPS:
+        raise ValueError(formatRobotId(robotId) + ': invalid value for bluetoothApp: ' + repr(entry['bluetoothApp']))
+    for key in ('wheelDiameter', 'wheelToBodyCenterY'):
+        if entry[key] <= 0: raise ValueError(formatRobotId(robotId) + ': ' + key + ' must be > 0')
+    entry['cameras'] = validateCameras(robotId, entry.get('cameras', []))
+    return types.MappingProxyType(entry)
+
+
+# validate camera configurations (defaults added), returns tuple of read-only camera configurations
+def validateCameras(robotId, cameras):
+    names = set()
+    result = []
+    for camera in cameras:
+        if not isinstance(camera, dict): raise ValueError(formatRobotId(robotId) + ': invalid camera: ' + repr(camera))
+        for key in camera:
+            if not key in CAMERA_FIELDS: raise ValueError(formatRobotId(robotId) + ': unknown camera field: ' + key)
+        camera = { key: camera.get(key, default) for key, (valueType, default) in CAMERA_FIELDS.items() }
+        for key, (valueType, default) in CAMERA_FIELDS.items():
+            value = camera[key]
+            if not isinstance(value, valueType) or isinstance(value, bool) or (key in ('width', 'height', 'fps') and value <= 0):
+                raise ValueError(formatRobotId(robotId) + ': invalid camera value for ' + key + ': ' + repr(value))
+        if len(camera['fourcc']) != 4: raise ValueError(formatRobotId(robotId) + ': invalid camera value for fourcc: ' + repr(camera['fourcc']))
+        if camera['name'] in names: raise ValueError(formatRobotId(robotId) + ': duplicate camera: ' + camera['name'])
+        names.add(camera['name'])
+        result.append(types.MappingProxyType(camera))
+    return tuple(result)
+
+
+# parse and validate complete robot database file
+#    returns read-only mapping robot ID => profile,  raises ValueError/OSError (nothing is changed on error)
+def loadDatabase(fileName = ROBOTS_FILE):
+    with open(fileName, 'r') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get('robots'), dict):
+        raise ValueError(fileName + ': missing "robots" section')
+    defaults = data.get('defaults', {})
+    if not isinstance(defaults, dict): raise ValueError(fileName + ': invalid "defaults" section')
+    profiles = {}
+    for key, entry in data['robots'].items():
+        robotId = parseRobotId(key)
+        if robotId in profiles: raise ValueError(fileName + ': duplicate robot ID: ' + key)
+        if not isinstance(entry, dict): raise ValueError(fileName + ': invalid robot entry: ' + key)
+        profiles[robotId] = validateProfile(robotId, {**defaults, **entry})
+    return types.MappingProxyType(profiles)
+
+
+try:
+    ROBOTS = loadDatabase()
+except (OSError, ValueError) as e:
+    print('error loading robot database:', e)
+    ROBOTS = types.MappingProxyType({})
+
+
+
+# watches the robot database file and hot-reloads safe fields (HOT_RELOAD_FIELDS) into a running robot
+# (an invalid edit is rejected as a whole, the robot keeps its current values)
+# runs in a background thread, or via 'await watcher.runAsync()' on an event loop if background=False
+
+class DatabaseWatcher():
+    def __init__(self, aRobot, robotId, fileName = ROBOTS_FILE, interval = 1.0, background = True):
+        self.robot = aRobot
+        self.robotId = robotId
+        self.fileName = fileName
+        self.interval = interval       # file polling interval (sec)
+        self.profile = ROBOTS.get(robotId)
+        self.lastStat = self.fileStat()
+        self.stopEvent = threading.Event()
+        if background:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def fileStat(self):
+        try:
+            st = os.stat(self.fileName)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            self.check()
+
+    async def runAsync(self):
+        while not self.stopEvent.is_set():
+            await asyncio.sleep(self.interval)
+            self.check()
+
+    def check(self):
+        st = self.fileStat()
+        if st is None or st == self.lastStat: return
+        self.lastStat = st
+        self.reload()
+
+    def reload(self):
+        global ROBOTS
+        try:
+            profiles = loadDatabase(self.fileName)
+        except (OSError, ValueError) as e:
+            print('robot database: edit rejected:', e)
+            return False
+        profile = profiles.get(self.robotId)
+        if profile is None:
+            print('robot database: edit rejected: robot', formatRobotId(self.robotId), 'missing')
+            return False
+        ROBOTS = profiles
+        changed = [key for key in profile if key in HOT_RELOAD_FIELDS and profile[key] != self.profile.get(key)]
+        restart = [key for key in set(profile) | set(self.profile) if not key in HOT_RELOAD_FIELDS and profile.get(key) != self.profile.get(key)]
+        for key in changed:
+            setattr(self.robot, key, profile[key])
+            print('robot database: reloaded', key, '=', profile[key])
+        if len(restart) > 0:
+            print('robot database: changed fields need restart:', ', '.join(sorted(restart)))
+        self.profile = profile
+        return True
+
+    def stop(self):
+        self.stopEvent.set()
+
 
 # -----------------------------------------------------------------------------------
 
-# create robot object based on machine id (WiFi MAC) found in config
-def createRobot():
+# find robot database entry based on machine id (WiFi MAC)
+#    returns robot ID, profile  (profile is None if not found)
+def findProfile():
     machine = platform.machine()  # x86_64  etc.
     print('machine:', machine)
     
     mid = uuid.getnode()
     print ('machine UUID:', hex(mid))
 
-    cfg = None
-    for aid in ROBOTS:
-        if aid == mid:
-            cfg = ROBOTS[aid]
-
+    cfg = ROBOTS.get(mid)
     if cfg is None:
         print('error finding robot in database!')
-        return None
+        return mid, None
 
     print('found config:')
-    print(cfg)
+    print(dict(cfg))
+    return mid, cfg
 
+
+# create robot object based on machine id (WiFi MAC) found in config
+def createRobot():
+    mid, cfg = findProfile()
+    if cfg is None: return None
+    return createRobotFromProfile(mid, cfg)
+
+
+# create robot object from robot database entry
+def createRobotFromProfile(mid, cfg):
     # create robot object
     robot = None
     if cfg['type'] == ROBOT_TYPE_DIFF_DRIVE:
@@ -134,22 +290,35 @@ def createRobot():
     # bluetooth config
     robot.bluetoothUSB = cfg['bluetoothUSB'] 
     robot.bluetoothAddr = cfg['bluetoothAddr']     
+    robot.bluetoothApp = cfg['bluetoothApp']
+    robot.cameras = cfg['cameras']
+    robot.robotId = mid
 
 
     return robot
 
 
+# hot-reload speed limits of robot (created by createRobot) when the robot database file changes
+def watchDatabase(aRobot, background = True):
+    return DatabaseWatcher(aRobot, aRobot.robotId, background=background)
+
+
 
 # create dabble object 
 def createDabble(aRobot):
-    useUSB = aRobot.bluetoothUSB
+    return createDabbleFromProfile({ 'name': aRobot.name, 'bluetoothUSB': aRobot.bluetoothUSB, 'bluetoothAddr': aRobot.bluetoothAddr,
+        'bluetoothApp': aRobot.bluetoothApp })
+
+
+# create dabble object from robot database entry (no robot object needed)
+def createDabbleFromProfile(cfg, background = True):
+    import dabble   # lazy import (bumble), not needed for createRobot
+    useUSB = cfg['bluetoothUSB']
     print('bluetoothUSB', useUSB)
     if useUSB:            
         socket = 'usb:0'
     else:
         socket = 'hci-socket:0'
 
-    app = dabble.Dabble(socket, aRobot.name, aRobot.bluetoothAddr)
+    app = dabble.Dabble(socket, cfg['name'], cfg['bluetoothAddr'], cfg['bluetoothApp'], background)
     return app
-
-
@@ -9,17 +9,23 @@
 
 
 import asyncio
+import math
 import sys
 import os
 import logging
 import time
 import threading
-import math
+import collections
+import startup
+import tracepoints
+import dabble_decoder as dd
+import sunray_decoder as sd
 
 from bumble.utils import AsyncRunner
 from bumble.device import Device, Connection
 from bumble.hci import Address
 from bumble.transport import open_transport_or_link
+from bumble.transport.common import AsyncPipeSink
 from bumble.att import ATT_Error, ATT_INSUFFICIENT_ENCRYPTION_ERROR
 from bumble.gatt import (
     Service,
@@ -34,50 +40,126 @@ from bumble.gatt import (
 )
 
 
-connected = False 
-currConnection = None
+DEBUG = False    # print received packets
+
 
+# phone app protocols (selected per robot: 'bluetoothApp' in robot database)
+APP_DABBLE = 'dabble'
+APP_SUNRAY = 'sunray'
 
-APP_NAME = 'dabble' 
-#APP_NAME = 'sunray' 
+# Dabble App 
+UUID_SERVICE = '6E400001-B5A3-F393-E0A9-E50E24DCCA9E'  # bluetooth GATT service
+UUID_CHAR_TX = '6E400002-B5A3-F393-E0A9-E50E24DCCA9E'  # another device can send to this 
+UUID_CHAR_RX = '6E400003-B5A3-F393-E0A9-E50E24DCCA9E'  # another device can receive from this 
 
+# Sunray App
+UUID_SUNRAY_SERVICE     = '0000ffe0-0000-1000-8000-00805f9b34fb'  # bluetooth GATT service
+UUID_SUNRAY_CHAR_TX_RX  = '0000ffe1-0000-1000-8000-00805f9b34fb'  # another device can send to this/receive from this 
+
+SUNRAY_VERSION = 'V,owlRobot,1.0,0,0,owlRobot,owlcontrol'   # answer to AT+V (version, no encryption)
+
+# preferred connection parameters (tried in order after connecting, the phone may refuse):
+#    connection interval min/max (ms), peripheral latency (intervals), supervision timeout (ms)
+#    the default interval chosen by phones (30..50 ms) dominates joystick-to-wheel latency
+CONNECTION_PARAMETERS = (
+    (7.5,  15.0, 0, 2000.0),    # Android
+    (15.0, 15.0, 0, 2000.0),    # iOS minimum (multiple of 15 ms)
+    (15.0, 30.0, 0, 4000.0),
+)
+CONNECTION_PARAMETERS_DELAY = 1.0      # wait after connecting before requesting (service discovery runs first)
+CONNECTION_PARAMETERS_TIMEOUT = 5.0    # max. time to wait for the phone's answer per request
+
+# several phones can be connected at once: one driver (its input controls the robot), the others are observers
+# (input ignored, telemetry only). The first phone sending input becomes driver, an observer takes over by
+# holding start + select (Dabble gamepad).
+MAX_CONNECTIONS = 3
+ROLE_DRIVER   = 'driver'
+ROLE_OBSERVER = 'observer'
+TAKEOVER_BUTTONS = 0x03                # start + select (bit mask, see dabble_decoder.EXTRA_BUTTON_BITS)
+
+# owlRobot telemetry (notifications, see telemetry.py)
+UUID_TELEMETRY_SERVICE = '2d4f0001-6f77-6c52-6f62-6f7469637300'
+UUID_CHAR_TELEMETRY    = '2d4f0002-6f77-6c52-6f62-6f7469637300'
+
+
+# immutable joystick input snapshot (published by Dabble on every change)
+#    seq: sequence number (incremented with each new snapshot) - compare with last seen seq to detect new input
+#    time: time.monotonic() when snapshot was published
+InputState = collections.namedtuple('InputState', [
+    'seq', 'time', 'connected',
+    'analogMode',         # analog joystick mode?
+    'joystickButton',     # digital joystick: 'up', 'down', 'left', 'right', 'released'
+    'extraButton',        # 'start', 'select', 'cross', 'circle', 'triangle', 'rectangle', 'released'
+    'buttons',            # extra buttons bit mask (see dabble_decoder.EXTRA_BUTTON_BITS)
+    'angle', 'radius',    # angle/radius of analog joystick
+    'x_value', 'y_value', # x/y-value of analog joystick
+])
+
+
+# per-connection link statistics: effective connection parameters and write arrival timing
+class LinkStats():
+    def __init__(self, connection, maxSamples = 200):
+        self.peer = str(connection.peer_address)
+        self.initialInterval = connection.parameters.connection_interval   # chosen by phone (ms)
+        self.onParameters(connection.parameters)
+        self.negotiation = 'pending'      # 'pending', 'accepted', 'refused', 'not needed'
+        self.writes = 0
+        self.lastWriteTime = None
+        self.gaps = collections.deque(maxlen=maxSamples)   # latest write inter-arrival times (sec)
+
+    def onParameters(self, parameters):
+        self.interval = parameters.connection_interval     # ms
+        self.latency = parameters.peripheral_latency       # intervals
+        self.supervisionTimeout = parameters.supervision_timeout   # ms
+
+    def onWrite(self):
+        now = time.monotonic()
+        if not self.lastWriteTime is None: self.gaps.append(now - self.lastWriteTime)
+        self.lastWriteTime = now
+        self.writes += 1
+
+    def summary(self):
+        gaps = sorted(self.gaps)
+        gapMs = lambda q: round(gaps[min(len(gaps) - 1, int(q * len(gaps)))] * 1000.0, 1) if len(gaps) > 0 else None
+        return { 'peer': self.peer, 'interval': self.interval, 'initialInterval': self.initialInterval,
+            'latency': self.latency, 'supervisionTimeout': self.supervisionTimeout, 'negotiation': self.negotiation,
+            'writes': self.writes, 'gapP50': gapMs(0.5), 'gapP95': gapMs(0.95), 'gapMax': gapMs(1.0) }
+
+
+
+# HCI transport to a virtual controller (bumble.controller.Controller, e.g. on a LocalLink, see test/virtualble.py)
+#    use as 'async with VirtualTransport(controller) as (hci_source, hci_sink)'  (like open_transport_or_link)
+class VirtualTransport():
+    def __init__(self, controller):
+        self.controller = controller
+        self.terminated = asyncio.get_running_loop().create_future()
+
+    async def __aenter__(self):
+        return (self, AsyncPipeSink(self.controller))
+
+    async def __aexit__(self, *args):
+        if not self.terminated.done(): self.terminated.set_result(None)
+
+    def set_packet_sink(self, sink):
+        self.controller.set_packet_sink(sink)
+
+    async def wait_for_termination(self):
+        await self.terminated
 
-if APP_NAME == 'dabble':
-    # Dabble App 
-    UUID_SERVICE = '6E400001-B5A3-F393-E0A9-E50E24DCCA9E'  # bluetooth GATT service
-    UUID_CHAR_TX = '6E400002-B5A3-F393-E0A9-E50E24DCCA9E'  # another device can send to this 
-    UUID_CHAR_RX = '6E400003-B5A3-F393-E0A9-E50E24DCCA9E'  # another device can receive from this 
-elif APP_NAME == 'sunray':
-    # Sunray App
-    UUID_SERVICE     = '0000ffe0-0000-1000-8000-00805f9b34fb'  # bluetooth GATT service
-    UUID_CHAR_TX_RX  = '0000ffe1-0000-1000-8000-00805f9b34fb'  # another device can send to this/receive from this 
 
 
 # -----------------------------------------------------------------------------
-class Listener(Device.Listener, Connection.Listener):
-    def __init__(self, device):
+class Listener(Device.Listener):
+    def __init__(self, device, app):
         self.device = device
+        self.app = app
 
     def on_connection(self, connection):
-        global connected, currConnection
-        currConnection = connection
-        connected = True
         print(f'=== Connected to {connection}')
-        self.connection = connection        
-        connection.listener = self
-
-
-    def on_disconnection(self, reason):
-        global connected
-        connected = False
-        print(f'### Disconnected, reason={reason}')
-        #self.device.disconnect(self.connection, reason)
-        #AsyncRunner.spawn(self.device.set_discoverable(True))
-        AsyncRunner.spawn(self.device.start_advertising(auto_restart=False))
-
-    def on_connection_att_mtu_update(self):
-        print(f'### connection att mtu update: {currConnection.att_mtu}')
-        
+        session = Session(self.app, connection)
+        connection.listener = session
+        self.app.addSession(session)
+        AsyncRunner.spawn(self.app.negotiateParameters(session))
 
     def on_characteristic_subscription(
         self, connection, characteristic, notify_enabled, indicate_enabled
@@ -88,44 +170,267 @@ class Listener(Device.Listener, Connection.Listener):
             f'notify {"enabled" if notify_enabled else "disabled"}, '
             f'indicate {"enabled" if indicate_enabled else "disabled"}'
         )
+        session = self.app.sessions.get(connection.handle)
+        if session is None: return
+        if characteristic is self.app.characteristicTelemetry:
+            session.telemetrySubscribed = notify_enabled
+            if notify_enabled: self.app.telemetryRefreshCount += 1
+            return
+        if self.app.appName != APP_DABBLE: return
         # TODO: Dabble App may expect some initial notify data: 
-        self.device.characteristicRead.value = bytes([0xFF, 0x00, 0x01, 0x00, 0x00])
-        AsyncRunner.spawn(self.device.notify_subscribers(self.device.characteristicRead))
+        session.queueNotification(self.device.characteristicRead, bytes([0xFF, 0x00, 0x01, 0x00, 0x00]))
+
+
+
+# per-connection session: own protocol decoder, input, link statistics and notification queue
+#    notifications are sent by one task per session, so a slow phone does not delay the others
+
+class Session(Connection.Listener):
+    def __init__(self, app, connection):
+        self.app = app
+        self.connection = connection
+        self.handle = connection.handle
+        self.peer = str(connection.peer_address)
+        self.role = ROLE_OBSERVER
+        self.decoder = sd.SunrayDecoder() if app.appName == APP_SUNRAY else dd.DabbleDecoder()
+        self.buttons = 0                       # extra buttons currently held (bit mask)
+        self.link = LinkStats(connection)
+        self.mtu = connection.att_mtu
+        self.telemetrySubscribed = False
+        self.pending = 0                       # notifications queued or in transmission
+        self.notifications = asyncio.Queue()
+        self.sender = asyncio.ensure_future(self.sendNotifications())
+
+    def on_disconnection(self, reason):
+        print(f'### Disconnected {self.peer}, reason={reason}')
+        print('link stats:', self.link.summary())
+        self.sender.cancel()
+        self.app.removeSession(self)
+
+    def on_connection_parameters_update(self):
+        parameters = self.connection.parameters
+        print(f'### connection parameters update {self.peer}: interval {parameters.connection_interval} ms, '
+            f'latency {parameters.peripheral_latency}, timeout {parameters.supervision_timeout} ms')
+        self.link.onParameters(parameters)
+
+    def on_connection_att_mtu_update(self):
+        print(f'### connection att mtu update {self.peer}: {self.connection.att_mtu}')
+        self.mtu = self.connection.att_mtu
+
+    # queue notification (event loop only)
+    def queueNotification(self, characteristic, data):
+        self.pending += 1
+        self.notifications.put_nowait((characteristic, data))
+
+    # notifications of previous round still queued/in transmission?
+    def busy(self):
+        return self.pending > 0
+
+    async def sendNotifications(self):
+        while True:
+            characteristic, data = await self.notifications.get()
+            try:
+                await self.app.device.notify_subscriber(self.connection, characteristic, data)
+            except Exception as e:
+                print('notification error', self.peer, e)
+            self.pending -= 1
 
-        
 
 
 class Dabble():
-    def __init__(self, bluetooth_transport = 'hci-socket:0', name = 'owlRobot', address = "F0:F1:F2:F3:F4:F5"):
-        self.analogMode = False  # analog joystick mode?
-        self.joystickButton = 'released'
-        self.extraButton = 'released'   
-        self.angle = 0   # angle/radius of analog joystick
-        self.radius = 0 
-        self.x_value = 0  # x/y-value of analog joystick
-        self.y_value = 0
-
-        self.proc = threading.Thread(target=self.startAsync, args=(bluetooth_transport,name,address), daemon=True)
-        self.proc.start()
+    # bluetooth_transport: bumble transport name (e.g. 'usb:0') or virtual controller (see VirtualTransport)
+    # background: run GATT server in own thread/event loop (otherwise: caller runs 'await app.run()' on its event loop)
+    def __init__(self, bluetooth_transport = 'hci-socket:0', name = 'owlRobot', address = "F0:F1:F2:F3:F4:F5", appName = APP_DABBLE,
+            background = True):
+        if not appName in (APP_DABBLE, APP_SUNRAY): raise ValueError('unknown bluetooth app: ' + str(appName))
+        self.appName = appName
+        # latest input snapshot of the driver (replaced as a whole, so readers never see a half-updated state)
+        self.input = InputState(seq=0, time=time.monotonic(), connected=False, analogMode=False,
+            joystickButton='released', extraButton='released', buttons=0, angle=0, radius=0, x_value=0, y_value=0)
+        self.inputChanged = threading.Condition()
+        self.inputEvent = asyncio.Event()      # set on new input (for nextInput on the event loop)
+        self.sessions = {}                     # connection handle => Session (event loop only)
+        self.driver = None                     # session controlling the robot
+        self.status = {}                       # latest robot state for app status answers (see updateStatus)
+        # telemetry notifications
+        self.telemetryRefreshCount = 0         # incremented when subscribers need the full state (new subscription, skipped round)
+        self.characteristicTelemetry = None
+        self.loop = None                       # asyncio event loop of GATT server
+        self.advertising = threading.Event()   # set when GATT server is up and advertising
+        self.error = None                      # startup error (e.g. HCI transport not available)
+
+        self.transport = (bluetooth_transport, name, address)
+        if background:
+            self.proc = threading.Thread(target=self.startAsync, daemon=True)
+            self.proc.start()
         
         #asyncio.run(self.start(bluetooth_transport))    
 
-    def startAsync(self, bluetooth_transport, name, address):
+    # current input values (compatibility: prefer one snapshot via self.input / waitInput for consistent values)
+    analogMode = property(lambda self: self.input.analogMode)
+    joystickButton = property(lambda self: self.input.joystickButton)
+    extraButton = property(lambda self: self.input.extraButton)
+    angle = property(lambda self: self.input.angle)
+    radius = property(lambda self: self.input.radius)
+    x_value = property(lambda self: self.input.x_value)
+    y_value = property(lambda self: self.input.y_value)
+
+    # telemetry subscribers (for TelemetryPublisher)
+    telemetrySubscribed = property(lambda self: any(session.telemetrySubscribed for session in list(self.sessions.values())))
+    # smallest ATT MTU of telemetry subscribers (notification payload size)
+    mtu = property(lambda self: min([session.mtu for session in list(self.sessions.values()) if session.telemetrySubscribed], default=23))
+
+    # publish new input snapshot (changed fields) and wake up waiting consumers
+    #    receiveTime: arrival time of the BLE write (tracepoints.now()), for latency tracing
+    def publishInput(self, receiveTime = None, **changes):
+        with self.inputChanged:
+            self.input = self.input._replace(seq=self.input.seq + 1, time=time.monotonic(), **changes)
+            seq = self.input.seq
+            self.inputChanged.notify_all()
+        if not receiveTime is None:
+            tracepoints.point('write', seq, receiveTime)
+            tracepoints.point('published', seq)
+        if not self.loop is None: self.loop.call_soon_threadsafe(self.inputEvent.set)
+
+    # release all buttons (robot must not keep driving with last input)
+    def releaseInput(self, **changes):
+        self.publishInput(analogMode=False, joystickButton='released', extraButton='released',
+            buttons=0, angle=0, radius=0, x_value=0, y_value=0, **changes)
+
+    # wait for input snapshot newer than 'lastSeq' (or timeout), returns latest snapshot
+    #   (snapshot.seq == lastSeq: no new input, i.e. stale sample)
+    def waitInput(self, lastSeq = None, timeout = None):
+        with self.inputChanged:
+            if self.input.seq == lastSeq:
+                self.inputChanged.wait_for(lambda: self.input.seq != lastSeq, timeout)
+            return self.input
+
+    # same as waitInput, for use on the GATT server's event loop (see runtime.py)
+    async def nextInput(self, lastSeq = None, timeout = None):
+        if self.input.seq == lastSeq:
+            self.inputEvent.clear()
+            try:
+                await asyncio.wait_for(self.inputEvent.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.input
+
+    # latest robot state reported to the app (e.g. updateStatus(battery=24.1, odometry=(x, y, theta)))
+    def updateStatus(self, **values):
+        self.status = {**self.status, **values}
+
+    # ----- sessions / arbitration (event loop only) -----
+
+    def addSession(self, session):
+        self.sessions[session.handle] = session
+        self.publishInput(connected=True)
+        if len(self.sessions) < MAX_CONNECTIONS and not self.device.is_advertising:
+            AsyncRunner.spawn(self.device.start_advertising(auto_restart=False))   # accept further phones
+
+    def removeSession(self, session):
+        self.sessions.pop(session.handle, None)
+        if self.driver is session:
+            self.driver = None
+            self.releaseInput(connected=len(self.sessions) > 0)
+        elif len(self.sessions) == 0:
+            self.publishInput(connected=False)
+        if not self.device.is_advertising:
+            AsyncRunner.spawn(self.device.start_advertising(auto_restart=False))
+
+    def setDriver(self, session):
+        if not self.driver is None: self.driver.role = ROLE_OBSERVER
+        session.role = ROLE_DRIVER
+        print('driver:', session.peer, '(' + str(len(self.sessions) - 1) + ' observers)')
+        self.driver = session
+        self.releaseInput()    # nothing of the previous driver's input remains
+
+    # input changes (InputState fields) from a session: applied if it is the driver (or becomes driver)
+    def sessionInput(self, session, changes, receiveTime = None):
+        session.buttons = changes.get('buttons', 0)
+        takeover = session.buttons & TAKEOVER_BUTTONS == TAKEOVER_BUTTONS
+        if takeover: changes['extraButton'] = 'released'   # reserved for takeover
+        if self.driver is None or (takeover and not self.driver is session):
+            self.setDriver(session)
+        if not self.driver is session: return    # observer
+        self.publishInput(receiveTime, **changes)
+
+    # link statistics of current connections (see LinkStats.summary)
+    def linkReport(self):
+        return [dict(session.link.summary(), role=session.role) for session in list(self.sessions.values())]
+
+    # request short connection interval (CONNECTION_PARAMETERS in order), keeps the phone's choice if all are refused
+    async def negotiateParameters(self, session):
+        await asyncio.sleep(CONNECTION_PARAMETERS_DELAY)
+        connection = session.connection
+        link = session.link
+        for intervalMin, intervalMax, latency, timeout in CONNECTION_PARAMETERS:
+            if not session.handle in self.sessions: return    # disconnected meanwhile
+            if connection.parameters.connection_interval <= intervalMax:
+                if link.negotiation == 'pending': link.negotiation = 'not needed'
+                break
+            try:
+                # link layer procedure first, L2CAP request if the phone/controller does not support it
+                try:
+                    await asyncio.wait_for(connection.update_parameters(intervalMin, intervalMax, latency, timeout),
+                        CONNECTION_PARAMETERS_TIMEOUT)
+                except Exception:
+                    await asyncio.wait_for(connection.update_parameters(intervalMin, intervalMax, latency, timeout,
+                        use_l2cap=True), CONNECTION_PARAMETERS_TIMEOUT)
+                link.negotiation = 'accepted'
+                print('connection parameters requested:', intervalMin, '..', intervalMax, 'ms accepted')
+                break
+            except Exception as e:
+                link.negotiation = 'refused'
+                print('connection parameters', intervalMin, '..', intervalMax, 'ms refused:', e)
+
+    # send one round of telemetry notifications to all subscribers (thread-safe, does not wait for the links)
+    def notifyTelemetry(self, payloads):
+        if self.loop is None or self.characteristicTelemetry is None: return
+        self.loop.call_soon_threadsafe(self.fanOut, self.characteristicTelemetry, payloads)
+
+    def fanOut(self, characteristic, payloads):
+        for session in list(self.sessions.values()):
+            if not session.telemetrySubscribed: continue
+            if session.busy():
+                # still sending the previous round: skip this one, everybody gets the full state next round
+                self.telemetryRefreshCount += 1
+                continue
+            for payload in payloads: session.queueNotification(characteristic, payload)
+
+    # all subscribers still busy with previous notifications?
+    def notifyPending(self):
+        busy = [session.busy() for session in list(self.sessions.values()) if session.telemetrySubscribed]
+        return len(busy) > 0 and all(busy)
+
+    def startAsync(self):
         print('startAsync')
-        asyncio.run(self.start(bluetooth_transport, name, address))
+        asyncio.run(self.run())
+
+    # run GATT server until the HCI transport terminates
+    async def run(self):
+        try:
+            await self.start(*self.transport)
+        except Exception as e:
+            print('dabble app interface error:', e)
+            self.error = e
+            self.advertising.set()   # wake up waiters (check error)
 
 
     async def start(self, bluetooth_transport, name, address):
         print('starting dabble app interface:=', bluetooth_transport, 'name=', name, 'address=', address)
 
         print('<<< connecting to HCI...')
-        async with await open_transport_or_link(bluetooth_transport) as (self.hci_source, self.hci_sink):
+        if isinstance(bluetooth_transport, str):
+            transport = await open_transport_or_link(bluetooth_transport)
+        else:
+            transport = VirtualTransport(bluetooth_transport)
+        async with transport as (self.hci_source, self.hci_sink):
             print('<<< connected ')
 
             # Create a device to manage the host
             #self.device = Device.from_config_file_with_hci('misc/device1.json', self.hci_source, self.hci_sink)
             self.device = Device.with_hci(name, Address(address), self.hci_source, self.hci_sink)            
-            self.device.listener = Listener(self.device)
+            self.device.listener = Listener(self.device, self)
 
             # Add a few entries to the device's GATT server
             #descriptor = Descriptor(
@@ -152,8 +457,9 @@ class Dabble():
             generic_attr_service = Service(
                 GATT_GENERIC_ATTRIBUTE_SERVICE, [generic_attr_characteristic]
             )
-            print('APP_NAME', APP_NAME)
-            if APP_NAME == 'dabble':                
+            print('bluetooth app', self.appName)
+            if self.appName == APP_DABBLE:
+
                 characteristicWrite = Characteristic(
                             UUID_CHAR_TX ,
                             Characteristic.Properties.WRITE,
@@ -174,21 +480,29 @@ class Dabble():
                         self.device.characteristicRead
                     ],
                 )
-            elif APP_NAME == 'sunray':
+            elif self.appName == APP_SUNRAY:
                 self.device.characteristicRead = Characteristic(
-                            UUID_CHAR_TX_RX ,
-                            Characteristic.Properties.WRITE | Characteristic.Properties.READ | Characteristic.Properties.NOTIFY,
+                            UUID_SUNRAY_CHAR_TX_RX ,
+                            Characteristic.Properties.WRITE | Characteristic.Properties.WRITE_WITHOUT_RESPONSE | Characteristic.Properties.READ | Characteristic.Properties.NOTIFY,
                             Characteristic.WRITEABLE | Characteristic.READABLE ,
-                            CharacteristicValue(read=self.my_custom_read, write=self.my_custom_write),
+                            CharacteristicValue(read=self.my_custom_read, write=self.sunray_write),
                         )
                 custom_service1 = Service(
-                    UUID_SERVICE,
+                    UUID_SUNRAY_SERVICE,
                     [
                         self.device.characteristicRead
                     ],
                 )
 
-            self.device.add_services([generic_attr_service, custom_service1])
+            self.characteristicTelemetry = Characteristic(
+                        UUID_CHAR_TELEMETRY,
+                        Characteristic.Properties.NOTIFY,
+                        Characteristic.READABLE,
+                        bytes(),
+                    )
+            telemetry_service = Service(UUID_TELEMETRY_SERVICE, [self.characteristicTelemetry])
+
+            self.device.add_services([generic_attr_service, custom_service1, telemetry_service])
 
             # Debug print
             print('=========attributes begin=============')
@@ -197,6 +511,7 @@ class Dabble():
             print('=========attributes end=============')
 
             # Get things going
+            self.loop = asyncio.get_running_loop()
             await self.device.power_on()
 
             # Connect to a peer
@@ -206,20 +521,18 @@ class Dabble():
             #    await device.connect(target_address)
             #else:
             await self.device.start_advertising(auto_restart=False)
+            startup.mark('bleAdvertising')
+            self.advertising.set()
 
             #print('advertising addr: ', self.device.public_address)
             
-            while True:
-                #print('sleep')
-                await asyncio.sleep(1.0)
-                #for val in bytes([0xFF, 0x00, 0x01, 0x00, 0x00]):
-                #    await asyncio.sleep(0.02)
-                #    self.device.characteristicRead.value = [val] 
-                #    await self.device.notify_subscribers(self.device.characteristicRead)
-                #await self.device.indicate_subscribers(self.device.characteristicRead)
-                
+            #for val in bytes([0xFF, 0x00, 0x01, 0x00, 0x00]):
+            #    await asyncio.sleep(0.02)
+            #    self.device.characteristicRead.value = [val] 
+            #    await self.device.notify_subscribers(self.device.characteristicRead)
+            #await self.device.indicate_subscribers(self.device.characteristicRead)
                 
-            #await self.hci_source.wait_for_termination()
+            await self.hci_source.wait_for_termination()
 
 
     def my_custom_read(self, connection):
@@ -228,59 +541,63 @@ class Dabble():
 
 
     def my_custom_write(self, connection, value):
-        print(f'----- WRITE from {connection}: {value}')
-        print(type(value))
-        if not isinstance(value, bytes): return
-        if len(value) != 8: return
-        if value[5] == 0x01:
-            self.extraButton = 'start'
-            print('extra: start')
-        elif value[5] == 0x02:
-            self.extraButton = 'select'
-            print('extra: select')
-        elif value[5] == 0x10:
-            self.extraButton = 'cross'
-            print('extra: cross')
-        elif value[5] == 0x08:
-            self.extraButton = 'circle'
-            print('extra: circle')
-        elif value[5] == 0x04:
-            self.extraButton = 'triangle'
-            print('extra: triangle')
-        elif value[5] == 0x20:
-            self.extraButton = 'rectangle'
-            print('extra: rectangle')
-        elif value[5] == 0x00:
-            self.extraButton = 'released'
-            print('extra: released')
-
-        if value[2] == 0x02 or value[2] == 0x03:  # analog joystick / acceleration sensor
-            self.analogMode = True
-            val = value[6]             
-            self.angle=((val >> 3)*15);
-            self.radius= val&0x07;
-            self.x_value= float(self.radius*(float(math.cos(float(self.angle*math.pi/180.0))))) / 6.0;
-            self.y_value= float(self.radius*(float(math.sin(float(self.angle*math.pi/180.0))))) / 6.0;
-            print('x', round(self.x_value,2), 'y', round(self.y_value,2))            
-        elif value[2] == 0x01:  # digital joystick
-            self.analogMode = False
-            if value[6] == 0x01:
-                self.joystickButton = 'up'
-                print('joy: up')
-            elif value[6] == 0x02:
-                self.joystickButton = 'down'
-                print('joy: down')            
-            elif value[6] == 0x04:
-                self.joystickButton = 'left'
-                print('joy: left')
-            elif value[6] == 0x08:
-                self.joystickButton = 'right'
-                print('joy: right')
-            elif value[6] == 0x00:
-                self.joystickButton = 'released'
-                print('joy: released')
-
-
+        receiveTime = tracepoints.now()
+        if DEBUG: print(f'----- WRITE from {connection}: {value}')
+        session = self.sessions.get(connection.handle)
+        if session is None: return
+        session.link.onWrite()
+        for moduleId, functionId, args in session.decoder.feed(value):
+            if moduleId != dd.GAMEPAD_MODULE_ID or len(args) != 1 or len(args[0]) != 2: continue  # other Dabble modules: not used
+            changes = dd.gamepadChanges(functionId, args[0][0], args[0][1])
+            if changes is None: continue
+            if DEBUG: print(changes)
+            self.sessionInput(session, changes, receiveTime)
+
+
+    def sunray_write(self, connection, value):
+        receiveTime = tracepoints.now()
+        if DEBUG: print(f'----- WRITE from {connection}: {value}')
+        session = self.sessions.get(connection.handle)
+        if session is None: return
+        session.link.onWrite()
+        for cmd, args in session.decoder.feed(value):
+            if DEBUG: print('sunray', cmd, args)
+            try:
+                answer = self.sunrayCommand(session, cmd, args, receiveTime)
+            except (ValueError, IndexError):
+                print('sunray: invalid command', cmd, args)
+                continue
+            if not answer is None: self.sendAnswer(session, sd.encodeAnswer(answer))
+
+    # process Sunray command, returns answer text (None: no answer)
+    def sunrayCommand(self, session, cmd, args, receiveTime = None):
+        if cmd == 'M':
+            # motor: linear speed (m/s), angular speed (rad/s)
+            linear = float(args[0])
+            angular = float(args[1])
+            if not math.isfinite(linear) or not math.isfinite(angular): raise ValueError('speed not finite')
+            self.sessionInput(session, { 'analogMode': True, 'joystickButton': 'released', 'extraButton': 'released',
+                'buttons': 0, 'x_value': angular, 'y_value': linear }, receiveTime)
+            return 'M'
+        elif cmd == 'V':
+            return SUNRAY_VERSION
+        elif cmd == 'S':
+            # summary: battery voltage, x, y, heading, GPS solution (none), operation state (idle)
+            x, y, theta = self.status.get('odometry', (0, 0, 0))
+            battery = self.status.get('battery')
+            return 'S,%.2f,%.2f,%.2f,%.2f,0,0' % (0 if battery is None else battery, x, y, theta)
+        elif cmd == 'C':
+            # control (operation change): stop driving
+            self.sessionInput(session, { 'analogMode': True, 'joystickButton': 'released', 'extraButton': 'released',
+                'buttons': 0, 'x_value': 0, 'y_value': 0 })
+            return 'C'
+        return None
+
+    # stream answer to the session as notifications (split to fit the ATT MTU, queued in order)
+    def sendAnswer(self, session, data):
+        size = session.mtu - 3
+        for pos in range(0, len(data), size):
+            session.queueNotification(self.device.characteristicRead, data[pos:pos+size])
 
 
 if __name__ == "__main__":
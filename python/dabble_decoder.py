@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# Dabble App protocol decoder (table-driven, works on memoryview input)
+#
+# Dabble frame:  0xFF  moduleId  functionId  argCount  { argLen  argBytes... }  0x00
+# gamepad frame (module 0x01, 8 bytes):  FF 01 <mode> 01 02 <buttons> <joystick> 00
+#    mode 0x01: digital joystick       joystick = button bits (up, down, left, right)
+#    mode 0x02: analog joystick        joystick = angle index (bits 3..7, 15 deg steps) | radius (bits 0..2)
+#    mode 0x03: accelerometer          same encoding as analog joystick
+#    buttons: start, select, triangle, circle, cross, rectangle bits
+#
+# frames may arrive concatenated in one BLE write or split across writes - the decoder reassembles them.
+# run 'python dabble_decoder.py' for a packets/second benchmark
+
+
+import math
+import time
+
+
+FRAME_START = 0xFF
+FRAME_END   = 0x00
+
+GAMEPAD_MODULE_ID     = 0x01
+GAMEPAD_DIGITAL       = 0x01
+GAMEPAD_JOYSTICK      = 0x02
+GAMEPAD_ACCELEROMETER = 0x03
+
+MAX_FRAME_LEN = 244                 # longest frame accepted (one BLE write), longer declared lengths are corrupt
+
+
+# ----- lookup tables (precomputed for all byte values) ----------------------------------------
+
+# extra buttons: bit => name (in priority order, if several buttons are pressed the first one wins)
+EXTRA_BUTTON_BITS = ((0x01, 'start'), (0x02, 'select'), (0x10, 'cross'), (0x08, 'circle'), (0x04, 'triangle'), (0x20, 'rectangle'))
+# digital joystick: bit => name (in priority order)
+JOYSTICK_BITS = ((0x01, 'up'), (0x02, 'down'), (0x04, 'left'), (0x08, 'right'))
+
+def buttonTable(bits):
+    table = []
+    for value in range(256):
+        name = 'released'
+        for bit, bitName in bits:
+            if value & bit:
+                name = bitName
+                break
+        table.append(name)
+    return tuple(table)
+
+EXTRA_BUTTONS = buttonTable(EXTRA_BUTTON_BITS)
+JOYSTICK_BUTTONS = buttonTable(JOYSTICK_BITS)
+
+# analog joystick: byte => (angle, radius, x_value, y_value)   (24 angles x 8 radii used by the app)
+def analogEntry(val):
+    angle = (val >> 3) * 15
+    radius = val & 0x07
+    x = radius * math.cos(angle * math.pi / 180.0) / 6.0
+    y = radius * math.sin(angle * math.pi / 180.0) / 6.0
+    return (angle, radius, x, y)
+
+ANALOG_XY = tuple(analogEntry(val) for val in range(256))
+
+
+# input changes for a gamepad frame (field names of dabble.InputState), None for unknown modes
+def gamepadChanges(mode, buttons, joystick):
+    if mode == GAMEPAD_JOYSTICK or mode == GAMEPAD_ACCELEROMETER:
+        angle, radius, x, y = ANALOG_XY[joystick]
+        return { 'buttons': buttons, 'extraButton': EXTRA_BUTTONS[buttons], 'analogMode': True,
+            'angle': angle, 'radius': radius, 'x_value': x, 'y_value': y }
+    elif mode == GAMEPAD_DIGITAL:
+        return { 'buttons': buttons, 'extraButton': EXTRA_BUTTONS[buttons], 'analogMode': False,
+            'joystickButton': JOYSTICK_BUTTONS[joystick] }
+    return None
+
+
+
+# streaming frame decoder
+#    feed() returns list of complete frames: (moduleId, functionId, args)  with args = tuple of bytes
+#    writes that contain only complete frames are decoded in place, only incomplete tails are buffered
+
+class DabbleDecoder():
+    def __init__(self):
+        self.buffer = bytearray()
+        self.droppedBytes = 0     # bytes skipped while resynchronizing to frame start
+
+    def reset(self):
+        self.buffer.clear()
+
+    def feed(self, data):
+        frames = []
+        if len(self.buffer) == 0:
+            with memoryview(data) as view:
+                pos = self.parse(view, frames)
+                if pos < len(view): self.buffer += view[pos:]
+        else:
+            self.buffer += data
+            with memoryview(self.buffer) as view:
+                pos = self.parse(view, frames)
+            del self.buffer[:pos]
+        return frames
+
+    # parse complete frames from view, returns number of consumed bytes
+    def parse(self, view, frames):
+        pos = 0
+        size = len(view)
+        while pos < size:
+            if view[pos] != FRAME_START:
+                # resync to next frame start
+                nxt = pos + 1
+                while nxt < size and view[nxt] != FRAME_START: nxt += 1
+                self.droppedBytes += nxt - pos
+                pos = nxt
+                continue
+            # fast path: 8-byte gamepad frame
+            if pos + 8 <= size and view[pos+3] == 1 and view[pos+4] == 2 and view[pos+7] == FRAME_END:
+                frames.append((view[pos+1], view[pos+2], (bytes(view[pos+5:pos+7]),)))
+                pos += 8
+                continue
+            # generic frame
+            if pos + 4 > size: break              # incomplete header
+            argCount = view[pos+3]
+            end = pos + 4
+            args = []
+            complete = True
+            tooLong = False
+            for i in range(argCount):
+                if end >= size:
+                    complete = False
+                    break
+                argLen = view[end]
+                if end + 1 + argLen + 1 - pos > MAX_FRAME_LEN:
+                    tooLong = True
+                    break
+                if end + 1 + argLen > size:
+                    complete = False
+                    break
+                args.append(bytes(view[end+1:end+1+argLen]))
+                end += 1 + argLen
+            if tooLong:
+                # corrupt length byte: skip start byte and resync (instead of buffering up to the declared length)
+                self.droppedBytes += 1
+                pos += 1
+                continue
+            if not complete or end >= size: break  # incomplete frame: wait for more data
+            if view[end] != FRAME_END:
+                # corrupt frame: skip start byte and resync
+                self.droppedBytes += 1
+                pos += 1
+                continue
+            frames.append((view[pos+1], view[pos+2], tuple(args)))
+            pos = end + 1
+        return pos
+
+
+
+# ----- benchmark -----------------------------------------------------------------------------
+
+def benchmark(chunks, packets, label):
+    decoder = DabbleDecoder()
+    count = 0
+    startTime = time.perf_counter()
+    for chunk in chunks:
+        for moduleId, functionId, args in decoder.feed(chunk):
+            if moduleId == GAMEPAD_MODULE_ID:
+                changes = gamepadChanges(functionId, args[0][0], args[0][1])
+                count += 1
+    duration = time.perf_counter() - startTime
+    assert count == packets, 'decoded ' + str(count) + ' of ' + str(packets) + ' packets'
+    print(label, ':', packets, 'packets', round(duration, 3), 'sec =>', round(packets / duration), 'packets/s')
+
+
+if __name__ == "__main__":
+    n = 200000
+    stream = bytearray()
+    for i in range(n):
+        mode = (GAMEPAD_DIGITAL, GAMEPAD_JOYSTICK, GAMEPAD_ACCELEROMETER)[i % 3]
+        stream += bytes([FRAME_START, GAMEPAD_MODULE_ID, mode, 1, 2, (1 << (i % 6)) if i % 4 == 0 else 0, i & 0xff, FRAME_END])
+    stream = bytes(stream)
+
+    benchmark([stream[i:i+8] for i in range(0, len(stream), 8)], n, 'single 8-byte writes')
+    benchmark([stream[i:i+20] for i in range(0, len(stream), 20)], n, 'split/concatenated (20-byte writes)')
+    benchmark([stream[i:i+244] for i in range(0, len(stream), 244)], n, 'concatenated (244-byte writes)')
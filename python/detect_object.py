@@ -7,10 +7,16 @@
 
 
 
+import collections
 import cv2
+import gc
+import os
+import sys
 import time
 import numpy as np
 
+import camera
+
 
 # v4l2-ctl -d /dev/video0 --list-formats-ext
 
@@ -18,8 +24,38 @@ IMG_W = 640  # 320, 640, 1280, 1920, 2560
 IMG_H = 480   # 240, 480,  720, 1080,  720
 FPS = 30
 
-cam = None 
+# DNN backend/target (see selectBackend): 'auto' probes the candidates in BACKEND_ORDER and uses the first one working,
+# the CPU path is used if OpenCV has no CUDA device (OWL_DNN_BACKEND, OWL_DNN_THREADS, OWL_DNN_SIZE override the defaults)
+BACKENDS = {
+    'cuda':      (cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA),
+    'cuda_fp16': (cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16),
+    'opencl':    (cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_OPENCL),
+    'cpu':       (cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_CPU),
+}
+BACKEND_ORDER = ('cuda', 'cpu')       # 'auto' candidates (OpenCL is usually slower than CPU on the Pi, select explicitly)
+DNN_BACKEND = os.environ.get('OWL_DNN_BACKEND', 'auto')
+DNN_THREADS = int(os.environ.get('OWL_DNN_THREADS', 0))      # OpenCV threads for CPU inference (0: OpenCV default, all cores)
+DNN_INPUT_SIZE = int(os.environ.get('OWL_DNN_SIZE', 300))    # network input resolution (square, the model is trained with 300)
+WARMUP_RUNS = 2                       # inferences at load time (first forward passes allocate/optimize)
+
+# idle timeouts (sec since last captureVideoImage call) - see releaseIdle()
+CAMERA_IDLE_TIMEOUT = 5.0     # stop video capture (camera stream, MJPEG decoding)
+MODEL_IDLE_TIMEOUT = 120.0    # free DNN model memory
+
+FRAME_TIMEOUT = 1.0           # max. wait for a new camera frame (sec)
+FRAME_SOURCE = os.environ.get('OWL_FRAME_SOURCE')   # frame source instead of camera 0 (see framesource.openSource)
+
+# camera configurations for openCameras (see config.CAMERA_FIELDS, e.g. robot.cameras from the robot database)
+CAMERAS = ({ 'name': 'front', 'device': 0, 'width': IMG_W, 'height': IMG_H, 'fps': FPS, 'fourcc': 'MJPG' },)
+
+cam = None                    # camera.FrameGrabber (capture thread)
+cameras = None                # camera.CameraSet (multi-camera capture, see detectCameras)
 model = None
+backendName = None            # selected DNN backend (BACKENDS key)
+inputSize = DNN_INPUT_SIZE
+lastUseTime = 0
+lastFrameSeq = 0              # sequence number of the last frame returned by captureVideoImage
+lastFrameTime = 0             # its capture time (time.monotonic)
 
 
 # Pretrained classes in the model
@@ -42,84 +78,439 @@ classNames = {0: 'background',
               86: 'vase', 87: 'scissors', 88: 'teddy bear', 89: 'hair drier', 90: 'toothbrush'}
 
 
-def id_class_name(class_id, classes):
-    for key, value in classes.items():
-        if class_id == key:
-            return value
+# class id => name (array lookup, '' for ids not used by the model)
+CLASS_LOOKUP = np.array([classNames.get(i, '') for i in range(max(classNames) + 1)], dtype=object)
 
+CONFIDENCE_THRESHOLD = 0.5
+VERBOSE = False      # print detections
 
+# detections of one camera (detectCameras)
+CameraDetection = collections.namedtuple('CameraDetection', 'camera captureTime seq detections')
 
+# detections (normalized image coordinates 0..1, sorted by confidence)
+DETECTION_DTYPE = np.dtype([('classId', np.int32), ('confidence', np.float32),
+    ('x1', np.float32), ('y1', np.float32), ('x2', np.float32), ('y2', np.float32),
+    ('cx', np.float32), ('cy', np.float32)])
 
-def detectObject(image, filterObjs,visible=True):
+
+def id_class_name(class_id, classes = classNames):
+    if classes is classNames:
+        class_id = int(class_id)
+        return CLASS_LOOKUP[class_id] if 0 <= class_id < len(CLASS_LOOKUP) and CLASS_LOOKUP[class_id] != '' else None
+    return classes.get(int(class_id))
+
+
+# filter (class name, list/set of names or None for all classes) => boolean array indexed by class id (None: no filter)
+def classFilter(filterObjs):
+    if filterObjs is None: return None
+    if isinstance(filterObjs, str): filterObjs = (filterObjs,)
+    key = tuple(sorted(filterObjs))
+    mask = classFilters.get(key)
+    if mask is None:
+        mask = np.zeros(256, bool)    # indexed by class id as uint8 (ids above the model's classes stay False)
+        mask[:len(CLASS_LOOKUP)] = [name in filterObjs and name != '' for name in CLASS_LOOKUP]
+        classFilters[key] = mask
+    return mask
+
+classFilters = {}     # filter names => mask (see classFilter)
+
+
+# SSD output tensor (1, 1, N, 7: imageId, classId, confidence, x1, y1, x2, y2) => structured array of detections
+def postProcess(output, classMask = None, threshold = CONFIDENCE_THRESHOLD):
+    rows = output[0, 0]
+    rows = rows[rows[:, 2] > threshold]
+    if not classMask is None: rows = rows[classMask[rows[:, 1].astype(np.uint8)]]
+    if len(rows) > 1: rows = rows[np.argsort(-rows[:, 2], kind='stable')]
+    detections = np.empty(len(rows), DETECTION_DTYPE)
+    detections['classId'] = rows[:, 1]
+    detections['confidence'] = rows[:, 2]
+    detections['x1'] = rows[:, 3]
+    detections['y1'] = rows[:, 4]
+    detections['x2'] = rows[:, 5]
+    detections['y2'] = rows[:, 6]
+    detections['cx'] = (rows[:, 3] + rows[:, 5]) * 0.5
+    detections['cy'] = (rows[:, 4] + rows[:, 6]) * 0.5
+    return detections
+
+
+def drawDetections(image, detections):
+    image_height, image_width, _ = image.shape
+    for detection in detections:
+        class_name = CLASS_LOOKUP[detection['classId']]
+        box_x = detection['x1'] * image_width
+        box_y = detection['y1'] * image_height
+        cv2.rectangle(image, (int(box_x), int(box_y)), (int(detection['x2'] * image_width), int(detection['y2'] * image_height)), (50, 50, 255), thickness=3)
+        cv2.putText(image,class_name + ' ' + str(round(float(detection['confidence']),1)) ,(int(box_x), int(box_y+.1*image_height)),cv2.FONT_HERSHEY_SIMPLEX,(.002*image_width),(0, 0, 255), 10)
+
+
+# all detections (structured array, see DETECTION_DTYPE) of classes in filterObjs, annotated/shown if visible
+def findObjects(image, filterObjs = None, visible = False, size = None):
+    if size is None: size = inputSize
+    model.setInput(cv2.dnn.blobFromImage(image, size=(size, size), swapRB=True))
+    detections = postProcess(model.forward(), classFilter(filterObjs))
+    if VERBOSE:
+        for detection in detections:
+            print(CLASS_LOOKUP[detection['classId']], str(round(float(detection['confidence']),1)), 'center_x', detection['cx'], 'center_y', detection['cy'], 'top_y', detection['y1'])
+    if visible:
+        drawDetections(image, detections)
+        cv2.imshow('objects', image)
+    return detections
+
+
+# image region roi (x1, y1, x2, y2 normalized, None: full image) => sub image, pixel bounds (x1, y1, x2, y2)
+def regionImage(image, roi):
     image_height, image_width, _ = image.shape
-    model.setInput(cv2.dnn.blobFromImage(image, size=(300, 300), swapRB=True))
+    if roi is None: return image, (0, 0, image_width, image_height)
+    x1, y1 = int(roi[0] * image_width), int(roi[1] * image_height)
+    x2, y2 = max(x1 + 1, int(roi[2] * image_width)), max(y1 + 1, int(roi[3] * image_height))
+    return image[y1:y2, x1:x2], (x1, y1, x2, y2)
+
+
+# detections of region (pixel bounds, see regionImage) => full image coordinates (in place)
+def fromRegion(detections, image, bounds):
+    image_height, image_width, _ = image.shape
+    x1, y1, x2, y2 = bounds
+    for fields, offset, scale in ((('x1', 'x2', 'cx'), x1 / image_width, (x2 - x1) / image_width),
+            (('y1', 'y2', 'cy'), y1 / image_height, (y2 - y1) / image_height)):
+        for field in fields: detections[field] = offset + detections[field] * scale
+    return detections
+
+
+# detections in region of interest roi (x1, y1, x2, y2 normalized, None: full image), network input 'size' (None: inputSize),
+# returned in full image coordinates
+def findObjectsInRegion(image, roi = None, filterObjs = None, size = None):
+    if roi is None: return findObjects(image, filterObjs, False, size)
+    region, bounds = regionImage(image, roi)
+    return fromRegion(findObjects(region, filterObjs, False, size), image, bounds)
+
+
+# detections of several images with one forward pass (blobFromImages, the per-call cost is paid once)
+#    rois: region of interest per image (None: full images), returns list of detection arrays (one per image)
+def findObjectsBatch(images, filterObjs = None, size = None, rois = None):
+    if size is None: size = inputSize
+    if rois is None: rois = [None] * len(images)
+    regions = [regionImage(image, roi) for image, roi in zip(images, rois)]
+    model.setInput(cv2.dnn.blobFromImages([region for region, bounds in regions], size=(size, size), swapRB=True))
     output = model.forward()
-    # print(output[0,0,:,:].shape)
-    center_x = 0
-    center_y = 0
-    top_y = 0
-
-    for detection in output[0, 0, :, :]:
-        confidence = detection[2]
-        if confidence > .5:
-            class_id = detection[1]
-            class_name=id_class_name(class_id,classNames)
-            if ((filterObjs is not None) and (class_name not in filterObjs)): continue
-            center_x = detection[3] + abs(detection[3] - detection[5])/2
-            center_y = detection[4] + abs(detection[4] - detection[6])/2
-            top_y =  detection[4]
-
-            print(class_name, str(round(confidence,1)), 'center_x', center_x, 'center_y', center_y, 'top_y', top_y)            
-            box_x = detection[3] * image_width
-            box_y = detection[4] * image_height
-            box_width = detection[5] * image_width
-            box_height = detection[6] * image_height
-            cv2.rectangle(image, (int(box_x), int(box_y)), (int(box_width), int(box_height)), (50, 50, 255), thickness=3)
-            cv2.putText(image,class_name + ' ' + str(round(confidence,1)) ,(int(box_x), int(box_y+.1*image_height)),cv2.FONT_HERSHEY_SIMPLEX,(.002*image_width),(0, 0, 255), 10)
-
-
-    if visible: cv2.imshow('objects', image)
-    #cv2.waitKey(1)
-    return center_x, center_y, top_y
-    # cv2.imwrite("image_box_text.jpg",image)		
+    classMask = classFilter(filterObjs)
+    imageIds = output[0, 0, :, 0]
+    return [fromRegion(postProcess(output[:, :, imageIds == i], classMask), image, bounds)
+        for i, (image, (region, bounds)) in enumerate(zip(images, regions))]
 
 
-def captureVideoImage():
-    global cam, model
+# most confident object of filterObjs:  center_x, center_y, top_y  (0, 0, 0 if nothing found)
+def detectObject(image, filterObjs,visible=True):
+    detections = findObjects(image, filterObjs, visible)
+    if len(detections) == 0: return 0, 0, 0
+    best = detections[0]
+    return float(best['cx']), float(best['cy']), float(best['y1'])
+
+
+# post-processing time per frame: vectorized (postProcess) vs. per-row Python loop
+def benchmarkPostProcess(rows = 100, runs = 1000):
+    rng = np.random.default_rng(1)
+    output = np.zeros((1, 1, rows, 7), np.float32)
+    output[0, 0, :, 1] = np.where(rng.random(rows) < 0.5, 1, rng.integers(1, 91, rows))    # mostly persons
+    output[0, 0, :, 2] = np.sort(rng.random(rows) ** 8)[::-1]      # few confident detections, sorted like SSD output
+    corners = rng.random((rows, 2, 2))
+    output[0, 0, :, 3:5] = corners.min(axis=1)
+    output[0, 0, :, 5:7] = corners.max(axis=1)
+
+    # reference: original per-row loop with linear class name lookup
+    def loop(output, filterObjs):
+        results = []
+        for detection in output[0, 0, :, :]:
+            if detection[2] > CONFIDENCE_THRESHOLD:
+                class_name = None
+                for key, value in classNames.items():
+                    if detection[1] == key:
+                        class_name = value
+                        break
+                if class_name not in filterObjs: continue
+                results.append((detection[1], detection[2], detection[3] + abs(detection[3] - detection[5])/2,
+                    detection[4] + abs(detection[4] - detection[6])/2, detection[4]))
+        return results
+
+    filterObjs = ('person', 'dog', 'car')
+    classMask = classFilter(filterObjs)
+    startTime = time.perf_counter()
+    for i in range(runs): loop(output, filterObjs)
+    loopTime = (time.perf_counter() - startTime) / runs
+    startTime = time.perf_counter()
+    for i in range(runs): postProcess(output, classMask)
+    vectorTime = (time.perf_counter() - startTime) / runs
+    print('----- post-processing (' + str(rows) + ' rows, ' + str(len(postProcess(output, classMask))) + ' detections) -----')
+    print('python loop :', round(loopTime * 1e6, 1), 'us/frame')
+    print('vectorized  :', round(vectorTime * 1e6, 1), 'us/frame')
+
+
+def openCamera():
+    global cam, lastUseTime, lastFrameSeq, lastFrameTime
     if cam is None:
         print('opening video device...')
-        cam = cv2.VideoCapture(0)
-        if cam is None: return None
+        if FRAME_SOURCE is None:
+            grabber = camera.FrameGrabber(0, IMG_W, IMG_H, FPS)
+        else:
+            import framesource
+            grabber = framesource.openSource(FRAME_SOURCE, IMG_W, IMG_H, FPS)
+        if not grabber.start(): return None
+        cam = grabber
+        lastFrameSeq = 0      # new grabber: sequence numbers start again at 1
+        lastFrameTime = 0
         print('opened video device')
-        cam.set(cv2.CAP_PROP_FOURCC ,cv2.VideoWriter_fourcc(*'MJPG') );
-        cam.set(cv2.CAP_PROP_FRAME_WIDTH, IMG_W)
-        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, IMG_H)
-        cam.set(cv2.CAP_PROP_FPS, FPS)
+    lastUseTime = time.time()
+    return cam
+
+
+# backends supported by this OpenCV build/machine (BACKENDS keys)
+def availableBackends():
+    names = []
+    for name, (backend, target) in BACKENDS.items():
+        if backend == cv2.dnn.DNN_BACKEND_CUDA and cv2.cuda.getCudaEnabledDeviceCount() == 0: continue
+        if target == cv2.dnn.DNN_TARGET_OPENCL and not cv2.ocl.haveOpenCL(): continue
+        if not target in cv2.dnn.getAvailableTargets(backend): continue
+        names.append(name)
+    return names
+
+
+# set backend/target and run warm-up inferences, returns False if the backend does not work
+def setBackend(net, name, size):
+    backend, target = BACKENDS[name]
+    try:
+        net.setPreferableBackend(backend)
+        net.setPreferableTarget(target)
+        blob = cv2.dnn.blobFromImage(np.zeros((size, size, 3), np.uint8), size=(size, size), swapRB=True)
+        for i in range(max(1, WARMUP_RUNS)):
+            net.setInput(blob)
+            net.forward()
+    except cv2.error as e:
+        print('DNN backend', name, 'not working:', e)
+        return False
+    return True
+
 
-        #time.sleep(0.5)
+# select backend ('auto': first working candidate of BACKEND_ORDER), returns backend name
+def selectBackend(net, name = DNN_BACKEND, size = DNN_INPUT_SIZE):
+    available = availableBackends()
+    candidates = [candidate for candidate in BACKEND_ORDER if candidate in available] if name == 'auto' else [name]
+    if not 'cpu' in candidates: candidates.append('cpu')
+    for candidate in candidates:
+        if candidate in available and setBackend(net, candidate, size): return candidate
+    return None
+
+
+def readModel():
+    return cv2.dnn.readNetFromTensorflow('objdet_models/frozen_inference_graph.pb',
+                                      'objdet_models/ssd_mobilenet_v2_coco_2018_03_29.pbtxt')
+
+
+def loadModel(backend = DNN_BACKEND, size = DNN_INPUT_SIZE, threads = DNN_THREADS):
+    global model, backendName, inputSize, lastUseTime
+    if model is None:
         print('starting DNN...')
+        if threads > 0: cv2.setNumThreads(threads)
     
         # Loading model
-        model = cv2.dnn.readNetFromTensorflow('objdet_models/frozen_inference_graph.pb',
-                                      'objdet_models/ssd_mobilenet_v2_coco_2018_03_29.pbtxt')
+        net = readModel()
+        backendName = selectBackend(net, backend, size)
+        if backendName is None: raise RuntimeError('no DNN backend available')
+        inputSize = size
+        model = net
+        print('detect_object started (backend', backendName + ', input', str(size) + 'x' + str(size) + ', threads', str(cv2.getNumThreads()) + ')')
+    lastUseTime = time.time()
+    return model
+
+
+# per-frame inference latency and FPS for each available backend and input size
+def benchmarkModel(image = None, sizes = (160, 224, 300, 416), runs = 30):
+    if image is None: image = np.random.randint(0, 255, (IMG_H, IMG_W, 3), np.uint8)
+    print('----- DNN inference (' + str(image.shape[1]) + 'x' + str(image.shape[0]) + ' image, threads ' + str(cv2.getNumThreads()) + ') -----')
+    for name in availableBackends():
+        for size in sizes:
+            net = readModel()
+            if not setBackend(net, name, size): break
+            latencies = []
+            for i in range(runs):
+                startTime = time.perf_counter()
+                net.setInput(cv2.dnn.blobFromImage(image, size=(size, size), swapRB=True))
+                net.forward()
+                latencies.append(time.perf_counter() - startTime)
+            latencies.sort()
+            mean = sum(latencies) / len(latencies)
+            print(name, str(size) + 'x' + str(size), ': latency (ms) p50', round(latencies[len(latencies) // 2] * 1000.0, 1),
+                'max', round(latencies[-1] * 1000.0, 1), ' FPS', round(1.0 / mean, 1))
+
+
+# open cameras (configurations: see CAMERAS), returns camera.CameraSet or None if no camera could be opened
+def openCameras(configs = CAMERAS):
+    global cameras, lastUseTime
+    if cameras is None:
+        print('opening video devices...')
+        cameraSet = camera.CameraSet(configs)
+        for name in cameraSet.start(): print('error opening camera', name)
+        if not cameraSet.isRunning(): return None
+        cameras = cameraSet
+        print('opened video devices', [name for name, grabber in cameras.grabbers.items() if grabber.isRunning()])
+    lastUseTime = time.time()
+    return cameras
+
+
+def releaseCameras():
+    global cameras
+    if cameras is None: return
+    print('closing video devices...')
+    cameras.stop()
+    cameras = None
+
+
+# newest frame of each camera (opened by openCameras), all detected with one forward pass
+#    returns list of CameraDetection (tagged by camera name), empty if no camera delivered a new frame within timeout
+def detectCameras(filterObjs = 'person', timeout = FRAME_TIMEOUT):
+    global lastUseTime
+    if openCameras() is None: return []
+    loadModel()
+    lastUseTime = time.time()
+    frames = cameras.latest(timeout)
+    if len(frames) == 0: return []
+    detections = findObjectsBatch([frame for frame, captureTime, seq in frames.values()], filterObjs)
+    return [CameraDetection(name, captureTime, seq, cameraDetections)
+        for (name, (frame, captureTime, seq)), cameraDetections in zip(frames.items(), detections)]
+
+
+# camera throughput with one batched forward pass per cycle vs. one forward pass per camera (synthetic frames)
+def benchmarkCameras(count = 2, runs = 20):
+    loadModel()
+    images = [np.random.randint(0, 255, (IMG_H, IMG_W, 3), np.uint8) for i in range(count)]
+    findObjectsBatch(images)    # warm-up (batch shape)
+    print('----- multi-camera inference (' + str(count) + ' cameras, backend ' + str(backendName) + ', input ' + str(inputSize) + ') -----')
+    for name, func in (('per camera', lambda: [findObjects(image) for image in images]), ('batched', lambda: findObjectsBatch(images))):
+        startTime = time.perf_counter()
+        for i in range(runs): func()
+        duration = time.perf_counter() - startTime
+        print(name, ': cycle', round(duration / runs * 1000.0, 1), 'ms ', round(runs * count / duration, 1), 'frames/s')
+
+
+def isModelLoaded():
+    return not model is None
+
+
+def releaseCamera():
+    global cam, lastFrameSeq, lastFrameTime
+    if cam is None: return
+    print('closing video device...')
+    cam.stop()
+    cam = None
+    lastFrameSeq = 0
+    lastFrameTime = 0
 
-        model.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
-        model.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
-        print('detect_object started')
-        #time.sleep(0.5)
 
+def releaseModel():
+    global model, backendName
+    if model is None: return
+    print('releasing DNN...')
+    model = None
+    backendName = None
+    gc.collect()
 
-    ret, img = cam.read()
-    if not ret: return None
+
+# release camera/model when not used for a while (call periodically while follow-me is idle),
+# both are reacquired on the next captureVideoImage call
+def releaseIdle():
+    idleTime = time.time() - lastUseTime
+    if not cam is None and idleTime > CAMERA_IDLE_TIMEOUT: releaseCamera()
+    if not cameras is None and idleTime > CAMERA_IDLE_TIMEOUT: releaseCameras()
+    if not model is None and idleTime > MODEL_IDLE_TIMEOUT: releaseModel()
+
+
+# process memory and CPU usage (to compare active and idle state)
+def resourceUsage():
+    with open('/proc/self/statm', 'r') as f:
+        rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024.0 / 1024.0
+    t = os.times()
+    return {
+        'camera': not cam is None or not cameras is None,
+        'model': not model is None,
+        'backend': backendName,
+        'rssMB': round(rss, 1),
+        'cpuTime': t.user + t.system,    # process CPU time (sec)
+    }
+
+
+# open camera and load model in advance (so the first captureVideoImage/detectObject call does not stall)
+def preload():
+    openCamera()
+    loadModel()
+
+
+# newest camera frame (waits for the next one if the newest was already returned), None on timeout
+# the image stays valid until the next captureVideoImage/captureFrame call
+def captureVideoImage():
+    loadModel()
+    return captureFrame()
+
+
+# same as captureVideoImage, without loading the DNN model (e.g. detection in worker process, see detect_worker.py)
+def captureFrame(timeout = FRAME_TIMEOUT):
+    global lastUseTime, lastFrameSeq, lastFrameTime
+    if openCamera() is None: return None
+    lastUseTime = time.time()
+
+    result = cam.wait(lastFrameSeq, timeout)
+    if result is None: return None
+    img, lastFrameTime, lastFrameSeq = result
     cv2.waitKey(1)    
     return img   
+
+
+# age of the last frame returned by captureVideoImage (sec)
+def frameAge():
+    return time.monotonic() - lastFrameTime
     
 
 
+# measure memory and CPU usage while active (capture + detection), with camera suspended and with model released
+def measureLifecycle(duration = 10.0):
+    def measure(state, func):
+        startUsage = resourceUsage()
+        startTime = time.time()
+        while time.time() < startTime + duration:
+            func()
+        usage = resourceUsage()
+        cpu = (usage['cpuTime'] - startUsage['cpuTime']) / (time.time() - startTime) * 100.0
+        print(state, ': camera', usage['camera'], 'model', usage['model'], 'RSS', usage['rssMB'], 'MB', 'CPU', round(cpu), '%')
+
+    def active():
+        img = captureVideoImage()
+        if not img is None: detectObject(img, 'person', False)
+
+    measure('active', active)
+    releaseCamera()
+    measure('camera suspended', lambda: time.sleep(0.1))
+    releaseModel()
+    measure('model released', lambda: time.sleep(0.1))
+    startTime = time.time()
+    captureVideoImage()
+    print('reacquire:', round(time.time() - startTime, 2), 'sec')
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'lifecycle':
+        measureLifecycle()
+        exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'postbench':
+        benchmarkPostProcess()
+        exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'multibench':
+        # python detect_object.py multibench [cameras]
+        benchmarkCameras(int(sys.argv[2]) if len(sys.argv) > 2 else 2)
+        exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        # python detect_object.py bench [image.jpg]
+        benchmarkModel(cv2.imread(sys.argv[2]) if len(sys.argv) > 2 else None)
+        exit()
     while (cv2.waitKey(1) != 0x1b):
-        img = captureVideoImage()
-        #img = cv2.imread('test1.jpg')
+        img = captureVideoImage()    # OWL_FRAME_SOURCE=test1.jpg python detect_object.py:  image file / video / directory
+        if img is None: break
         detectObject(img, "person")
         #time.sleep(0.05) 
 
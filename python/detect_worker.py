@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - object detection worker process
+#
+# detect_object.detectObject (DNN forward pass) runs in a separate process, so inference never blocks the control loop.
+# frames are handed over through shared memory (one frame slot, the image is never pickled), compact results
+# (Detection tuple) come back through a queue. One frame is in flight at a time: the newest camera frame is submitted
+# as soon as the previous result has arrived. The control loop only ever takes the latest result (detect()).
+#
+# usage (control loop):
+#    detect_worker.preload()                     # open camera, start worker process (loads DNN model) - in a bringup thread
+#    detection = detect_worker.detect('person')  # never blocks: new result or None (also None until preload is done)
+#
+# run 'python detect_worker.py [seconds] [image.jpg]' to measure control-loop jitter with detection off,
+# in the control loop (detect_object.detectObject) and in the worker process (camera or still image)
+
+
+import collections
+import multiprocessing
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import detect_object
+import inference_server
+
+
+START_TIMEOUT = 60.0    # max. time for worker start incl. DNN model loading (sec)
+
+# cx, cy: center, topY: top of most confident object (normalized image coordinates, 0 if nothing found)
+# detections: all objects (detect_object.DETECTION_DTYPE array, e.g. for tracker.py)
+# roi, size: detection region (None: full frame) and network input size (see scheduler.py)
+Detection = collections.namedtuple('Detection', 'seq captureTime cx cy topY inferenceTime detections roi size')
+
+worker = None
+
+
+# worker process: detect objects in the shared frame slot for each request
+# (inference service if running, see inference_server.py, otherwise the model is loaded in the worker)
+def workerMain(shmName, shape, filterObjs, requests, results):
+    shm = shared_memory.SharedMemory(name=shmName)
+    frame = np.ndarray(shape, np.uint8, shm.buf)
+    detector = inference_server.Detector()
+    detector.prepare()
+    results.put(None)    # ready
+    while True:
+        request = requests.get()
+        if request is None: break
+        seq, captureTime, roi, size = request
+        startTime = time.monotonic()
+        detections = detector.findObjectsInRegion(frame, roi, filterObjs, size)
+        cx, cy, topY = (float(detections[0]['cx']), float(detections[0]['cy']), float(detections[0]['y1'])) if len(detections) > 0 else (0, 0, 0)
+        results.put(Detection(seq, captureTime, cx, cy, topY, time.monotonic() - startTime, detections, roi, size))
+    detector.close()
+    del frame
+    shm.close()
+
+
+
+class DetectWorker():
+    def __init__(self, filterObjs = 'person', width = detect_object.IMG_W, height = detect_object.IMG_H):
+        self.filterObjs = filterObjs
+        self.shape = (height, width, 3)
+        self.shm = None
+        self.frame = None         # shared frame slot (numpy view)
+        self.process = None
+        self.requests = None
+        self.results = None
+        self.ready = False        # model loaded in worker
+        self.inFlight = False     # frame submitted, result pending
+        self.result = None        # latest Detection
+        self.submitted = 0
+        self.received = 0
+        self.submitTime = 0       # time.monotonic of last submit
+
+    # start worker process (returns immediately, see waitReady)
+    def start(self):
+        if not self.process is None: return
+        # forkserver: the worker is forked from a clean server process (started once, single-threaded), not from this
+        # process with its BLE/CAN/camera threads (their locks and thread pools would be copied in an unknown state).
+        # the main script is imported in the worker, it needs an 'if __name__ == "__main__"' guard
+        context = multiprocessing.get_context('forkserver')
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)))
+        self.frame = np.ndarray(self.shape, np.uint8, self.shm.buf)
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=workerMain, name='detect',
+            args=(self.shm.name, self.shape, self.filterObjs, self.requests, self.results), daemon=True)
+        self.process.start()
+
+    # wait until DNN model is loaded in worker process
+    def waitReady(self, timeout = START_TIMEOUT):
+        stopTime = time.monotonic() + timeout
+        while not self.ready and self.isAlive() and time.monotonic() < stopTime:
+            self.poll(0.1)
+        return self.ready
+
+    def stop(self):
+        if self.process is None: return
+        self.requests.put(None)
+        self.process.join(2.0)
+        if self.process.is_alive(): self.process.terminate()
+        self.process = None
+        self.frame = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        self.ready = False
+        self.inFlight = False
+
+    def isAlive(self):
+        return not self.process is None and self.process.is_alive()
+
+    def busy(self):
+        return not self.ready or self.inFlight
+
+    # hand frame to worker (copied into shared memory), returns False if worker is busy
+    # roi: detect in region of interest only (x1, y1, x2, y2 normalized), size: network input size (None: default)
+    def submit(self, img, seq, captureTime, roi = None, size = None):
+        self.poll()
+        if self.busy(): return False
+        if img.shape == self.shape:
+            self.frame[:] = img
+        else:
+            cv2.resize(img, (self.shape[1], self.shape[0]), dst=self.frame)
+        self.requests.put((seq, captureTime, roi, size))
+        self.submitTime = time.monotonic()
+        self.inFlight = True
+        self.submitted += 1
+        return True
+
+    # collect results (wait up to 'timeout' for one), returns True if a new result arrived
+    def poll(self, timeout = 0):
+        received = False
+        while not self.results is None:
+            try:
+                result = self.results.get(timeout=timeout) if timeout > 0 else self.results.get_nowait()
+            except queue.Empty:
+                break
+            timeout = 0
+            if result is None:
+                self.ready = True
+                continue
+            self.result = result
+            self.inFlight = False
+            self.received += 1
+            received = True
+        return received
+
+    # latest result (Detection) or None
+    def latest(self):
+        self.poll()
+        return self.result
+
+
+
+# open camera and start worker process (blocks until the model is loaded)
+def preload(filterObjs = 'person'):
+    global worker
+    if not worker is None and not worker.isAlive():
+        worker.stop()
+        worker = None
+    if worker is None:
+        worker = DetectWorker(filterObjs)
+        worker.start()
+    if detect_object.openCamera() is None:
+        raise RuntimeError('camera not available')
+    if not worker.waitReady():
+        raise RuntimeError('detection worker not started')
+
+
+def isModelLoaded():
+    return not worker is None and worker.ready and worker.isAlive()
+
+
+def isCameraOpen():
+    return not detect_object.cam is None
+
+
+# release camera/worker process when not used for a while (see detect_object.releaseIdle)
+def releaseIdle():
+    global worker
+    detect_object.releaseIdle()
+    if not worker is None and time.time() - detect_object.lastUseTime > detect_object.MODEL_IDLE_TIMEOUT:
+        print('stopping detection worker...')
+        worker.stop()
+        worker = None
+
+
+# submit newest camera frame if the worker is idle (and 'interval' sec passed since the last submit),
+# roi/size: region of interest and network input size (see scheduler.py)
+# returns new Detection result (or None), never blocks: None while camera/worker are not loaded (see preload)
+def detect(filterObjs = 'person', interval = 0, roi = None, size = None):
+    if not isModelLoaded() or not isCameraOpen(): return None
+    lastSeq = worker.received
+    if not worker.busy() and time.monotonic() >= worker.submitTime + interval:
+        img = detect_object.captureFrame(0)
+        if not img is None: worker.submit(img, detect_object.lastFrameSeq, detect_object.lastFrameTime, roi, size)
+    result = worker.latest()
+    if worker.received == lastSeq: return None
+    return result
+
+
+
+# control-loop jitter benchmark: 100 Hz loop (like ble_server2.py in follow-me), deviation of the loop period
+def measureJitter(mode, duration, image):
+    interval = 0.01
+    periods = []
+    results = 0
+    detector = None
+    if mode == 'worker':
+        detector = DetectWorker()
+        detector.start()
+        detector.waitReady()
+    elif mode == 'inline':
+        detect_object.loadModel()
+    seq = 0
+    lastTime = time.monotonic()
+    stopTime = lastTime + duration
+    while lastTime < stopTime:
+        nextTime = lastTime + interval
+        if mode != 'off':
+            seq += 1
+            img = image if not image is None else detect_object.captureFrame(0)
+            if mode == 'inline':
+                if img is None: img = detect_object.captureFrame()
+                detect_object.detectObject(img, 'person', False)
+                results += 1
+            elif not img is None:
+                detector.submit(img, seq, time.monotonic())
+                results += detector.poll()
+        delay = nextTime - time.monotonic()
+        if delay > 0: time.sleep(delay)
+        t = time.monotonic()
+        periods.append(t - lastTime)
+        lastTime = t
+    if not detector is None: detector.stop()
+    periods.sort()
+    ms = lambda s: round(s * 1000.0, 1)
+    print(mode, ': loop period (ms) p50', ms(periods[len(periods) // 2]), 'p95', ms(periods[int(len(periods) * 0.95)]),
+        'max', ms(periods[-1]), ' detections/s', round(results / duration, 1))
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    image = cv2.imread(sys.argv[2]) if len(sys.argv) > 2 else None
+    if image is None and detect_object.openCamera() is None:
+        print('error opening camera')
+        exit()
+    print('----- control-loop jitter (100 Hz loop, ' + str(duration) + ' sec) -----')
+    for mode in ('off', 'worker', 'inline'):
+        measureJitter(mode, duration, image)
+    detect_object.releaseCamera()
@@ -7,6 +7,35 @@
 import math
 import time
 import owlrobot as owl
+import tracepoints
+
+
+# -------unicycle model equations----------
+#      L: wheel-to-wheel distance
+#     VR: right speed (m/s)
+#     VL: left speed  (m/s)
+#  omega: rotation speed (rad/s)
+#      V     = (VR + VL) / 2       =>  VR = V + omega * L/2
+#      omega = (VR - VL) / L       =>  VL = V - omega * L/2
+# (plain arithmetic only, so the functions also work on numpy arrays, e.g. for the fleet simulator)
+
+# inverse kinematics (body velocities => wheel speeds)
+#    returns VL, VR
+def wheelSpeeds(vx, oz, wheelToBodyCenterY):
+    L = wheelToBodyCenterY * 2.0
+    VR = vx + oz * L/2
+    VL = vx - oz * L/2
+    return VL, VR
+
+
+# forward kinematics (wheel speeds => body velocities)
+#    returns vx, vy, oz
+def bodySpeeds(VL, VR, wheelToBodyCenterY):
+    L = wheelToBodyCenterY * 2.0
+    vx = (VR + VL) / 2.0
+    oz = (VR - VL) / L
+    return vx, 0 * vx, oz
+
 
 
 class DifferentialDriveRobot(owl.Robot):
@@ -25,26 +54,17 @@ class DifferentialDriveRobot(owl.Robot):
     def forwardKinematics(self):      
         # compute forward kinematics (measured motor velocitities => body velocities)
 
-        dt = (time.time() - self.lastDriveTime) 
-        self.lastDriveTime = time.time()
+        now = self.clock()
+        dt = (now - self.lastDriveTime) 
+        self.lastDriveTime = now
 
         # linear: m/s
         # angular: rad/s
-        # -------unicycle model equations----------
-        #      L: wheel-to-wheel distance
-        #     VR: right speed (m/s)
-        #     VL: left speed  (m/s)
-        #  omega: rotation speed (rad/s)
-        #      V     = (VR + VL) / 2       =>  VR = V + omega * L/2
-        #      omega = (VR - VL) / L       =>  VL = V - omega * L/2
-
-        L = self.wheelToBodyCenterY * 2.0
+        # (unicycle model equations, see above)
+
         VL = self.leftMotor.getSpeed()
         VR = self.rightMotor.getSpeed()
-        
-        self.odoVelX     = (VR + VL) / 2.0
-        self.odoVelY     = 0
-        self.odoVelTheta = (VR - VL) / L
+        self.odoVelX, self.odoVelY, self.odoVelTheta = bodySpeeds(VL, VR, self.wheelToBodyCenterY)
         self.odoX += (self.odoVelX * math.cos(self.odoTheta) - self.odoVelY * math.sin(self.odoTheta)) * dt
         self.odoY += (self.odoVelX * math.sin(self.odoTheta) + self.odoVelY * math.cos(self.odoTheta)) * dt
         self.odoTheta += self.odoVelTheta * dt
@@ -59,24 +79,17 @@ class DifferentialDriveRobot(owl.Robot):
 
     def setRobotSpeed(self, vx, vy, oz):
 
-        cmdVelX = vx    # forward velocity command (m/s)
-        cmdVelY = 0     # sideways velocity command (m/s)
-        cmdVelTheta = oz  # rotational velocity command (rad/s) 
+        self.cmdVelX = vx    # forward velocity command (m/s)
+        self.cmdVelY = 0     # sideways velocity command (m/s)
+        self.cmdVelTheta = oz  # rotational velocity command (rad/s) 
 
         # compute inverse kinematics (body velocity commands => motor velocities)
         # linear: m/s
         # angular: rad/s
-        # -------unicycle model equations----------
-        #      L: wheel-to-wheel distance
-        #     VR: right speed (m/s)
-        #     VL: left speed  (m/s)
-        #  omega: rotation speed (rad/s)
-        #      V     = (VR + VL) / 2       =>  VR = V + omega * L/2
-        #      omega = (VR - VL) / L       =>  VL = V - omega * L/2
-
-        L = self.wheelToBodyCenterX * 2.0
-        VR = vx + oz * L/2
-        VL = vx - oz * L/2
+        # (unicycle model equations, see above)
+
+        VL, VR = wheelSpeeds(vx, oz, self.wheelToBodyCenterY)
+        tracepoints.point('kinematics', self.traceSeq)
 
         self.leftMotor.setSpeed(VL); 
         self.rightMotor.setSpeed(VR); 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - frame sources (same interface as camera.FrameGrabber)
+#
+# offline sources deliver every frame in order, one per latest()/wait() call (no frames are dropped, so results are
+# reproducible), and stop at the end of the data (isRunning() False):
+#    VideoFileSource   recorded video file (any format OpenCV can read)
+#    ImageDirSource    image files of a directory (sorted by name)
+#    SyntheticSource   generated frames (moving colored boxes, deterministic)
+# openSource(spec) creates a source from a string:  camera index ('0'), 'synthetic[:frames]', directory or video file.
+# detect_object uses the source given by OWL_FRAME_SOURCE instead of the camera (e.g. follow-me on a recorded video)
+#
+# benchmark of the vision pipeline on a fixed dataset:  python test/benchvision.py
+
+
+import glob
+import os
+import time
+import cv2
+import numpy as np
+
+import camera
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+
+# base class of offline sources: subclasses implement open(), read() (next frame or None) and close()
+class FrameSource():
+    def __init__(self, name):
+        self.name = name
+        self.seq = 0
+        self.running = False
+
+    def start(self):
+        if self.running: return True
+        if not self.open(): return False
+        self.seq = 0
+        self.running = True
+        return True
+
+    def stop(self):
+        if not self.running: return
+        self.running = False
+        self.close()
+
+    def isRunning(self):
+        return self.running
+
+    def open(self):
+        return True
+
+    def close(self):
+        pass
+
+    # next frame:  (frame, captureTime, seq)  or None at the end of the data
+    def latest(self, lastSeq = 0):
+        if not self.running: return None
+        frame = self.read()
+        if frame is None:
+            self.stop()
+            return None
+        self.seq += 1
+        return frame, time.monotonic(), self.seq
+
+    def wait(self, lastSeq = 0, timeout = 1.0):
+        return self.latest(lastSeq)
+
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, fileName, loop = False):
+        FrameSource.__init__(self, os.path.basename(fileName))
+        self.fileName = fileName
+        self.loop = loop
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.fileName)
+        if self.cap.isOpened(): return True
+        self.cap = None
+        return False
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def close(self):
+        self.cap.release()
+        self.cap = None
+
+
+
+class ImageDirSource(FrameSource):
+    def __init__(self, directory, loop = False):
+        FrameSource.__init__(self, os.path.basename(os.path.normpath(directory)))
+        self.directory = directory
+        self.loop = loop
+        self.fileNames = []
+        self.index = 0
+
+    def open(self):
+        self.fileNames = sorted(fileName for fileName in glob.glob(os.path.join(self.directory, '*'))
+            if fileName.lower().endswith(IMAGE_EXTENSIONS))
+        self.index = 0
+        return len(self.fileNames) > 0
+
+    def read(self):
+        while self.index < len(self.fileNames) or (self.loop and len(self.fileNames) > 0):
+            if self.index >= len(self.fileNames): self.index = 0
+            frame = cv2.imread(self.fileNames[self.index])
+            self.index += 1
+            if not frame is None: return frame
+        return None
+
+
+
+# moving colored boxes on a gradient background (same frames for the same seed)
+class SyntheticSource(FrameSource):
+    def __init__(self, frames = 100, width = 640, height = 480, objects = 2, seed = 1):
+        FrameSource.__init__(self, 'synthetic')
+        self.frames = frames
+        self.width = width
+        self.height = height
+        rng = np.random.default_rng(seed)
+        self.boxes = rng.random((objects, 4))          # x, y, vx, vy (normalized, per frame / 100)
+        self.colors = rng.integers(0, 255, (objects, 3))
+        gradient = np.linspace(40, 200, width, dtype=np.uint8)
+        self.background = np.repeat(np.repeat(gradient[None, :, None], height, axis=0), 3, axis=2)
+        self.index = 0
+
+    def open(self):
+        self.index = 0
+        return True
+
+    def read(self):
+        if self.index >= self.frames: return None
+        frame = self.background.copy()
+        for (x, y, vx, vy), color in zip(self.boxes, self.colors):
+            cx = abs(((x + (vx - 0.5) * self.index / 100.0) % 2.0) - 1.0)     # bounce between 0 and 1
+            cy = abs(((y + (vy - 0.5) * self.index / 100.0) % 2.0) - 1.0)
+            w, h = self.width // 8, self.height // 3
+            x1, y1 = int(cx * (self.width - w)), int(cy * (self.height - h))
+            cv2.rectangle(frame, (x1, y1), (x1 + w, y1 + h), tuple(int(c) for c in color), -1)
+        self.index += 1
+        return frame
+
+
+
+# create source from string:  camera index, 'synthetic[:frames]', image directory or video file
+def openSource(spec, width = 640, height = 480, fps = 30):
+    if spec.isdigit(): return camera.FrameGrabber(int(spec), width, height, fps)
+    if spec.startswith('synthetic'):
+        parts = spec.split(':')
+        return SyntheticSource(int(parts[1]) if len(parts) > 1 else 100, width, height)
+    if os.path.isdir(spec): return ImageDirSource(spec)
+    return VideoFileSource(spec)
+
+
+
+if __name__ == "__main__":
+    import sys
+    source = openSource(sys.argv[1] if len(sys.argv) > 1 else 'synthetic')
+    if not source.start():
+        print('error opening source')
+        exit()
+    frames = 0
+    seq = 0
+    startTime = time.perf_counter()
+    while source.isRunning() and frames < 1000:
+        result = source.wait(seq)
+        if result is None: continue
+        seq = result[2]
+        frames += 1
+    duration = time.perf_counter() - startTime
+    print(source.name, ':', frames, 'frames', round(frames / max(duration, 1e-6), 1), 'frames/s')
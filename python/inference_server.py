@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - local inference service (optional)
+#
+# a daemon loads the DNN model once and serves detection requests of several processes (ble_server, detection worker,
+# test and debugging tools) over a Unix socket. Each client connection has its own shared-memory frame buffer
+# (the image is never sent over the socket), requests and results are JSON lines:
+#    client => server   {"op": "attach", "shm": name, "size": bytes}
+#                       {"op": "detect", "id": n, "shape": [h, w, 3], "filter": [names] | null, "roi": [x1, y1, x2, y2] | null, "size": n | null}
+#                       {"op": "metrics"}
+#    server => client   {"id": n, "detections": [[classId, confidence, x1, y1, x2, y2, cx, cy], ...], "batch": n} / {"error": text}
+# requests arriving within BATCH_WINDOW are run as one batched forward pass (same input size and filter).
+# metrics: queue depth, batch sizes, queue and inference latency (log-scale histograms, see tracepoints.py)
+#
+# clients use Detector: the service if it is running, otherwise the model is loaded in-process (fallback)
+#
+# usage:  python inference_server.py [--socket path] [--window 5] [--max-batch 4]     (start daemon)
+#         python inference_server.py --metrics                                          (metrics of running daemon)
+
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import socket
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import detect_object
+import tracepoints
+
+
+SOCKET_PATH = os.environ.get('OWL_INFERENCE_SOCKET', '/tmp/owl_inference.sock')
+BATCH_WINDOW = 0.005       # wait for more requests after the first one (sec)
+MAX_BATCH = 4              # max. requests per forward pass
+REQUEST_TIMEOUT = 5.0      # client: max. time for a detection request (sec)
+RETRY_INTERVAL = 5.0       # client: time until the service is tried again after a connection failure (sec)
+
+
+
+# ----- daemon -----
+
+class Request():
+    def __init__(self, connection, message, image):
+        self.connection = connection
+        self.id = message.get('id')
+        self.filter = message.get('filter')
+        self.roi = message.get('roi')
+        self.size = message.get('size')
+        self.image = image
+        self.time = tracepoints.now()     # arrival (ns)
+        self.result = asyncio.get_running_loop().create_future()
+
+    # requests that can share one forward pass
+    def batchKey(self):
+        return (self.size, None if self.filter is None else tuple(sorted(self.filter)))
+
+
+
+class InferenceServer():
+    def __init__(self, socketPath = SOCKET_PATH, batchWindow = BATCH_WINDOW, maxBatch = MAX_BATCH):
+        self.socketPath = socketPath
+        self.batchWindow = batchWindow
+        self.maxBatch = maxBatch
+        self.queue = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(1, 'inference')
+        self.connections = 0
+        self.requests = 0
+        self.batches = 0
+        self.maxQueueDepth = 0
+        self.queueLatency = tracepoints.Histogram()       # arrival => forward pass start
+        self.inferenceLatency = tracepoints.Histogram()   # forward pass (batch)
+        self.totalLatency = tracepoints.Histogram()       # arrival => result
+
+    # serve until cancelled, returns False if another daemon is already running on the socket
+    async def run(self):
+        if os.path.exists(self.socketPath):
+            client = InferenceClient(self.socketPath)
+            if client.connect():
+                client.close()
+                print('inference service already running on', self.socketPath)
+                return False
+            os.unlink(self.socketPath)    # stale socket of previous daemon
+        self.queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, detect_object.loadModel)
+        server = await asyncio.start_unix_server(self.handleClient, path=self.socketPath)
+        print('inference service on', self.socketPath, '(backend', detect_object.backendName + ')')
+        try:
+            async with server:
+                await asyncio.gather(server.serve_forever(), self.batchLoop())
+        finally:
+            if os.path.exists(self.socketPath): os.unlink(self.socketPath)
+
+    async def handleClient(self, reader, writer):
+        self.connections += 1
+        shm = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                message = json.loads(line)
+                op = message.get('op')
+                if op == 'attach':
+                    if not shm is None: shm.close()
+                    shm = shared_memory.SharedMemory(name=message['shm'])
+                    resource_tracker.unregister(shm._name, 'shared_memory')    # owned (and unlinked) by the client
+                    continue
+                if op == 'metrics':
+                    response = self.metrics()
+                elif op == 'detect' and not shm is None:
+                    image = np.ndarray(tuple(message['shape']), np.uint8, shm.buf)
+                    request = Request(writer, message, image)
+                    await self.queue.put(request)
+                    self.maxQueueDepth = max(self.maxQueueDepth, self.queue.qsize())
+                    response = await request.result
+                    request.image = None    # release shared memory view
+                    del image
+                else:
+                    response = { 'id': message.get('id'), 'error': 'invalid request: ' + str(op) }
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        except (ConnectionError, ValueError, TypeError, OSError) as e:
+            print('inference client error:', e)
+        finally:
+            self.connections -= 1
+            if not shm is None: shm.close()
+            writer.close()
+
+    # collect requests arriving within the batch window, run one forward pass per batch key
+    async def batchLoop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self.queue.get()]
+            deadline = loop.time() + self.batchWindow
+            while len(requests) < self.maxBatch:
+                try:
+                    requests.append(await asyncio.wait_for(self.queue.get(), max(0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            batches = {}
+            for request in requests: batches.setdefault(request.batchKey(), []).append(request)
+            for batch in batches.values():
+                startTime = tracepoints.now()
+                try:
+                    results = await loop.run_in_executor(self.executor, self.infer, batch)
+                except Exception as e:
+                    results = [e] * len(batch)
+                endTime = tracepoints.now()
+                self.batches += 1
+                self.inferenceLatency.add(endTime - startTime)
+                for request, detections in zip(batch, results):
+                    self.requests += 1
+                    self.queueLatency.add(startTime - request.time)
+                    self.totalLatency.add(endTime - request.time)
+                    if isinstance(detections, Exception):
+                        request.result.set_result({ 'id': request.id, 'error': str(detections) })
+                    else:
+                        request.result.set_result({ 'id': request.id, 'batch': len(batch),
+                            'detections': [[int(d['classId'])] + [float(d[key]) for key in detections.dtype.names[1:]] for d in detections] })
+
+    # forward pass of batch (runs in inference thread)
+    def infer(self, batch):
+        return detect_object.findObjectsBatch([request.image for request in batch], batch[0].filter, batch[0].size,
+            [request.roi for request in batch])
+
+    def metrics(self):
+        return { 'connections': self.connections, 'queueDepth': self.queue.qsize(), 'maxQueueDepth': self.maxQueueDepth,
+            'requests': self.requests, 'batches': self.batches, 'meanBatch': round(self.requests / self.batches, 2) if self.batches > 0 else None,
+            'backend': detect_object.backendName, 'queueLatency': self.queueLatency.summary(),
+            'inferenceLatency': self.inferenceLatency.summary(), 'totalLatency': self.totalLatency.summary() }
+
+
+
+# ----- client -----
+
+class InferenceClient():
+    def __init__(self, socketPath = SOCKET_PATH):
+        self.socketPath = socketPath
+        self.sock = None
+        self.file = None
+        self.shm = None
+        self.nextId = 1
+
+    # connect to service, returns False if it is not running
+    def connect(self):
+        if not self.sock is None: return True
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(REQUEST_TIMEOUT)
+            sock.connect(self.socketPath)
+        except OSError:
+            return False
+        self.sock = sock
+        self.file = sock.makefile('rb')
+        return True
+
+    def close(self):
+        if not self.sock is None:
+            self.file.close()
+            self.sock.close()
+        self.sock = None
+        self.file = None
+        if not self.shm is None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def call(self, message):
+        self.sock.sendall((json.dumps(message) + '\n').encode())
+        line = self.file.readline()
+        if not line: raise ConnectionError('inference service closed connection')
+        return json.loads(line)
+
+    # frame buffer in shared memory (reallocated for larger frames)
+    def attach(self, size):
+        if not self.shm is None and self.shm.size >= size: return
+        if not self.shm is None:
+            self.shm.close()
+            self.shm.unlink()
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.sock.sendall((json.dumps({ 'op': 'attach', 'shm': self.shm.name, 'size': size }) + '\n').encode())
+
+    # detections of image (detect_object.DETECTION_DTYPE array), raises OSError/ConnectionError if the service fails
+    def findObjects(self, image, filterObjs = None, roi = None, size = None):
+        image = np.ascontiguousarray(image)
+        self.attach(image.nbytes)
+        np.ndarray(image.shape, np.uint8, self.shm.buf)[:] = image
+        if isinstance(filterObjs, str): filterObjs = [filterObjs]
+        response = self.call({ 'op': 'detect', 'id': self.nextId, 'shape': list(image.shape),
+            'filter': None if filterObjs is None else list(filterObjs), 'roi': None if roi is None else [float(v) for v in roi], 'size': size })
+        self.nextId += 1
+        if 'error' in response: raise RuntimeError(response['error'])
+        return np.array([tuple(d) for d in response['detections']], detect_object.DETECTION_DTYPE)
+
+    def metrics(self):
+        return self.call({ 'op': 'metrics' })
+
+
+
+# detection via inference service if running, otherwise in-process (model loaded on first use)
+class Detector():
+    def __init__(self, socketPath = SOCKET_PATH):
+        self.client = InferenceClient(socketPath)
+        self.retryTime = 0
+
+    # connect to service or load model in-process, returns True if the service is used
+    def prepare(self):
+        if self.useService(): return True
+        detect_object.loadModel()
+        return False
+
+    def useService(self):
+        if not self.client.sock is None: return True
+        if time.monotonic() < self.retryTime: return False
+        if self.client.connect():
+            print('using inference service', self.client.socketPath)
+            return True
+        self.retryTime = time.monotonic() + RETRY_INTERVAL
+        return False
+
+    def findObjectsInRegion(self, image, roi = None, filterObjs = None, size = None):
+        if self.useService():
+            try:
+                return self.client.findObjects(image, filterObjs, roi, size)
+            except (OSError, ConnectionError, ValueError, RuntimeError) as e:
+                # connection failure or inference error in the service: in-process until the next retry
+                print('inference service not available:', e)
+                self.client.close()
+                self.retryTime = time.monotonic() + RETRY_INTERVAL
+        detect_object.loadModel()
+        return detect_object.findObjectsInRegion(image, roi, filterObjs, size)
+
+    def close(self):
+        self.client.close()
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='local inference service')
+    parser.add_argument('--socket', default=SOCKET_PATH, help='Unix socket path')
+    parser.add_argument('--window', type=float, default=BATCH_WINDOW * 1000.0, help='batch window (ms)')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='max. requests per forward pass')
+    parser.add_argument('--metrics', action='store_true', help='print metrics of running service')
+    args = parser.parse_args()
+    if args.metrics:
+        client = InferenceClient(args.socket)
+        if not client.connect():
+            print('inference service not running')
+            sys.exit(1)
+        print(json.dumps(client.metrics(), indent=2))
+        client.close()
+        sys.exit(0)
+    try:
+        if asyncio.run(InferenceServer(args.socket, args.window / 1000.0, args.max_batch).run()) is False: sys.exit(1)
+    except KeyboardInterrupt:
+        pass
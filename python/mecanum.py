@@ -6,6 +6,36 @@
 import math
 import time
 import owlrobot as owl
+import tracepoints
+
+
+# -------mecanum model equations----------
+# https://ecam-eurobot.github.io/Tutorials/software/mecanum/mecanum.html
+#     l1: wheel-axis to body center horizontal distance (m)
+#     l2: wheel-axis to body center vertical distance (m)      
+#     vx, vy, oz: body speed (m/s) (rad/s)
+#     o1, o2, o3, o4: angular wheel speed (rad/s) (front-left, front-right, back-left, back-right)
+#     R: wheel radius (m)
+# (plain arithmetic only, so the functions also work on numpy arrays, e.g. for the fleet simulator)
+
+# inverse kinematics (body velocities => wheel speeds)
+#    returns o1, o2, o3, o4
+def wheelSpeeds(vx, vy, oz, l1, l2, R):
+    o1 = (vx - vy - (l1+l2)* oz) / R
+    o2 = (vx + vy + (l1+l2)* oz) / R
+    o3 = (vx + vy - (l1+l2)* oz) / R
+    o4 = (vx - vy + (l1+l2)* oz) / R
+    return o1, o2, o3, o4
+
+
+# forward kinematics (wheel speeds => body velocities)
+#    returns vx, vy, oz
+def bodySpeeds(o1, o2, o3, o4, l1, l2, R):
+    vx = ( o1 + o2 + o3 + o4) * R / 4.0
+    vy = (-o1 + o2 + o3 - o4) * R / 4.0
+    oz = (-o1 + o2 - o3 + o4) * R / (4.0 * (l1+l2))
+    return vx, vy, oz
+
 
 
 class MecanumRobot(owl.Robot):
@@ -38,11 +68,10 @@ class MecanumRobot(owl.Robot):
         o3 = self.leftBackMotor.getSpeed()
         o4 = self.rightBackMotor.getSpeed()
 
-        dt = (time.time() - self.lastDriveTime) 
-        self.lastDriveTime = time.time()
-        self.odoVelX     = ( o1 + o2 + o3 + o4) * R / 4.0
-        self.odoVelY     = (-o1 + o2 + o3 - o4) * R / 4.0
-        self.odoVelTheta = (-o1 + o2 - o3 + o4) * R / (4.0 * (l1+l2))      
+        now = self.clock()
+        dt = (now - self.lastDriveTime) 
+        self.lastDriveTime = now
+        self.odoVelX, self.odoVelY, self.odoVelTheta = bodySpeeds(o1, o2, o3, o4, l1, l2, R)
         self.odoX += (self.odoVelX * math.cos(self.odoTheta) - self.odoVelY * math.sin(self.odoTheta)) * dt
         self.odoY += (self.odoVelX * math.sin(self.odoTheta) + self.odoVelY * math.cos(self.odoTheta)) * dt
         self.odoTheta += self.odoVelTheta * dt
@@ -72,10 +101,8 @@ class MecanumRobot(owl.Robot):
         R = self.wheelDiameter / 2.0
         l1 = self.wheelToBodyCenterX
         l2 = self.wheelToBodyCenterY
-        o1 = (vx - vy - (l1+l2)* oz) / R
-        o2 = (vx + vy + (l1+l2)* oz) / R
-        o3 = (vx + vy - (l1+l2)* oz) / R
-        o4 = (vx - vy + (l1+l2)* oz) / R
+        o1, o2, o3, o4 = wheelSpeeds(vx, vy, oz, l1, l2, R)
+        tracepoints.point('kinematics', self.traceSeq)
 
         self.leftFrontMotor.setSpeed(o1) # M_fl
         self.rightFrontMotor.setSpeed(o2) # M_fr
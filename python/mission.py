@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - waypoint mission player
+# streams waypoints lazily from a route file and follows them with a pure-pursuit controller
+# (on top of the robot odometry computed by forwardKinematics)
+
+# route file format (one waypoint per line, '#' starts a comment):
+#    x, y            (m)
+#    x, y, speed     (m, m/s)   optional per-waypoint speed limit
+# values may be separated by commas or whitespace
+
+
+import collections
+import math
+import sys
+import time
+
+
+# read waypoints lazily (generator) - multi-hour routes are never loaded into memory at once
+def readWaypoints(fileName):
+    with open(fileName, 'r') as f:
+        for lineNo, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if line == '': continue
+            values = line.replace(',', ' ').split()
+            try:
+                x = float(values[0])
+                y = float(values[1])
+                speed = float(values[2]) if len(values) > 2 else None
+            except (IndexError, ValueError):
+                print(fileName, ': invalid waypoint in line', lineNo, ':', line)
+                continue
+            yield (x, y, speed)
+
+
+
+# pure-pursuit path follower
+# only a small window of the path (from the closest waypoint up to the look-ahead point) is kept in memory,
+# the closest and look-ahead waypoints are tracked with incremental indices (no rescan of the path per tick)
+
+class PurePursuit():
+    def __init__(self, waypoints, lookAhead = 0.5, goalTolerance = 0.1):
+        self.waypoints = iter(waypoints)
+        self.lookAhead = lookAhead              # look-ahead distance (m)
+        self.goalTolerance = goalTolerance      # goal reached distance (m)
+        self.path = collections.deque()         # window of not yet passed waypoints (path[0] = closest)
+        self.lookAheadIndex = 0                 # index of look-ahead waypoint in window
+        self.exhausted = False                  # all waypoints read from route?
+        self.finished = False                   # goal reached?
+        self.passedCount = 0                    # number of passed waypoints
+
+    # read more waypoints from route until window holds 'count' waypoints
+    def fill(self, count):
+        while not self.exhausted and len(self.path) < count:
+            try:
+                self.path.append(next(self.waypoints))
+            except StopIteration:
+                self.exhausted = True
+
+    # drop passed waypoints (closest waypoint only moves forward)
+    def advanceClosest(self, x, y):
+        self.fill(2)
+        while len(self.path) > 1:
+            x0, y0, _ = self.path[0]
+            x1, y1, _ = self.path[1]
+            if (x1-x)**2 + (y1-y)**2 > (x0-x)**2 + (y0-y)**2: break
+            self.path.popleft()
+            self.passedCount += 1
+            if self.lookAheadIndex > 0: self.lookAheadIndex -= 1
+            self.fill(2)
+
+    # find look-ahead waypoint (first waypoint after closest one outside look-ahead circle)
+    def advanceLookAhead(self, x, y):
+        ld2 = self.lookAhead * self.lookAhead
+        while True:
+            self.fill(self.lookAheadIndex + 1)
+            if self.lookAheadIndex >= len(self.path):
+                self.lookAheadIndex = len(self.path) - 1   # end of route: steer to goal
+                return
+            px, py, _ = self.path[self.lookAheadIndex]
+            if (px-x)**2 + (py-y)**2 >= ld2: return
+            if self.exhausted and self.lookAheadIndex == len(self.path) - 1: return
+            self.lookAheadIndex += 1
+
+    # compute body velocity command for current robot pose
+    #    returns (vx, oz): forward velocity (m/s), rotational velocity (rad/s)
+    def compute(self, x, y, theta, maxSpeed, maxSpeedTheta):
+        if self.finished: return 0, 0
+        self.advanceClosest(x, y)
+        if len(self.path) == 0:
+            self.finished = True
+            return 0, 0
+        self.advanceLookAhead(x, y)
+
+        gx, gy, _ = self.path[-1]
+        if self.exhausted and (gx-x)**2 + (gy-y)**2 < self.goalTolerance**2:
+            self.finished = True
+            return 0, 0
+
+        px, py, speed = self.path[self.lookAheadIndex]
+        dx = px - x
+        dy = py - y
+        # look-ahead point in robot body coordinates
+        localX =  math.cos(theta) * dx + math.sin(theta) * dy
+        localY = -math.sin(theta) * dx + math.cos(theta) * dy
+        dist2 = localX*localX + localY*localY
+        if dist2 < 1e-9: return 0, 0
+
+        v = maxSpeed
+        if not speed is None: v = min(v, speed)
+        if self.exhausted and self.lookAheadIndex == len(self.path) - 1:
+            # slow down when approaching goal
+            v = min(v, max(math.sqrt(dist2) / self.lookAhead, 0.2) * maxSpeed)
+        if localX < 0: v = 0   # look-ahead point behind robot: turn on the spot
+
+        # curvature of arc through look-ahead point
+        curvature = 2.0 * localY / dist2
+        oz = v * curvature
+        if v == 0: oz = math.copysign(maxSpeedTheta, localY)
+        if abs(oz) > maxSpeedTheta:
+            # keep arc, reduce forward speed
+            if v > 0: v *= maxSpeedTheta / abs(oz)
+            oz = math.copysign(maxSpeedTheta, oz)
+        return v, oz
+
+
+
+# mission player: runs pure-pursuit controller at control rate and outputs robot body velocities
+
+class MissionPlayer():
+    def __init__(self, aRobot, waypoints, lookAhead = 0.5, goalTolerance = 0.1, rate = 10.0):
+        self.robot = aRobot
+        self.follower = PurePursuit(waypoints, lookAhead, goalTolerance)
+        self.rate = rate      # control rate (Hz)
+        self.running = False
+
+    # one control step: update odometry and send body velocities
+    def step(self):
+        self.robot.forwardKinematics()
+        vx, oz = self.follower.compute(self.robot.odoX, self.robot.odoY, self.robot.odoTheta,
+            self.robot.maxSpeedX, self.robot.maxSpeedTheta)
+        self.robot.setRobotSpeed(vx, 0, oz)
+        return not self.follower.finished
+
+    # run mission until goal reached (or stop() called)
+    def run(self):
+        print('mission: started')
+        self.running = True
+        period = 1.0 / self.rate
+        nextTime = time.time()
+        try:
+            while self.running and self.step():
+                nextTime += period
+                delay = nextTime - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    nextTime = time.time()    # overrun: do not try to catch up
+        finally:
+            self.robot.setRobotSpeed(0, 0, 0)
+        print('mission: finished' if self.follower.finished else 'mission: stopped',
+            '- passed waypoints:', self.follower.passedCount)
+
+    def stop(self):
+        self.running = False
+
+
+
+if __name__ == "__main__":
+    import config
+
+    if len(sys.argv) < 2:
+        print('usage: mission.py <route-file>')
+        exit()
+
+    robot = config.createRobot()
+    if robot is None: exit()
+
+    player = MissionPlayer(robot, readWaypoints(sys.argv[1]))
+    player.run()
@@ -7,6 +7,8 @@ import struct
 import os
 import time
 import math
+import startup
+import tracepoints
 import can   # pip install --break-system-packages  python-can
 
 
@@ -22,6 +24,10 @@ RIGHT_BACK_MOTOR_NODE_ID  = 2
 RIGHT_FRONT_MOTOR_NODE_ID = 3
 LEFT_FRONT_MOTOR_NODE_ID  = 4
 
+TRACE_FEEDBACK_MIN_CHANGE = 0.2   # measured wheel speed change (rad/s) counted as feedback (see tracepoints.py)
+VELOCITY_REQUEST_INTERVAL = 0.05  # min. time between motor velocity requests (sec)
+STATUS_REQUEST_INTERVAL   = 1.0   # time between supply voltage/error requests (sec)
+
 
 # what action to do...
 can_cmd_info       = 0  # broadcast something
@@ -52,13 +58,13 @@ can_val_firmware_crc    = 17  #  firmware flash memory CRC (to verify firmware i
 can_val_firmware_ver    = 18  # firmware version
 can_val_broadcast_rx_enable  = 19  # broadcast receive enable state       
 can_val_fifo_target     = 20   # add target (to drive within one clock duration) to FIFO 
-can_val_endswitch_allow_pos_neg_dtargets = 21, # pos/neg delta targets allowed at end-switch?
+can_val_endswitch_allow_pos_neg_dtargets = 21  # pos/neg delta targets allowed at end-switch?
 can_val_reboot          = 22   # reboot MCU
 can_val_endswitch       = 23   # end-switch status
 can_val_fifo_clock      = 24   # FIFO clock signal (process FIFO)
 can_val_control_error   = 25   # control error (setpoint-actual)
-can_val_fifo_target_ack_result_val = 26, # which variable to send in an 'can_val_fifo_target' acknowledge     
-can_val_detected_supply_voltage = 27,  # detected supply voltage
+can_val_fifo_target_ack_result_val = 26  # which variable to send in an 'can_val_fifo_target' acknowledge     
+can_val_detected_supply_voltage = 27   # detected supply voltage
 can_val_angle_add       = 28   # add angle 
 can_val_pwm_speed       = 29   #pwm-speed (-1.0...1.0  =  classic motor controller compatiblity)
 can_val_odo_ticks       = 30   # odometry ticks (encoder ticks   =  classic motor controller compatiblity)
@@ -90,6 +96,12 @@ class Motor():
         self.robot = aRobot
         self.name = aName
         self.speed = 0.0
+        # values reported by motor driver (see Robot.onCanMessage)
+        self.measuredSpeed = None     # rad/s
+        self.supplyVoltage = None     # V
+        self.error = err_ok
+        self.rxTime = 0               # time of last received value
+        aRobot.motors[aNodeId] = self
         print(self.name, ': motor object with nodeId', aNodeId)
 
     # rad/s
@@ -100,6 +112,10 @@ class Motor():
 
     def getSpeed(self):
         return self.speed
+
+    # request value from motor driver (answered with a can_cmd_info frame)
+    def requestValue(self, val):
+        self.robot.sendCanData(self.nodeId, can_cmd_request, val, b'')
     
     
 
@@ -129,9 +145,12 @@ class Robot():
     def __init__(self, aname = "owlRobot"):
         self.name = aname        
         print(self.name, ': init')
+        self.motors = {}                # motors by CAN node ID
+        self.notifier = None
         try:
             self.bus = can.interface.Bus(channel='can0', bustype='socketcan', receive_own_messages=True)
             #notifier = can.Notifier(self.bus, [can.Printer()])
+            self.notifier = can.Notifier(self.bus, [self.onCanMessage])
         except:
             self.bus = None
             print('error opening CAN bus')
@@ -162,10 +181,19 @@ class Robot():
         # bluetooth config
         self.bluetoothAddr = "F0:F1:F2:F3:F4:F5"
         self.bluetoothUSB = False
+        self.bluetoothApp = 'dabble'    # phone app protocol: 'dabble' or 'sunray'
+        self.cameras = ()               # camera configurations (see config.CAMERA_FIELDS)
         
         # --------- motor ----------------------------------------------------------------------------------------
         self.toolMotor = None        
-        self.lastDriveTime = time.time()
+        self.nextStatusRequestTime = 0
+        self.nextVelocityRequestTime = 0
+        # latency tracing (see tracepoints.py)
+        self.traceSeq = None            # input sequence number of current velocity commands (None: not traced)
+        self.traceTx = {}               # sent velocity frame (nodeId, data) => seq  (until echoed)
+        self.traceFeedback = {}         # nodeId => (seq, measured speed at command time)  (until speed changes)
+        self.clock = time.time          # time source for odometry (can be replaced by a virtual clock)
+        self.lastDriveTime = self.clock()
 
     def print(self):
         print('odoX', round(self.odoX, 2), 'odoY', round(self.odoY, 2), 'odoTheta', round(self.odoTheta / math.pi * 180.0))
@@ -173,9 +201,69 @@ class Robot():
     def __del__(self):
         if self.bus is None: return
         print('closing CAN...')        
+        if not self.notifier is None: self.notifier.stop()
         self.bus.shutdown()
 
 
+    # receive CAN frames on an asyncio event loop instead of the notifier thread (see runtime.py)
+    def attachLoop(self, loop):
+        if self.bus is None: return
+        if not self.notifier is None: self.notifier.stop()
+        self.notifier = can.Notifier(self.bus, [self.onCanMessage], loop=loop)
+
+
+    # received CAN frame (called in CAN notifier thread or event loop): store values reported by motor drivers
+    def onCanMessage(self, msg):
+        if msg.arbitration_id != OWL_DRIVE_MSG_ID or len(msg.data) < 8: return
+        cs = CStruct.from_buffer_copy(bytes(msg.data[0:2]) + bytes(2))
+        if cs.sourceId == MY_NODE_ID:
+            # own frame (receive_own_messages): velocity frame is on the bus
+            if len(self.traceTx) > 0 and msg.data[2] == can_cmd_set and msg.data[3] == can_val_velocity:
+                tracepoints.point('canTx', self.traceTx.pop((cs.destId, bytes(msg.data[4:8])), None))
+            return
+        motor = self.motors.get(cs.sourceId)
+        if motor is None or msg.data[2] != can_cmd_info: return
+        val = msg.data[3]
+        if val == can_val_velocity:
+            motor.measuredSpeed = struct.unpack_from('<f', msg.data, 4)[0]
+            if motor.nodeId in self.traceFeedback: self.traceSpeedFeedback(motor)
+        elif val == can_val_detected_supply_voltage:
+            motor.supplyVoltage = struct.unpack_from('<f', msg.data, 4)[0]
+        elif val == can_val_error:
+            motor.error = msg.data[4]
+        else:
+            return
+        motor.rxTime = time.time()
+
+
+    # request motor driver status (velocity at most every VELOCITY_REQUEST_INTERVAL, supply voltage and error
+    # every STATUS_REQUEST_INTERVAL) - called on every control tick, the number of requests on the bus stays bounded
+    def requestMotorStatus(self):
+        t = time.time()
+        fast = t > self.nextVelocityRequestTime
+        slow = t > self.nextStatusRequestTime
+        if not fast and not slow: return
+        if fast: self.nextVelocityRequestTime = t + VELOCITY_REQUEST_INTERVAL
+        if slow: self.nextStatusRequestTime = t + STATUS_REQUEST_INTERVAL
+        for motor in self.motors.values():
+            if fast: motor.requestValue(can_val_velocity)
+            if slow:
+                motor.requestValue(can_val_detected_supply_voltage)
+                motor.requestValue(can_val_error)
+
+
+    # battery voltage (V) reported by motor drivers (None if unknown)
+    def batteryVoltage(self):
+        voltages = [motor.supplyVoltage for motor in self.motors.values() if not motor.supplyVoltage is None]
+        if len(voltages) == 0: return None
+        return max(voltages)
+
+
+    # motor driver errors:  list of (nodeId, error)
+    def motorErrors(self):
+        return [(motor.nodeId, motor.error) for motor in self.motors.values() if motor.error != err_ok]
+
+
     def sendCanData(self, destNodeId, cmd, val, data):        
         if self.bus is None: return
         cs = CStruct()
@@ -197,6 +285,27 @@ class Robot():
         msg = can.Message(arbitration_id=OWL_DRIVE_MSG_ID, data=frame, is_extended_id=False)
         #print(msg)
         self.bus.send(msg, timeout=0.2)
+        if not 'firstCanFrame' in startup.marks: startup.mark('firstCanFrame')
+        if tracepoints.enabled and not self.traceSeq is None and cmd == can_cmd_set and val == can_val_velocity:
+            self.traceVelocityFrame(destNodeId, data)
+
+
+    # trace velocity command sent for input self.traceSeq (see tracepoints.py)
+    def traceVelocityFrame(self, destNodeId, data):
+        seq = self.traceSeq
+        tracepoints.point('canEnqueue', seq)
+        if len(self.traceTx) > 64: self.traceTx.clear()     # no echo (receive_own_messages not supported)
+        self.traceTx[(destNodeId, bytes(data))] = seq
+        motor = self.motors.get(destNodeId)
+        if motor is None or motor.measuredSpeed is None: return
+        if abs(struct.unpack('<f', data)[0] - motor.measuredSpeed) >= TRACE_FEEDBACK_MIN_CHANGE:
+            self.traceFeedback[destNodeId] = (seq, motor.measuredSpeed)
+
+    def traceSpeedFeedback(self, motor):
+        seq, speed = self.traceFeedback[motor.nodeId]
+        if abs(motor.measuredSpeed - speed) < TRACE_FEEDBACK_MIN_CHANGE: return
+        del self.traceFeedback[motor.nodeId]
+        tracepoints.point('feedback', seq)
 
 
     # differential drive platform
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - integrated runtime (Dabble/Sunray app control, same behaviour as ble_server2.py)
+#
+# BLE GATT server (bumble), CAN receive, control loop, telemetry, robot database watcher and follow-me
+# vision result handling all run as tasks on one asyncio event loop (no polling threads, no busy loop).
+# blocking work runs in executors:  CAN sends (one thread, keeps frame order), camera/worker start (one thread).
+# follow-me: DNN inference in the detection worker process (detect_worker.py), rate and crop region by scheduler.py,
+# target estimate between detections by tracker.py
+#
+# usage:  sudo python runtime.py
+# compare idle CPU with the threaded server:  python test/benchidle.py runtime.py  /  ble_server2.py
+
+
+import asyncio
+import concurrent.futures
+import os
+import time
+
+import config
+import scheduler
+import startup
+import telemetry
+import tracepoints
+import tracker
+
+
+PRELOAD_VISION = True    # load camera and DNN model at startup (in background), so follow-me starts instantly
+CONTROL_INTERVAL = 0.1   # CAN update interval without new input (sec)
+FOLLOW_INTERVAL = 1.0 / 30    # follow-me: update interval (target estimate at camera rate, sec)
+BLE_TIMEOUT = 10.0       # max. time until BLE advertising (sec)
+
+
+class Runtime():
+    def __init__(self, robotId, profile):
+        self.robotId = robotId
+        self.profile = profile
+        self.robot = None
+        self.app = None
+        self.canExecutor = concurrent.futures.ThreadPoolExecutor(1, 'can')
+        self.visionExecutor = concurrent.futures.ThreadPoolExecutor(1, 'vision')
+        self.vision = None            # detect_worker module once loaded
+        self.visionTask = None
+        self.visionResult = asyncio.Event()
+        # control state (see ble_server2.py)
+        self.linearSpeedOverride = None
+        self.toolMotorSpeed = 0
+        self.circleButtonTime = 0
+        self.followMe = False
+        self.followSpeeds = (0, 0)    # follow-me: linear, angular speed
+        self.targetTracker = tracker.Tracker()    # follow-me: person tracks (corrected by detections)
+        self.detectionScheduler = scheduler.DetectionScheduler()    # follow-me: detection rate and crop region
+        self.trackTimeout = 0
+        self.oscillateLeft = True
+        self.oscillateTimeout = 0
+        self.sideways = False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        # bring up CAN bus (robot), BLE GATT server and (optional) camera/DNN concurrently
+        robotFuture = loop.run_in_executor(self.canExecutor, config.createRobotFromProfile, self.robotId, self.profile)
+        self.app = config.createDabbleFromProfile(self.profile, background=False)
+        bleTask = asyncio.create_task(self.app.run())
+        if PRELOAD_VISION: self.startVision()
+        self.robot = await robotFuture
+        if self.robot is None or self.robot.bus is None:
+            print('CAN bus not available')
+            return
+        self.robot.attachLoop(loop)
+        await asyncio.to_thread(self.app.advertising.wait, BLE_TIMEOUT)
+        if not self.app.error is None or not self.app.advertising.is_set():
+            print('BLE not available')
+            return
+
+        # make sure motors are stopped at startup
+        await self.canSend(self.robot.setRobotSpeed, 0, 0, 0)
+
+        publisher = telemetry.TelemetryPublisher(self.app, background=False)
+        watcher = config.watchDatabase(self.robot, background=False)
+        tasks = [bleTask, asyncio.create_task(self.controlLoop(publisher)),
+            asyncio.create_task(publisher.runAsync()), asyncio.create_task(watcher.runAsync())]
+        print('press CTRL+C to exit...')
+        await asyncio.gather(*tasks)
+
+    # run robot method in CAN executor (sends in order, never blocks the event loop)
+    async def canSend(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.canExecutor, func, *args)
+
+    # ----- vision (executor) -----
+
+    def startVision(self):
+        future = asyncio.get_running_loop().run_in_executor(self.visionExecutor, self.loadVision)
+        future.add_done_callback(self.visionLoaded)
+        return future
+
+    def loadVision(self):
+        import detect_worker   # lazy import (OpenCV), only needed for follow-me
+        detect_worker.preload()
+        return detect_worker
+
+    def visionLoaded(self, future):
+        if future.exception() is None:
+            self.vision = future.result()
+            startup.mark('vision')
+        else:
+            print('follow-me not available:', future.exception())
+            self.followMe = False
+
+    # camera open and detection worker loaded (and neither released after idle timeout)?
+    def visionReady(self):
+        return not self.vision is None and self.vision.isModelLoaded() and self.vision.isCameraOpen()
+
+    # follow-me: submit frames to the detection worker (rate and crop region by scheduler), tracker estimate at camera rate
+    async def visionLoop(self):
+        loop = asyncio.get_running_loop()
+        if not self.visionReady():
+            # camera/worker not loaded yet (or released): load in background, robot stands still meanwhile
+            try:
+                await self.startVision()
+            except Exception:
+                return    # reported by visionLoaded
+        while self.followMe:
+            t = time.monotonic()
+            interval, roi, size = self.detectionScheduler.plan(t, self.targetTracker,
+                scheduler.moving(self.robot.odoVelX, self.robot.odoVelTheta))
+            # frame copy to the worker (never waits for inference)
+            detection = await loop.run_in_executor(self.visionExecutor, self.vision.detect, 'person', interval, roi, size)
+            if not detection is None:
+                self.targetTracker.update(detection.detections, detection.captureTime)
+                self.detectionScheduler.onResult(detection, time.monotonic())
+            self.onTarget(self.targetTracker.target(time.monotonic()), time.monotonic())
+            self.visionResult.set()
+            await asyncio.sleep(max(0, t + FOLLOW_INTERVAL - time.monotonic()))
+
+    # follow-me: target estimate => speeds
+    def onTarget(self, target, t):
+        speedLinearX = 0
+        speedAngular = 0
+        if not target is None:
+            cx, cy, y = target.estimate(t)
+            if y > 0 and cx > 0 and cy > 0:
+                if cx > 0.6:
+                    # rotate right
+                    speedAngular = self.robot.maxSpeedTheta
+                    self.trackTimeout = time.time() + 2.0
+                elif cx < 0.4:
+                    # rotate left
+                    speedAngular = -self.robot.maxSpeedTheta
+                    self.trackTimeout = time.time() + 2.0
+                elif y > 0.2 and y < 0.7:
+                    # forward
+                    speedLinearX = self.maxLinearSpeed()
+                    self.trackTimeout = time.time() + 2.0
+        if time.time() > self.trackTimeout:
+            # oscillate
+            if time.time() > self.oscillateTimeout:
+                self.oscillateTimeout = time.time() + 2.0
+                self.oscillateLeft = not self.oscillateLeft
+            speedAngular = self.robot.maxSpeedTheta
+            if self.oscillateLeft: speedAngular *= -1
+        self.followSpeeds = (speedLinearX, speedAngular)
+
+    def setFollowMe(self, followMe):
+        self.followMe = followMe
+        print('followMe', followMe)
+        self.followSpeeds = (0, 0)
+        self.targetTracker = tracker.Tracker()
+        self.detectionScheduler = scheduler.DetectionScheduler()
+        if followMe and (self.visionTask is None or self.visionTask.done()):
+            self.visionTask = asyncio.create_task(self.visionLoop())
+
+    # ----- control -----
+
+    def maxLinearSpeed(self):
+        return self.robot.maxSpeedX if self.linearSpeedOverride is None else self.linearSpeedOverride  # m/s
+
+    def handleButtons(self, state):
+        if state.extraButton == 'select':
+            if time.time() > self.circleButtonTime:
+                self.circleButtonTime = time.time() + 0.5
+                self.setFollowMe(not self.followMe)
+        elif state.extraButton == 'start':
+            if time.time() > self.circleButtonTime:
+                self.circleButtonTime = time.time() + 0.5
+                self.sideways = not self.sideways
+                print('sideways', self.sideways)
+        elif state.extraButton == 'triangle':
+            self.linearSpeedOverride = 0.3
+        elif state.extraButton == 'cross':
+            self.linearSpeedOverride = 0.5
+        elif state.extraButton == 'circle':
+            if time.time() > self.circleButtonTime:
+                self.circleButtonTime = time.time() + 0.5
+                if self.toolMotorSpeed == 0:
+                    self.toolMotorSpeed = 100
+                elif self.toolMotorSpeed == 100:
+                    self.toolMotorSpeed = 300
+                else: self.toolMotorSpeed = 0
+                print('toolMotorSpeed', self.toolMotorSpeed)
+        elif state.extraButton == 'rectangle':
+            os.system('shutdown now')
+
+    # joystick => speeds:  forward, sideward, rotational
+    def joystickSpeeds(self, state):
+        maxLinearSpeed = self.maxLinearSpeed()
+        maxAngularSpeed = self.robot.maxSpeedTheta  # rad/s
+        if state.analogMode:
+            # analog values are speeds (Sunray app sends m/s, rad/s): limit to the robot's max. speeds
+            linear = max(-maxLinearSpeed, min(maxLinearSpeed, state.y_value))
+            if self.sideways: return linear, max(-maxLinearSpeed, min(maxLinearSpeed, state.x_value)), 0
+            return linear, 0, max(-maxAngularSpeed, min(maxAngularSpeed, state.x_value))
+        if state.joystickButton == 'up': return maxLinearSpeed, 0, 0
+        if state.joystickButton == 'down': return -maxLinearSpeed, 0, 0
+        if state.joystickButton == 'right': return 0, 0, -maxAngularSpeed
+        if state.joystickButton == 'left': return 0, 0, maxAngularSpeed
+        return 0, 0, 0
+
+    # wait for next follow-me detection (or timeout)
+    async def waitVisionResult(self, timeout):
+        self.visionResult.clear()
+        try:
+            await asyncio.wait_for(self.visionResult.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def controlLoop(self, publisher):
+        lastSeq = None
+        nextCanTime = 0
+        nextReleaseTime = 0
+        wasConnected = False
+        while True:
+            if self.followMe:
+                # follow-me: tick on each detection result (buttons are still handled)
+                await self.waitVisionResult(CONTROL_INTERVAL)
+                state = self.app.input
+            else:
+                # wait for new joystick input (or timeout: periodic CAN update)
+                state = await self.app.nextInput(lastSeq, CONTROL_INTERVAL)
+            newInput = state.seq != lastSeq    # otherwise: stale input sample
+            lastSeq = state.seq
+            if newInput: tracepoints.point('pickup', state.seq)
+
+            if not self.followMe and not self.vision is None and time.time() > nextReleaseTime:
+                # release camera/DNN when follow-me is idle
+                nextReleaseTime = time.time() + 1.0
+                self.visionExecutor.submit(self.vision.releaseIdle)
+
+            if not state.connected:
+                if wasConnected:
+                    # connection lost: stop motors (otherwise they keep the last commanded speed)
+                    print('disconnected: stopping motors')
+                    self.toolMotorSpeed = 0
+                    await self.canSend(self.drive, (0, 0, 0))
+                wasConnected = False
+                continue
+            wasConnected = True
+
+            self.handleButtons(state)
+            if self.followMe:
+                speedLinearX, speedAngular = self.followSpeeds
+                speeds = (speedLinearX, 0, speedAngular)
+            else:
+                speeds = self.joystickSpeeds(state)
+
+            if newInput or self.followMe or time.time() > nextCanTime:
+                nextCanTime = time.time() + CONTROL_INTERVAL
+                await self.canSend(self.drive, speeds, state.seq if newInput else None)
+                robot = self.robot
+                status = { 'odometry': (robot.odoX, robot.odoY, robot.odoTheta),
+                    'velocity': (robot.odoVelX, robot.odoVelY, robot.odoVelTheta),
+                    'battery': robot.batteryVoltage(), 'motorErrors': robot.motorErrors(), 'followMe': self.followMe }
+                publisher.update(**status)
+                self.app.updateStatus(**status)
+
+    # send speeds and status requests (runs in CAN executor)
+    def drive(self, speeds, traceSeq = None):
+        self.robot.traceSeq = traceSeq
+        self.robot.setRobotSpeed(*speeds)
+        if not self.robot.toolMotor is None:
+            self.robot.toolMotor.setSpeed(self.toolMotorSpeed)
+        self.robot.requestMotorStatus()
+        self.robot.forwardKinematics()
+
+
+
+if __name__ == "__main__":
+    # find robot in database
+    robotId, profile = config.findProfile()
+    if profile is None: exit()
+    try:
+        asyncio.run(Runtime(robotId, profile).run())
+    except KeyboardInterrupt:
+        pass
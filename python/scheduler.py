@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - follow-me detection scheduler
+#
+# chooses when to run the next DNN detection and on which image region, from the current state:
+#    rate:  as fast as possible without target, often while the robot moves or the target is near the image edge,
+#           seldom for a stationary robot and a slow target (tracker.py bridges the time between detections)
+#    crop:  region around the predicted target box (network input size scaled down with the region, same resolution),
+#           full frame periodically (new persons, lost target)
+# cost:  inference cost in full-frame inferences (network input pixels relative to the default input size)
+#
+# usage:
+#    interval, roi, size = scheduler.plan(t, targetTracker, scheduler.moving(robot.odoVelX, robot.odoVelTheta))
+#    detection = detect_worker.detect('person', interval, roi, size)
+#    if not detection is None: scheduler.onResult(detection, t)
+#
+# run 'python scheduler.py' for a simulation (cost and target loss compared to full-frame detection at max. rate)
+
+
+import sys
+import numpy as np
+
+import tracker
+
+
+INTERVAL_MOVING = 0.1        # detection interval while the robot moves (sec)
+INTERVAL_EDGE = 0.05         # detection interval while the target is near the image edge (sec)
+EDGE = 0.2                   # image edge zone (normalized)
+MOVING_LINEAR = 0.05         # robot moves above this linear speed (m/s)
+MOVING_ANGULAR = 0.1         # ... or angular speed (rad/s)
+FULL_FRAME_INTERVAL = 1.0    # max. time between full-frame detections (sec)
+ROI_MARGIN = 0.25            # crop margin around predicted target box (box sizes)
+ROI_MOTION_MARGIN = 0.15     # additional horizontal margin while the robot moves (normalized)
+ROI_MIN_SIZE = 0.4           # min. crop side (image heights)
+ROI_MAX_AREA = 0.7           # use full frame if the crop covers more of the image
+ROI_MIN_INPUT = 128          # min. network input size for crops (pixels)
+IMAGE_ASPECT = 4.0 / 3.0     # image width / height (640x480)
+
+
+def moving(linearSpeed, angularSpeed):
+    return abs(linearSpeed) > MOVING_LINEAR or abs(angularSpeed) > MOVING_ANGULAR
+
+
+
+class DetectionScheduler():
+    # inputSize: full-frame network input size (None: configured model input size, detect_object.DNN_INPUT_SIZE)
+    def __init__(self, inputSize = None):
+        self.inputSize = inputSize
+        self.lastFullFrameTime = None
+        self.startTime = None
+        self.detections = 0
+        self.fullFrames = 0
+        self.cost = 0.0               # sum of inference costs (full-frame inferences)
+
+    # next detection:  interval (sec since last submit), roi (x1, y1, x2, y2 normalized or None: full frame), input size
+    def plan(self, t, targetTracker, robotMoving):
+        self.resolveInputSize()
+        target = targetTracker.target(t)
+        if target is None: return tracker.DETECT_INTERVAL_MIN, None, self.inputSize
+        interval = targetTracker.detectionInterval(t)
+        if robotMoving: interval = min(interval, INTERVAL_MOVING)
+        cx = target.estimate(t)[0]
+        if cx < EDGE or cx > 1.0 - EDGE: interval = min(interval, INTERVAL_EDGE)
+        if self.lastFullFrameTime is None or t + interval - self.lastFullFrameTime >= FULL_FRAME_INTERVAL:
+            return interval, None, self.inputSize
+        roi = self.region(target.box(t + interval), robotMoving)
+        if roi is None: return interval, None, self.inputSize
+        return interval, roi, self.regionInputSize(roi)
+
+    # configured size looked up on first use (follow-me running, OpenCV loaded with the detection worker)
+    def resolveInputSize(self):
+        if self.inputSize is None:
+            import detect_object   # lazy import (OpenCV)
+            self.inputSize = detect_object.DNN_INPUT_SIZE
+        return self.inputSize
+
+    # square crop (in pixels) around box, None if it covers most of the image
+    def region(self, box, robotMoving):
+        marginX = (box[2] - box[0]) * ROI_MARGIN + (ROI_MOTION_MARGIN if robotMoving else 0)
+        marginY = (box[3] - box[1]) * ROI_MARGIN
+        side = max(ROI_MIN_SIZE, (box[3] - box[1]) + 2 * marginY, ((box[2] - box[0]) + 2 * marginX) * IMAGE_ASPECT)  # image heights
+        width = side / IMAGE_ASPECT
+        height = side
+        if width * height > ROI_MAX_AREA or width >= 1.0 or height >= 1.0: return None
+        x1 = min(max(0.0, (box[0] + box[2]) / 2 - width / 2), 1.0 - width)
+        y1 = min(max(0.0, (box[1] + box[3]) / 2 - height / 2), 1.0 - height)
+        return (x1, y1, x1 + width, y1 + height)
+
+    # network input size for crop (same resolution as full frame, multiple of 32)
+    def regionInputSize(self, roi):
+        side = max(roi[2] - roi[0], roi[3] - roi[1])
+        return int(min(self.inputSize, max(ROI_MIN_INPUT, round(self.inputSize * side / 32.0) * 32)))
+
+    # detection result (detect_worker.Detection) arrived
+    def onResult(self, detection, t):
+        if self.startTime is None: self.startTime = t
+        self.resolveInputSize()
+        self.detections += 1
+        if detection.roi is None:
+            self.fullFrames += 1
+            self.lastFullFrameTime = detection.captureTime
+        size = self.inputSize if detection.size is None else detection.size
+        self.cost += (size / float(self.inputSize)) ** 2
+
+    def summary(self, t):
+        duration = max(1e-6, t - self.startTime) if not self.startTime is None else 1e-6
+        return { 'detections/s': round(self.detections / duration, 1), 'fullFrames/s': round(self.fullFrames / duration, 1),
+            'cost/s': round(self.cost / duration, 2) }
+
+
+
+if __name__ == "__main__":
+    # simulated follow-me: person walks around (standing still in between), robot turns while the person is off-center.
+    # detections cost 'inferenceTime' per full-frame inference (scaled with input pixels), person found only inside the crop
+    import collections
+    import detect_object
+    inferenceTime = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+    rng = np.random.default_rng(1)
+    fps = 30.0
+    Result = collections.namedtuple('Result', 'captureTime detections roi size')
+
+    def person(t):
+        # center x: standing (0..4 s), walking right (4..7 s), standing (7..12 s), walking left (12..15 s)
+        if t < 4: cx = 0.5
+        elif t < 7: cx = 0.5 + 0.1 * (t - 4)
+        elif t < 12: cx = 0.8
+        else: cx = 0.8 - 0.15 * (t - 12)
+        return cx, 0.55
+
+    def run(scheduled):
+        targetTracker = tracker.Tracker()
+        detectionScheduler = DetectionScheduler(detect_object.DNN_INPUT_SIZE)
+        busyUntil = 0
+        submitTime = -1e9
+        pending = None
+        lostFrames = 0
+        for frame in range(int(15.0 * fps)):
+            t = frame / fps
+            if not pending is None and t >= busyUntil:
+                targetTracker.update(pending.detections, pending.captureTime)
+                detectionScheduler.onResult(pending, t)
+                pending = None
+            target = targetTracker.target(t)
+            robotMoving = not target is None and abs(target.estimate(t)[0] - 0.5) > 0.1
+            if scheduled: interval, roi, size = detectionScheduler.plan(t, targetTracker, robotMoving)
+            else: interval, roi, size = 0, None, detectionScheduler.inputSize
+            if pending is None and t >= busyUntil and t >= submitTime + interval:
+                cx, cy = person(t)
+                cx += rng.normal(0, 0.01)
+                detections = np.zeros(0, detect_object.DETECTION_DTYPE)
+                if roi is None or (roi[0] < cx < roi[2] and roi[1] < cy < roi[3]):
+                    detections = np.array([(1, 0.9, cx - 0.07, cy - 0.2, cx + 0.07, cy + 0.2, cx, cy)], detect_object.DETECTION_DTYPE)
+                pending = Result(t, detections, roi, size)
+                submitTime = t
+                busyUntil = t + inferenceTime * (size / float(detectionScheduler.inputSize)) ** 2
+            if target is None or abs(target.estimate(t)[0] - person(t)[0]) > 0.1: lostFrames += 1
+        print('scheduled' if scheduled else 'full frame', ':', detectionScheduler.summary(t), 'target lost/off frames', lostFrames)
+
+    print('----- detection scheduling (full-frame inference', inferenceTime, 'sec) -----')
+    run(False)
+    run(True)
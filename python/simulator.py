@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - batch fleet simulator
+# steps N robots at once (NumPy state arrays) on a virtual clock, using the kinematic models
+# of diffdrive.py / mecanum.py, with first-order motor lag and wheel speed measurement noise
+#
+# run 'python simulator.py [robots] [steps]' for a robot-steps/second benchmark (one core and process-parallel)
+
+# pip install --break-system-packages numpy
+
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+import config
+import diffdrive
+import mecanum
+
+
+class FleetSimulator():
+    # all robot parameters can be scalars (same for all robots) or arrays with one value per robot
+    #   motorLag: motor time constant (sec), 0 = ideal motors
+    #   speedNoise: standard deviation of measured wheel speeds (wheel speed units of the kinematic model)
+    def __init__(self, robotType, count, wheelToBodyCenterX = 0.0, wheelToBodyCenterY = 0.2, wheelDiameter = 0.15,
+            maxSpeedX = 0.4, maxSpeedY = 0.4, maxSpeedTheta = 0.2, dt = 0.01, motorLag = 0.1, speedNoise = 0.0, seed = None):
+        if not robotType in (config.ROBOT_TYPE_DIFF_DRIVE, config.ROBOT_TYPE_MECANUM):
+            raise ValueError('invalid robot type')
+        self.robotType = robotType
+        self.count = count
+        self.dt = dt
+        self.time = 0.0                     # virtual clock (sec)
+        self.steps = 0
+
+        self.wheelToBodyCenterX = self.param(wheelToBodyCenterX)
+        self.wheelToBodyCenterY = self.param(wheelToBodyCenterY)
+        self.wheelDiameter = self.param(wheelDiameter)
+        self.maxSpeedX = self.param(maxSpeedX)
+        self.maxSpeedY = self.param(maxSpeedY)
+        self.maxSpeedTheta = self.param(maxSpeedTheta)
+        self.speedNoise = self.param(speedNoise)
+        lag = self.param(motorLag)
+        # per-step motor response of first-order lag (1 = ideal motor)
+        self.motorAlpha = np.where(lag > 0, -np.expm1(-dt / np.maximum(lag, 1e-9)), 1.0)
+        self.noisy = bool(np.any(self.speedNoise > 0))
+        self.rng = np.random.default_rng(seed)
+
+        wheels = 2 if robotType == config.ROBOT_TYPE_DIFF_DRIVE else 4
+        self.wheelSpeed = np.zeros((wheels, count))       # actual wheel speeds
+        self.wheelMeasured = np.zeros((wheels, count))    # measured wheel speeds (with noise)
+        self.wheelTarget = np.zeros((wheels, count))      # commanded wheel speeds
+        self.pose = np.zeros((3, count))                  # true pose x, y, theta
+        self.odoPose = np.zeros((3, count))               # odometry pose (from measured wheel speeds)
+        self.velocity = np.zeros((3, count))              # true body velocities vx, vy, oz
+
+    def param(self, value):
+        return np.array(np.broadcast_to(np.asarray(value, dtype=float), (self.count,)))
+
+    # virtual time source (can be assigned to Robot.clock)
+    def clock(self):
+        return self.time
+
+    def reset(self):
+        self.time = 0.0
+        self.steps = 0
+        for a in (self.wheelSpeed, self.wheelMeasured, self.wheelTarget, self.pose, self.odoPose, self.velocity):
+            a.fill(0)
+
+    # inverse kinematics (body velocities => wheel speeds) of the project's robot models
+    def wheelSpeeds(self, vx, vy, oz):
+        if self.robotType == config.ROBOT_TYPE_DIFF_DRIVE:
+            return diffdrive.wheelSpeeds(vx, oz, self.wheelToBodyCenterY)
+        return mecanum.wheelSpeeds(vx, vy, oz, self.wheelToBodyCenterX, self.wheelToBodyCenterY, self.wheelDiameter / 2.0)
+
+    # forward kinematics (wheel speeds => body velocities) of the project's robot models
+    def bodySpeeds(self, wheels):
+        if self.robotType == config.ROBOT_TYPE_DIFF_DRIVE:
+            return diffdrive.bodySpeeds(wheels[0], wheels[1], self.wheelToBodyCenterY)
+        return mecanum.bodySpeeds(wheels[0], wheels[1], wheels[2], wheels[3],
+            self.wheelToBodyCenterX, self.wheelToBodyCenterY, self.wheelDiameter / 2.0)
+
+    # integrate body velocities into world pose (same equations as Robot.forwardKinematics)
+    def integrate(self, pose, vx, vy, oz):
+        c = np.cos(pose[2])
+        s = np.sin(pose[2])
+        pose[0] += (vx * c - vy * s) * self.dt
+        pose[1] += (vx * s + vy * c) * self.dt
+        pose[2] += oz * self.dt
+
+    # advance all robots by one time step
+    #    vx, vy, oz: body velocity commands (scalars or arrays), limited to the max. speeds of each robot
+    def step(self, vx, vy = 0.0, oz = 0.0):
+        vx = np.clip(vx, -self.maxSpeedX, self.maxSpeedX)
+        vy = np.clip(vy, -self.maxSpeedY, self.maxSpeedY)
+        oz = np.clip(oz, -self.maxSpeedTheta, self.maxSpeedTheta)
+        if self.robotType == config.ROBOT_TYPE_DIFF_DRIVE: vy = 0 * vx
+        self.wheelTarget[:] = self.wheelSpeeds(vx, vy, oz)
+
+        # first-order motor lag
+        self.wheelSpeed += (self.wheelTarget - self.wheelSpeed) * self.motorAlpha
+        if self.noisy:
+            self.wheelMeasured[:] = self.wheelSpeed + self.rng.standard_normal(self.wheelSpeed.shape) * self.speedNoise
+        else:
+            self.wheelMeasured[:] = self.wheelSpeed
+
+        self.velocity[:] = self.bodySpeeds(self.wheelSpeed)
+        self.integrate(self.pose, self.velocity[0], self.velocity[1], self.velocity[2])
+        odoVelX, odoVelY, odoVelTheta = self.bodySpeeds(self.wheelMeasured)
+        self.integrate(self.odoPose, odoVelX, odoVelY, odoVelTheta)
+
+        self.time += self.dt
+        self.steps += 1
+
+    # run simulation for a number of steps
+    #    controller(sim) returns body velocity commands (vx, vy, oz) for all robots
+    def run(self, steps, controller):
+        for i in range(steps):
+            vx, vy, oz = controller(self)
+            self.step(vx, vy, oz)
+
+
+
+# create simulated fleet from a robot database entry (see config.ROBOTS)
+def createFleet(cfg, count, **kwargs):
+    return FleetSimulator(cfg['type'], count,
+        cfg.get('wheelToBodyCenterX', 0.0), cfg['wheelToBodyCenterY'], cfg['wheelDiameter'],
+        cfg['maxSpeedX'], cfg['maxSpeedY'], cfg['maxSpeedTheta'], **kwargs)
+
+
+
+# ----- benchmark -----------------------------------------------------------------------------------
+
+def benchmark(args):
+    robotType, count, steps, seed = args
+    sim = FleetSimulator(robotType, count, wheelToBodyCenterX = 0.25, motorLag = 0.1, speedNoise = 0.01, seed = seed)
+    rng = np.random.default_rng(seed)
+    cmdX = rng.uniform(-0.4, 0.4, count)
+    cmdY = rng.uniform(-0.4, 0.4, count)
+    cmdTheta = rng.uniform(-0.2, 0.2, count)
+    startTime = time.perf_counter()
+    sim.run(steps, lambda s: (cmdX, cmdY, cmdTheta))
+    return count * steps, time.perf_counter() - startTime, sim.time
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    procs = os.cpu_count() or 1
+
+    for robotType, typeName in ((config.ROBOT_TYPE_DIFF_DRIVE, 'diffdrive'), (config.ROBOT_TYPE_MECANUM, 'mecanum')):
+        robotSteps, duration, simTime = benchmark((robotType, count, steps, 0))
+        print(typeName, 'one core:', count, 'robots x', steps, 'steps', round(duration, 3), 'sec',
+            '=>', round(robotSteps / duration), 'robot-steps/s',
+            '(', round(simTime * count / duration), 'x real time )')
+
+        startTime = time.perf_counter()
+        with multiprocessing.Pool(procs) as pool:
+            results = pool.map(benchmark, [(robotType, count, steps, seed) for seed in range(procs)])
+        duration = time.perf_counter() - startTime
+        robotSteps = sum(r[0] for r in results)
+        print(typeName, procs, 'processes:', procs * count, 'robots x', steps, 'steps', round(duration, 3), 'sec',
+            '=>', round(robotSteps / duration), 'robot-steps/s',
+            '(', round(simTime * procs * count / duration), 'x real time )')
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - startup time marks and orchestrated subsystem bring-up
+# records time since process start (and peak RSS) when a subsystem becomes ready,
+# printed as 'startup: <name> time <sec> maxrss <KB>'  (parsed by test/benchstartup.py)
+
+import os
+import resource
+import threading
+import time
+
+
+marks = {}             # name => time since process start (sec)
+importTime = time.time()
+
+
+# time since process start (sec)
+def processUptime():
+    try:
+        # process start time (clock ticks since boot) from /proc  (Linux)
+        with open('/proc/self/stat', 'r') as f:
+            startTicks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - startTicks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time() - importTime
+
+
+def mark(name):
+    if name in marks: return
+    marks[name] = processUptime()
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss   # KB (Linux)
+    print('startup:', name, 'time', round(marks[name], 3), 'maxrss', maxRss, flush=True)
+
+
+
+# orchestrated startup: subsystems (e.g. CAN bus, BLE GATT server, DNN model) are brought up concurrently
+# (one background thread each), readiness is reported per subsystem
+
+STARTING = 'starting'
+READY    = 'ready'
+FAILED   = 'failed'
+
+
+class Subsystem():
+    def __init__(self, name):
+        self.name = name
+        self.state = STARTING
+        self.result = None       # return value of init function (e.g. robot object)
+        self.error = None        # exception raised by init function
+        self.duration = 0        # init duration (sec)
+        self.done = threading.Event()
+
+
+class Bringup():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subsystems = {}
+
+    # start init function of subsystem in background (subsystem is ready when the function returns,
+    # failed if it raises an exception)
+    def start(self, name, func, *args):
+        with self.lock:
+            if name in self.subsystems: return self.subsystems[name]
+            sub = Subsystem(name)
+            self.subsystems[name] = sub
+        threading.Thread(target=self.run, args=(sub, func, args), daemon=True).start()
+        return sub
+
+    # start init function again if subsystem has finished (e.g. to reacquire released resources)
+    def restart(self, name, func, *args):
+        with self.lock:
+            sub = self.subsystems.get(name)
+            if not sub is None and sub.done.is_set(): del self.subsystems[name]
+        return self.start(name, func, *args)
+
+    def run(self, sub, func, args):
+        startTime = time.time()
+        try:
+            sub.result = func(*args)
+            sub.state = READY
+            mark(sub.name)
+        except Exception as e:
+            print('startup:', sub.name, 'failed:', e)
+            sub.error = e
+            sub.state = FAILED
+        sub.duration = time.time() - startTime
+        sub.done.set()
+
+    # state of subsystem (None if not started)
+    def state(self, name):
+        sub = self.subsystems.get(name)
+        return None if sub is None else sub.state
+
+    def ready(self, *names):
+        return all(self.state(name) == READY for name in names)
+
+    def result(self, name):
+        return self.subsystems[name].result
+
+    # wait until subsystems are done, returns True if all are ready
+    def wait(self, *names, timeout = None):
+        endTime = None if timeout is None else time.time() + timeout
+        for name in names:
+            sub = self.subsystems[name]
+            if not sub.done.wait(None if endTime is None else max(0, endTime - time.time())): return False
+        return self.ready(*names)
+
+    def report(self):
+        for name, sub in self.subsystems.items():
+            print('startup:', name, sub.state, '' if sub.state == STARTING else str(round(sub.duration, 2)) + ' sec',
+                '' if sub.error is None else sub.error)
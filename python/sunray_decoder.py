@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+# Sunray App protocol decoder (incremental line parser, works on any BLE write size)
+#
+# Sunray command:  ASCII line  'AT+<cmd>,<arg1>,<arg2>...,0x<crc>'  terminated by '\r' and/or '\n'
+#    crc: sum of all bytes before the last ',' (modulo 256), hex
+#    e.g. 'AT+M,0.20,-0.10,0x11'   (motor: linear speed m/s, angular speed rad/s)
+# answer:  ASCII line  '<answer>,0x<crc>\r\n'   (same checksum), e.g. 'M,0x4d\r\n'
+#
+# commands may arrive split across writes (e.g. 20-byte writes at the default MTU) or several in one write -
+# the decoder only scans newly received bytes for the line end, so long commands are not re-scanned per write.
+# run 'python sunray_decoder.py' for a commands/second benchmark
+
+
+import time
+
+
+MAX_LINE_LEN = 512       # longer lines (garbage, missing line end) are dropped
+
+
+def checksum(data):
+    return sum(data) & 0xff
+
+
+# encode answer line (text without checksum), returns bytes
+def encodeAnswer(text):
+    data = text.encode('ascii')
+    return data + b',0x%02x\r\n' % checksum(data)
+
+
+
+# streaming line decoder
+#    feed() returns list of complete commands: (cmd, args)  e.g. ('M', ('0.20', '-0.10'))
+#    lines with wrong checksum or not starting with 'AT+' are counted and skipped
+
+class SunrayDecoder():
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scanPos = 0          # buffer bytes before scanPos contain no line end
+        self.crcErrors = 0
+        self.droppedLines = 0     # invalid or too long lines
+
+    def reset(self):
+        self.buffer.clear()
+        self.scanPos = 0
+
+    def feed(self, data):
+        commands = []
+        self.buffer += data
+        start = 0
+        pos = self.scanPos
+        while True:
+            end = self.findLineEnd(pos)
+            if end < 0: break
+            if end > start: self.parseLine(bytes(self.buffer[start:end]), commands)
+            start = pos = end + 1
+        if start > 0: del self.buffer[:start]
+        self.scanPos = len(self.buffer)
+        if self.scanPos > MAX_LINE_LEN:
+            self.droppedLines += 1
+            self.reset()
+        return commands
+
+    # position of next '\r' or '\n' at/after pos (-1: none)
+    def findLineEnd(self, pos):
+        cr = self.buffer.find(b'\r', pos)
+        lf = self.buffer.find(b'\n', pos)
+        if cr < 0: return lf
+        if lf < 0: return cr
+        return min(cr, lf)
+
+    def parseLine(self, line, commands):
+        idx = line.rfind(b',')
+        if idx < 1:
+            self.crcErrors += 1
+            return
+        try:
+            crc = int(line[idx+1:], 16)
+        except ValueError:
+            crc = -1
+        if crc != checksum(line[:idx]):
+            self.crcErrors += 1
+            return
+        if not line.startswith(b'AT+') or idx < 4:
+            self.droppedLines += 1
+            return
+        fields = line[3:idx].decode('ascii', 'replace').split(',')
+        commands.append((fields[0], tuple(fields[1:])))
+
+
+
+# ----- benchmark -----------------------------------------------------------------------------
+
+def encodeCommand(text):
+    data = text.encode('ascii')
+    return data + b',0x%02x\n' % checksum(data)
+
+
+def benchmark(chunks, count, label):
+    decoder = SunrayDecoder()
+    decoded = 0
+    startTime = time.perf_counter()
+    for chunk in chunks:
+        decoded += len(decoder.feed(chunk))
+    duration = time.perf_counter() - startTime
+    assert decoded == count, 'decoded ' + str(decoded) + ' of ' + str(count) + ' commands'
+    print(label, ':', count, 'commands', round(duration, 3), 'sec =>', round(count / duration), 'commands/s')
+
+
+if __name__ == "__main__":
+    n = 100000
+    stream = b''.join(encodeCommand('AT+M,%.2f,%.2f' % ((i % 100) / 100.0, -(i % 50) / 100.0)) for i in range(n))
+
+    benchmark([stream[i:i+20] for i in range(0, len(stream), 20)], n, 'split (20-byte writes)')
+    benchmark([stream[i:i+244] for i in range(0, len(stream), 244)], n, 'concatenated (244-byte writes)')
+    # one long command split into many small writes (no re-scan of buffered bytes)
+    longCommand = encodeCommand('AT+W,' + ','.join('%.3f' % (i * 0.001) for i in range(80)))
+    benchmark([longCommand[i:i+1] for i in range(len(longCommand))] * 1000, 1000, 'long command (1-byte writes)')
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - telemetry notifications to the phone (BLE)
+# the latest values (odometry, battery voltage, motor errors, follow-me state...) are coalesced and sent
+# rate-limited, packed into notifications that fill the negotiated ATT MTU (payload = MTU - 3 bytes)
+#
+# notification payload: sequence of records, each starting with its type byte (little-endian values):
+#   0x01 odometry       x, y (float32, m), theta (float16, rad)                       11 bytes
+#   0x02 velocity       vx, vy (float16, m/s), oz (float16, rad/s)                     7 bytes
+#   0x03 battery        voltage (float16, V)                                           3 bytes
+#   0x04 motor errors   count (uint8), count x (nodeId uint8, error uint8)        2 + 2n bytes
+#   0x05 follow-me      state (uint8: 0 = off, 1 = on)                                 2 bytes
+# a record never spans two notifications
+
+
+import asyncio
+import struct
+import threading
+import time
+
+
+TELEMETRY_ODOMETRY     = 0x01
+TELEMETRY_VELOCITY     = 0x02
+TELEMETRY_BATTERY      = 0x03
+TELEMETRY_MOTOR_ERRORS = 0x04
+TELEMETRY_FOLLOW_ME    = 0x05
+
+ATT_HEADER_SIZE = 3     # notification opcode + attribute handle
+DEFAULT_MTU = 23
+
+
+def encodeRecord(name, value):
+    if name == 'odometry':
+        x, y, theta = value
+        return struct.pack('<Bffe', TELEMETRY_ODOMETRY, x, y, theta)
+    elif name == 'velocity':
+        vx, vy, oz = value
+        return struct.pack('<Beee', TELEMETRY_VELOCITY, vx, vy, oz)
+    elif name == 'battery':
+        return struct.pack('<Be', TELEMETRY_BATTERY, value)
+    elif name == 'motorErrors':
+        errors = value[:(DEFAULT_MTU - ATT_HEADER_SIZE - 2) // 2]    # must fit into smallest MTU
+        return struct.pack('<BB', TELEMETRY_MOTOR_ERRORS, len(errors)) + bytes(b for error in errors for b in error)
+    elif name == 'followMe':
+        return struct.pack('<BB', TELEMETRY_FOLLOW_ME, 1 if value else 0)
+    raise ValueError('unknown telemetry value: ' + name)
+
+
+# pack records into as few payloads as possible (each payload <= maxSize)
+def packRecords(records, maxSize):
+    payloads = []
+    payload = b''
+    for record in records:
+        if len(payload) + len(record) > maxSize:
+            payloads.append(payload)
+            payload = b''
+        payload += record
+    if len(payload) > 0: payloads.append(payload)
+    return payloads
+
+
+
+# telemetry publisher (background thread, or 'await publisher.runAsync()' on an event loop if background=False)
+#    app: dabble.Dabble (provides mtu, telemetrySubscribed, telemetryRefreshCount, notifyTelemetry(), notifyPending())
+
+class TelemetryPublisher():
+    def __init__(self, app, rate = 5.0, refreshInterval = 5.0, background = True):
+        self.app = app
+        self.rate = rate                        # max. notification rounds per second
+        self.refreshInterval = refreshInterval  # resend unchanged values every ... sec
+        self.lock = threading.Lock()
+        self.values = {}                        # latest values (coalesced)
+        self.sentRecords = {}                   # last sent record per value
+        self.nextRefreshTime = 0
+        self.refreshCount = 0
+        if background:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    # set latest values (e.g. update(battery=24.1, followMe=True)), only the latest value is sent
+    def update(self, **values):
+        with self.lock:
+            self.values.update(values)
+
+    def run(self):
+        while True:
+            time.sleep(1.0 / self.rate)
+            try:
+                self.publish()
+            except Exception as e:
+                print('telemetry error:', e)
+
+    async def runAsync(self):
+        while True:
+            await asyncio.sleep(1.0 / self.rate)
+            try:
+                self.publish()
+            except Exception as e:
+                print('telemetry error:', e)
+
+    def publish(self):
+        if self.app.telemetryRefreshCount != self.refreshCount:
+            # new subscriber (or a subscriber skipped a round): send everything
+            self.refreshCount = self.app.telemetryRefreshCount
+            self.nextRefreshTime = 0
+        if not self.app.telemetrySubscribed or self.app.notifyPending(): return   # nobody listening / links busy
+        with self.lock:
+            values = dict(self.values)
+        refresh = time.time() > self.nextRefreshTime
+        if refresh: self.nextRefreshTime = time.time() + self.refreshInterval
+        records = []
+        for name, value in values.items():
+            if value is None: continue
+            record = encodeRecord(name, value)
+            if refresh or self.sentRecords.get(name) != record: records.append(record)
+            self.sentRecords[name] = record
+        payloads = packRecords(records, self.app.mtu - ATT_HEADER_SIZE)
+        if len(payloads) > 0: self.app.notifyTelemetry(payloads)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+# idle CPU usage of a ble_server entry point: starts the server, lets it run without phone connection
+# and reports its CPU usage (user + system time of the process incl. all threads) and number of threads
+
+# run on the robot (CAN + BLE hardware needed), from the python folder:
+#   sudo python test/benchidle.py [runtime.py|ble_server2.py] [seconds]
+
+
+import os
+import subprocess
+import sys
+import time
+
+
+WARMUP = 10.0    # sec (startup, camera/DNN preload)
+
+
+def cpuTime(pid):
+    # user + system time (sec) of process
+    with open('/proc/' + str(pid) + '/stat', 'r') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def threadCount(pid):
+    return len(os.listdir('/proc/' + str(pid) + '/task'))
+
+
+def main():
+    script = sys.argv[1] if len(sys.argv) > 1 else 'runtime.py'
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 30.0
+    print('starting', script, '...')
+    proc = subprocess.Popen([sys.executable, '-u', script], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(WARMUP)
+    if proc.poll() is not None:
+        print(script, 'exited with code', proc.returncode)
+        sys.exit(1)
+    startCpu = cpuTime(proc.pid)
+    startTime = time.time()
+    time.sleep(duration)
+    cpu = (cpuTime(proc.pid) - startCpu) / (time.time() - startTime) * 100.0
+    threads = threadCount(proc.pid)
+    proc.kill()
+    proc.wait()
+    print('----- idle (' + script + ', ' + str(duration) + ' sec) -----')
+    print('CPU :', round(cpu, 2), '%')
+    print('threads :', threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# startup time budget for the ble_server entry points:
+# starts the server, waits for its startup marks (see startup.py) and reports time from process start
+# to first CAN frame and to BLE advertising, and peak RSS. Exits with code 1 if the budget is exceeded.
+
+# run on the robot (CAN + BLE hardware needed), from the python folder:
+#   sudo python test/benchstartup.py [ble_server.py|ble_server2.py]
+
+
+import subprocess
+import sys
+import threading
+
+
+# startup budget (time since process start in sec, peak RSS in MB)
+BUDGET = {
+    'firstCanFrame':  2.0,
+    'bleAdvertising': 4.0,
+    'maxRssMB':       80.0,
+}
+
+TIMEOUT = 20.0   # sec
+
+
+def peakRss(pid):
+    # peak resident set size (MB) of running process
+    try:
+        with open('/proc/' + str(pid) + '/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'): return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def main():
+    script = sys.argv[1] if len(sys.argv) > 1 else 'ble_server.py'
+    print('starting', script, '...')
+    proc = subprocess.Popen([sys.executable, '-u', script], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    marks = {}
+    done = threading.Event()
+
+    def reader():
+        for line in proc.stdout:
+            # startup: <name> time <sec> maxrss <KB>
+            fields = line.split()
+            if len(fields) == 6 and fields[0] == 'startup:':
+                marks[fields[1]] = float(fields[3])
+                print(line.rstrip())
+            if 'firstCanFrame' in marks and 'bleAdvertising' in marks: break
+        done.set()
+
+    threading.Thread(target=reader, daemon=True).start()
+    done.wait(TIMEOUT)
+    rss = peakRss(proc.pid)
+    proc.kill()
+    proc.wait()
+
+    ok = True
+    print('----- startup budget (' + script + ') -----')
+    for name in ('firstCanFrame', 'bleAdvertising'):
+        if not name in marks:
+            print(name, ': not reached within', TIMEOUT, 'sec  => FAIL')
+            ok = False
+            continue
+        over = marks[name] > BUDGET[name]
+        print(name, ':', round(marks[name], 3), 'sec  (budget', BUDGET[name], 'sec)', ' => FAIL' if over else '')
+        ok = ok and not over
+    if rss is None:
+        print('peak RSS : unknown')
+    else:
+        over = rss > BUDGET['maxRssMB']
+        print('peak RSS :', round(rss, 1), 'MB  (budget', BUDGET['maxRssMB'], 'MB)', ' => FAIL' if over else '')
+        ok = ok and not over
+    print('OK' if ok else 'budget exceeded')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
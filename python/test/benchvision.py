@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+# offline vision pipeline benchmark (no camera needed): pushes a fixed dataset through
+# capture -> preprocess (blobFromImage) -> inference (forward) -> post-process and reports per-stage timings and FPS.
+# stability check: --save stores the detections of each frame as a baseline (JSON), --compare checks the detections
+# against a baseline (after code, model or backend changes) and exits with code 1 if they differ.
+
+# run from the python folder:
+#   python test/benchvision.py [--source synthetic:100|video.mp4|imagedir] [--backend auto|cpu|cuda] [--size 300]
+#       [--threads 0] [--save baseline.json | --compare baseline.json] [--iou 0.8] [--confidence 0.05]
+
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import cv2
+import numpy as np
+
+import detect_object
+import framesource
+import tracker
+
+
+STAGES = ('capture', 'preprocess', 'inference', 'postprocess')
+
+
+# detection array => JSON list:  [classId, confidence, x1, y1, x2, y2]
+def toJson(detections):
+    return [[int(d['classId']), round(float(d['confidence']), 4)] + [round(float(d[key]), 4) for key in ('x1', 'y1', 'x2', 'y2')]
+        for d in detections]
+
+
+# differences of one frame: detections without a match (same class, IoU >= minIou, confidence within maxConfidenceDiff)
+def compareFrame(baseline, current, minIou, maxConfidenceDiff):
+    if len(baseline) == 0 or len(current) == 0: return max(len(baseline), len(current))
+    a = np.array([d[2:] for d in baseline], float)
+    b = np.array([d[2:] for d in current], float)
+    overlap = tracker.iou(a, b)
+    unmatched = list(range(len(current)))
+    differences = 0
+    for i, d in enumerate(baseline):
+        match = None
+        for j in unmatched:
+            if current[j][0] == d[0] and overlap[i, j] >= minIou and abs(current[j][1] - d[1]) <= maxConfidenceDiff:
+                match = j
+                break
+        if match is None: differences += 1
+        else: unmatched.remove(match)
+    return differences + len(unmatched)
+
+
+def main(args):
+    source = framesource.openSource(args.source)
+    if not isinstance(source, framesource.FrameSource):
+        print('offline source needed (video file, image directory or synthetic)')
+        sys.exit(1)
+    if not source.start():
+        print('error opening source', args.source)
+        sys.exit(1)
+    detect_object.loadModel(args.backend, args.size, args.threads)
+    model = detect_object.model
+    size = detect_object.inputSize
+    classMask = detect_object.classFilter(args.filter.split(',') if args.filter else None)
+
+    times = dict((stage, []) for stage in STAGES)
+    frames = []
+    startTime = time.perf_counter()
+    while True:
+        t = time.perf_counter()
+        result = source.wait()
+        if result is None: break
+        image = result[0]
+        times['capture'].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        blob = cv2.dnn.blobFromImage(image, size=(size, size), swapRB=True)
+        times['preprocess'].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        model.setInput(blob)
+        output = model.forward()
+        times['inference'].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        detections = detect_object.postProcess(output, classMask)
+        times['postprocess'].append(time.perf_counter() - t)
+        frames.append(toJson(detections))
+    duration = time.perf_counter() - startTime
+
+    if len(frames) == 0:
+        print('no frames in', args.source)
+        sys.exit(1)
+    ms = lambda s: round(s * 1000.0, 2)
+    print('----- vision pipeline (' + args.source + ', ' + str(len(frames)) + ' frames, backend ' + str(detect_object.backendName) +
+        ', input ' + str(size) + ', threads ' + str(cv2.getNumThreads()) + ') -----')
+    for stage in STAGES:
+        values = sorted(times[stage])
+        print(stage.ljust(12), ': mean', ms(sum(values) / len(values)), 'ms  p50', ms(values[len(values) // 2]),
+            'ms  p95', ms(values[int(len(values) * 0.95)]), 'ms  max', ms(values[-1]), 'ms')
+    print('total        :', round(len(frames) / duration, 1), 'FPS', ' detections', sum(len(frame) for frame in frames))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({ 'source': args.source, 'backend': detect_object.backendName, 'size': size, 'frames': frames }, f)
+        print('baseline saved to', args.save)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if len(baseline['frames']) != len(frames):
+            print('stability: FAILED (baseline has', len(baseline['frames']), 'frames)')
+            sys.exit(1)
+        differences = [compareFrame(b, c, args.iou, args.confidence) for b, c in zip(baseline['frames'], frames)]
+        changed = sum(1 for d in differences if d > 0)
+        print('stability:', 'OK' if changed == 0 else 'FAILED', '(' + str(changed), 'of', len(frames), 'frames changed,',
+            sum(differences), 'detections differ, baseline backend', str(baseline['backend']) + ', input', str(baseline['size']) + ')')
+        if changed > 0: sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='offline vision pipeline benchmark')
+    parser.add_argument('--source', default='synthetic:100', help='video file, image directory or synthetic[:frames]')
+    parser.add_argument('--backend', default=detect_object.DNN_BACKEND, help='DNN backend (auto, ' + ', '.join(detect_object.BACKENDS) + ')')
+    parser.add_argument('--size', type=int, default=detect_object.DNN_INPUT_SIZE, help='network input size')
+    parser.add_argument('--threads', type=int, default=detect_object.DNN_THREADS, help='OpenCV threads (0: default)')
+    parser.add_argument('--filter', default='', help='class names (comma separated, default: all)')
+    parser.add_argument('--save', help='save detections as baseline (JSON)')
+    parser.add_argument('--compare', help='compare detections with baseline (JSON)')
+    parser.add_argument('--iou', type=float, default=0.8, help='min. IoU of matching detections')
+    parser.add_argument('--confidence', type=float, default=0.05, help='max. confidence difference of matching detections')
+    main(parser.parse_args())
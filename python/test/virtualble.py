@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+# virtual BLE harness for the Dabble/Sunray GATT server (no Bluetooth hardware needed):
+# dabble.Dabble and a scripted GATT client (the 'phone') run on bumble virtual controllers connected by a LocalLink.
+# The client replays synthetic or recorded joystick packets at a given rate, a consumer thread reads the input
+# like the robot main loop (waitInput). Reports dropped writes, parse throughput and callback-to-consumer latency.
+
+# run from the python folder:
+#   python test/virtualble.py [--app dabble|sunray] [--rate 100] [--count 2000] [--batch 1] [--file recording.txt]
+#      rate: writes per second (0: as fast as possible),  batch: packets per write
+#      recording: one write per line as hex bytes (e.g. 'ff01020102000800')
+
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bumble.controller import Controller
+from bumble.device import Device, Peer
+from bumble.hci import Address
+from bumble.link import LocalLink
+from bumble.transport.common import AsyncPipeSink
+
+import dabble
+import dabble_decoder as dd
+import sunray_decoder as sd
+
+
+SERVER_ADDRESS = 'F0:F1:F2:F3:F4:F5'
+CLIENT_ADDRESS = 'F0:F1:F2:F3:F4:F6'
+
+
+# synthetic input packets (one per write unless batched)
+def syntheticPackets(app, count):
+    packets = []
+    for i in range(count):
+        if app == dabble.APP_SUNRAY:
+            packets.append(sd.encodeCommand('AT+M,%.2f,%.2f' % ((i % 100) / 100.0, -(i % 50) / 100.0)))
+        else:
+            # analog joystick (angle/radius changes with every packet)
+            packets.append(bytes([dd.FRAME_START, dd.GAMEPAD_MODULE_ID, dd.GAMEPAD_JOYSTICK, 1, 2, 0, (i % 200) + 1, dd.FRAME_END]))
+    return packets
+
+
+def readRecording(fileName):
+    with open(fileName, 'r') as f:
+        return [bytes.fromhex(line.strip()) for line in f if line.strip() and not line.startswith('#')]
+
+
+# number of input snapshots expected from packets (one per gamepad frame / Sunray motor command)
+def expectedInputs(app, packets):
+    decoder = sd.SunrayDecoder() if app == dabble.APP_SUNRAY else dd.DabbleDecoder()
+    count = 0
+    for packet in packets:
+        for frame in decoder.feed(packet):
+            if app == dabble.APP_SUNRAY: count += frame[0] == 'M'
+            else: count += frame[0] == dd.GAMEPAD_MODULE_ID
+    return count
+
+
+# reads input snapshots like the robot main loop, records publish-to-pickup latency
+class Consumer():
+    def __init__(self, app):
+        self.app = app
+        self.latencies = []
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        lastSeq = self.app.input.seq
+        while not self.stopEvent.is_set():
+            state = self.app.waitInput(lastSeq, 0.1)
+            if state.seq == lastSeq: continue
+            self.latencies.append(time.monotonic() - state.time)
+            lastSeq = state.seq
+
+    def stop(self):
+        self.stopEvent.set()
+        self.thread.join()
+
+
+def percentile(values, q):
+    if len(values) == 0: return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main(args):
+    link = LocalLink()
+    serverController = Controller('robot', link=link, public_address=SERVER_ADDRESS)
+    clientController = Controller('phone', link=link, public_address=CLIENT_ADDRESS)
+
+    # robot: GATT server
+    app = dabble.Dabble(serverController, 'owlRobot', SERVER_ADDRESS, args.app, background=False)
+    serverTask = asyncio.create_task(app.run())
+    while not app.advertising.is_set(): await asyncio.sleep(0.01)
+    if not app.error is None: raise app.error
+
+    # phone: GATT client
+    client = Device.with_hci('phone', Address(CLIENT_ADDRESS), clientController, AsyncPipeSink(clientController))
+    await client.power_on()
+    connection = await client.connect(Address(SERVER_ADDRESS))
+    peer = Peer(connection)
+    await peer.request_mtu(args.mtu)
+    await peer.discover_services()
+    await peer.discover_characteristics()
+    uuid = dabble.UUID_SUNRAY_CHAR_TX_RX if args.app == dabble.APP_SUNRAY else dabble.UUID_CHAR_TX
+    characteristic = peer.get_characteristics_by_uuid(uuid)[0]
+
+    packets = readRecording(args.file) if args.file else syntheticPackets(args.app, args.count)
+    writes = [b''.join(packets[i:i+args.batch]) for i in range(0, len(packets), args.batch)]
+    expected = expectedInputs(args.app, packets)
+    session = list(app.sessions.values())[0]
+    # warm-up write (phone becomes driver)
+    await peer.write_value(characteristic, writes[0], with_response=args.app == dabble.APP_DABBLE)
+    await asyncio.sleep(0.1)
+    startWrites = session.link.writes
+    startSeq = app.input.seq
+    consumer = Consumer(app)
+
+    # replay
+    interval = 1.0 / args.rate if args.rate > 0 else 0
+    failed = 0
+    startTime = time.monotonic()
+    for i, data in enumerate(writes):
+        if interval > 0:
+            delay = startTime + i * interval - time.monotonic()
+            if delay > 0: await asyncio.sleep(delay)
+        try:
+            await peer.write_value(characteristic, data, with_response=args.app == dabble.APP_DABBLE)
+        except Exception:
+            failed += 1
+    # wait until server is idle
+    for i in range(100):
+        if app.input.seq - startSeq >= expected: break
+        await asyncio.sleep(0.01)
+    duration = time.monotonic() - startTime
+    await asyncio.sleep(0.2)
+    consumer.stop()
+
+    received = session.link.writes - startWrites
+    inputs = app.input.seq - startSeq
+    ms = lambda s: None if s is None else round(s * 1000.0, 3)
+    print('----- virtual BLE (' + args.app + ', ' + str(args.rate) + ' writes/s, batch ' + str(args.batch) + ') -----')
+    print('writes      : sent', len(writes), 'received', received, 'dropped', len(writes) - received, 'failed', failed)
+    print('inputs      : expected', expected, 'published', inputs, 'consumed (coalesced)', len(consumer.latencies),
+        'decoder dropped bytes', getattr(session.decoder, 'droppedBytes', 0))
+    print('throughput  :', round(inputs / duration), 'inputs/s', round(received / duration), 'writes/s')
+    print('latency (ms): callback-to-consumer p50', ms(percentile(consumer.latencies, 0.5)),
+        'p95', ms(percentile(consumer.latencies, 0.95)), 'max', ms(percentile(consumer.latencies, 1.0)))
+    print('link        :', session.link.summary())
+
+    await connection.disconnect()
+    serverTask.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='virtual BLE harness for the Dabble/Sunray GATT server')
+    parser.add_argument('--app', default=dabble.APP_DABBLE, choices=(dabble.APP_DABBLE, dabble.APP_SUNRAY))
+    parser.add_argument('--rate', type=float, default=100.0, help='writes per second (0: as fast as possible)')
+    parser.add_argument('--count', type=int, default=2000, help='synthetic packets')
+    parser.add_argument('--batch', type=int, default=1, help='packets per write')
+    parser.add_argument('--mtu', type=int, default=247, help='requested ATT MTU')
+    parser.add_argument('--file', help='recorded writes (hex, one per line)')
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get('BUMBLE_LOGLEVEL', 'WARNING').upper())
+    asyncio.run(main(args))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - input-to-actuation latency tracing
+#
+# trace points along the joystick => wheel path, each tagged with the input sequence number (dabble.InputState.seq)
+# and a monotonic timestamp (time.monotonic_ns):
+#    write        BLE write arrived (Dabble.my_custom_write / sunray_write)
+#    published    input snapshot published (decoded)
+#    pickup       control loop picked up the snapshot
+#    kinematics   wheel speeds computed (setRobotSpeed)
+#    canEnqueue   first velocity frame handed to the CAN socket (bus.send returned)
+#    canTx        own velocity frame echoed by the CAN controller (frame on the bus)
+#    feedback     first measured wheel speed change reported by a motor driver
+# stage latencies (difference to the previous point) are aggregated into log-scale histograms.
+#
+# enable:  OWL_TRACE=trace.csv  python ble_server2.py   (report printed and traces exported to CSV at exit)
+# run 'python tracepoints.py trace.csv' to print the report of an exported file
+
+
+import atexit
+import collections
+import math
+import os
+import sys
+import threading
+import time
+
+
+POINTS = ('write', 'published', 'pickup', 'kinematics', 'canEnqueue', 'canTx', 'feedback')
+
+# stage name => (start point, end point)
+STAGES = collections.OrderedDict((
+    ('bleCallback',   ('write', 'published')),
+    ('controlPickup', ('published', 'pickup')),
+    ('kinematics',    ('pickup', 'kinematics')),
+    ('canEnqueue',    ('kinematics', 'canEnqueue')),
+    ('canTx',         ('canEnqueue', 'canTx')),
+    ('feedback',      ('canTx', 'feedback')),
+    ('inputToCan',    ('write', 'canTx')),           # end-to-end
+    ('inputToWheel',  ('write', 'feedback')),        # end-to-end
+))
+
+MAX_TRACES = 10000      # traces kept for export (oldest are dropped)
+
+exportFile = os.environ.get('OWL_TRACE')
+enabled = not exportFile is None
+
+
+def now():
+    return time.monotonic_ns()
+
+
+
+# log-scale latency histogram (4 buckets per factor 2, from 1 us)
+class Histogram():
+    BUCKETS_PER_OCTAVE = 4
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, ns):
+        us = max(ns, 1000) / 1000.0
+        self.counts[int(math.log2(us) * self.BUCKETS_PER_OCTAVE)] += 1
+        self.count += 1
+        self.total += ns
+        self.min = ns if self.min is None else min(self.min, ns)
+        self.max = ns if self.max is None else max(self.max, ns)
+
+    # upper bound of the bucket containing quantile q (ns)
+    def percentile(self, q):
+        if self.count == 0: return None
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank: return min(self.max, 2 ** ((bucket + 1) / self.BUCKETS_PER_OCTAVE) * 1000.0)
+        return self.max
+
+    def summary(self):
+        ms = lambda ns: None if ns is None else round(ns / 1e6, 3)
+        return { 'count': self.count, 'mean': ms(self.total / self.count) if self.count > 0 else None,
+            'min': ms(self.min), 'p50': ms(self.percentile(0.5)), 'p95': ms(self.percentile(0.95)),
+            'p99': ms(self.percentile(0.99)), 'max': ms(self.max) }
+
+
+
+class Tracer():
+    def __init__(self, maxTraces = MAX_TRACES):
+        self.lock = threading.Lock()
+        self.traces = collections.OrderedDict()    # seq => { point: ns }
+        self.maxTraces = maxTraces
+        self.histograms = collections.OrderedDict((stage, Histogram()) for stage in STAGES)
+
+    # record trace point for input 'seq' (first time wins), 't': timestamp (ns) if taken earlier
+    def point(self, name, seq, t = None):
+        if t is None: t = now()
+        with self.lock:
+            trace = self.traces.get(seq)
+            if trace is None:
+                trace = self.traces[seq] = {}
+                if len(self.traces) > self.maxTraces: self.traces.popitem(last=False)
+            if name in trace: return
+            trace[name] = t
+            for stage, (start, end) in STAGES.items():
+                if (end == name and start in trace) or (start == name and end in trace):
+                    self.histograms[stage].add(trace[end] - trace[start])
+
+    def report(self):
+        print('----- latency (ms) -----')
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                if histogram.count > 0: print(stage, histogram.summary())
+
+    # export traces as CSV:  seq, then one column per point (ns, empty if not reached)
+    def export(self, fileName):
+        with self.lock:
+            traces = list(self.traces.items())
+        with open(fileName, 'w') as f:
+            f.write('seq,' + ','.join(POINTS) + '\n')
+            for seq, trace in traces:
+                f.write(str(seq) + ',' + ','.join(str(trace.get(name, '')) for name in POINTS) + '\n')
+        print('trace: exported', len(traces), 'inputs to', fileName)
+
+
+tracer = Tracer()
+
+
+# record trace point (no-op unless tracing is enabled or seq is None)
+def point(name, seq, t = None):
+    if not enabled or seq is None: return
+    tracer.point(name, seq, t)
+
+
+def finish():
+    tracer.report()
+    tracer.export(exportFile)
+
+
+if enabled: atexit.register(finish)
+
+
+
+if __name__ == "__main__":
+    # report of exported trace file
+    if len(sys.argv) < 2:
+        print('usage: tracepoints.py <trace.csv>')
+        exit()
+    offline = Tracer(maxTraces = sys.maxsize)
+    with open(sys.argv[1], 'r') as f:
+        names = f.readline().strip().split(',')[1:]
+        for line in f:
+            fields = line.strip().split(',')
+            for name, value in zip(names, fields[1:]):
+                if value != '': offline.point(name, int(fields[0]), int(value))
+    offline.report()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+# owlRobotics robot platform  - lightweight multi-object tracker (follow-me)
+#
+# DNN detections (detect_object.DETECTION_DTYPE, normalized image coordinates) are associated with tracks by IoU,
+# each track filters its box center with a constant-velocity Kalman filter (state: cx, cy, vx, vy).
+# detections may arrive late and at a lower rate than the camera: a track keeps its state at the time of its last
+# detection and is extrapolated to any time (estimate at camera rate, between detections).
+# the follow-me target keeps its track id while several persons are in view.
+#
+# usage:
+#    tracker.update(detections, captureTime)     # for each detection result
+#    target = tracker.target(time.monotonic())   # Track (or None), target.estimate(t) => cx, cy, topY
+#    tracker.detectionInterval(t)                # adaptive detection interval (sec)
+#
+# run 'python tracker.py' for a simulation (two crossing persons, detection every Nth frame)
+
+
+import sys
+import time
+import numpy as np
+
+
+IOU_THRESHOLD = 0.2        # min. overlap of predicted track box and detection box
+MAX_AGE = 1.0              # remove track without detection for this time (sec)
+MIN_HITS = 2               # detections until a track is confirmed (can become target)
+PROCESS_NOISE = 0.5        # acceleration noise (image widths/s^2)
+MEASUREMENT_NOISE = 0.02   # detection center noise (image widths)
+DETECT_INTERVAL_MIN = 0.0  # detection interval without (stable) target (sec, 0: as fast as possible)
+DETECT_INTERVAL_MAX = 0.5  # detection interval for a slow, stable target (sec)
+VELOCITY_REF = 0.5         # target speed halving the detection interval (image widths/s)
+
+H = np.array([[1.0, 0, 0, 0], [0, 1.0, 0, 0]])    # measurement: center position
+
+
+# intersection over union of boxes a (n, 4) and b (m, 4):  x1, y1, x2, y2  =>  (n, m)
+def iou(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areaA = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    areaB = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / np.maximum(areaA[:, None] + areaB[None, :] - intersection, 1e-9)
+
+
+def transition(dt):
+    F = np.eye(4)
+    F[0, 2] = F[1, 3] = dt
+    return F
+
+
+# white noise acceleration model
+def processNoise(dt):
+    q = PROCESS_NOISE ** 2
+    Q = np.zeros((4, 4))
+    Q[0, 0] = Q[1, 1] = q * dt ** 3 / 3
+    Q[0, 2] = Q[2, 0] = Q[1, 3] = Q[3, 1] = q * dt ** 2 / 2
+    Q[2, 2] = Q[3, 3] = q * dt
+    return Q
+
+
+
+class Track():
+    def __init__(self, trackId, detection, t):
+        self.id = trackId
+        self.classId = int(detection['classId'])
+        self.confidence = float(detection['confidence'])
+        self.x = np.array([detection['cx'], detection['cy'], 0.0, 0.0])
+        self.P = np.diag([MEASUREMENT_NOISE ** 2, MEASUREMENT_NOISE ** 2, 1.0, 1.0])   # velocity unknown
+        self.size = np.array([detection['x2'] - detection['x1'], detection['y2'] - detection['y1']], float)
+        self.time = t           # time of state (last detection)
+        self.hits = 1
+
+    # state extrapolated to time t:  x, P
+    def predict(self, t):
+        dt = max(0.0, t - self.time)
+        F = transition(dt)
+        return F @ self.x, F @ self.P @ F.T + processNoise(dt)
+
+    # estimated box center and top at time t:  cx, cy, topY
+    def estimate(self, t):
+        x = self.predict(t)[0]
+        return x[0], x[1], x[1] - self.size[1] / 2
+
+    def box(self, t):
+        x = self.predict(t)[0]
+        return np.array([x[0] - self.size[0] / 2, x[1] - self.size[1] / 2, x[0] + self.size[0] / 2, x[1] + self.size[1] / 2])
+
+    def speed(self):
+        return float(np.hypot(self.x[2], self.x[3]))
+
+    def area(self):
+        return float(self.size[0] * self.size[1])
+
+    # Kalman correction with detection captured at time t
+    def update(self, detection, t):
+        if t < self.time: return    # older than state
+        x, P = self.predict(t)
+        z = np.array([detection['cx'], detection['cy']])
+        S = H @ P @ H.T + np.eye(2) * MEASUREMENT_NOISE ** 2
+        K = P @ H.T @ np.linalg.inv(S)
+        self.x = x + K @ (z - H @ x)
+        self.P = (np.eye(4) - K @ H) @ P
+        self.size += 0.5 * (np.array([detection['x2'] - detection['x1'], detection['y2'] - detection['y1']]) - self.size)
+        self.confidence = float(detection['confidence'])
+        self.time = t
+        self.hits += 1
+
+
+
+class Tracker():
+    def __init__(self, iouThreshold = IOU_THRESHOLD, maxAge = MAX_AGE, minHits = MIN_HITS):
+        self.iouThreshold = iouThreshold
+        self.maxAge = maxAge
+        self.minHits = minHits
+        self.tracks = []
+        self.nextId = 1
+        self.targetId = None
+        self.lastDetectionTime = None
+
+    # associate detections (captured at time t) with tracks, create/remove tracks
+    def update(self, detections, t):
+        self.lastDetectionTime = t
+        unmatched = list(range(len(detections)))
+        if len(self.tracks) > 0 and len(detections) > 0:
+            trackBoxes = np.array([track.box(t) for track in self.tracks])
+            detectionBoxes = np.stack([detections['x1'], detections['y1'], detections['x2'], detections['y2']], axis=1)
+            overlap = iou(trackBoxes, detectionBoxes)
+            sameClass = np.array([track.classId for track in self.tracks])[:, None] == detections['classId'][None, :]
+            overlap[~sameClass] = 0
+            # greedy: best overlapping pairs first
+            matchedTracks = set()
+            for index in np.argsort(-overlap, axis=None):
+                i, j = np.unravel_index(index, overlap.shape)
+                if overlap[i, j] < self.iouThreshold: break
+                if i in matchedTracks or not j in unmatched: continue
+                self.tracks[i].update(detections[j], t)
+                matchedTracks.add(i)
+                unmatched.remove(j)
+        for j in unmatched:
+            self.tracks.append(Track(self.nextId, detections[j], t))
+            self.nextId += 1
+        self.tracks = [track for track in self.tracks if t - track.time <= self.maxAge]
+
+    def confirmed(self, t):
+        return [track for track in self.tracks if track.hits >= self.minHits and t - track.time <= self.maxAge]
+
+    # follow-me target (keeps its id while tracked, otherwise the largest, i.e. nearest, confirmed track)
+    def target(self, t):
+        tracks = self.confirmed(t)
+        for track in tracks:
+            if track.id == self.targetId: return track
+        if len(tracks) == 0:
+            self.targetId = None
+            return None
+        track = max(tracks, key=Track.area)
+        self.targetId = track.id
+        return track
+
+    # adaptive detection interval: fast without stable target, slower the slower the target moves
+    def detectionInterval(self, t):
+        target = self.target(t)
+        if target is None: return DETECT_INTERVAL_MIN
+        return DETECT_INTERVAL_MAX / (1.0 + target.speed() / VELOCITY_REF)
+
+
+
+if __name__ == "__main__":
+    # two persons crossing in front of the camera (30 fps), detections every Nth frame with noise and inference delay
+    import detect_object
+    every = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = np.random.default_rng(1)
+    fps = 30.0
+    delay = 0.1        # inference latency (sec)
+
+    def persons(t):
+        # center x, center y (normalized), both 0.2 wide, 0.6 high
+        return [(0.2 + 0.15 * t, 0.5), (0.8 - 0.15 * t, 0.55)]
+
+    tracker = Tracker()
+    person = None          # index of the person the target follows
+    targetId = None
+    switches = 0
+    errorsTracked = []
+    errorsHeld = []
+    lastDetections = None
+    pending = []
+    computeTime = 0
+    updates = 0
+    for frame in range(int(4.0 * fps)):
+        t = frame / fps
+        if frame % every == 0:
+            detections = np.zeros(2, detect_object.DETECTION_DTYPE)
+            for i, (cx, cy) in enumerate(persons(t)):
+                cx += rng.normal(0, 0.01)
+                cy += rng.normal(0, 0.01)
+                detections[i] = (1, 0.9, cx - 0.1, cy - 0.3, cx + 0.1, cy + 0.3, cx, cy)
+            pending.append((t + delay, t, detections))
+        while len(pending) > 0 and pending[0][0] <= t:
+            arrival, captureTime, lastDetections = pending.pop(0)
+            startTime = time.perf_counter()
+            tracker.update(lastDetections, captureTime)
+            computeTime += time.perf_counter() - startTime
+            updates += 1
+        target = tracker.target(t)
+        if target is None: continue
+        cx = target.estimate(t)[0]
+        if person is None: person = int(np.argmin([abs(p[0] - cx) for p in persons(t)]))
+        if not targetId is None and target.id != targetId: switches += 1
+        targetId = target.id
+        trueCx = persons(t)[person][0]
+        errorsTracked.append(abs(cx - trueCx))
+        errorsHeld.append(abs(lastDetections['cx'][person] - trueCx))    # without tracker: last detection (identity known)
+    print('----- tracker simulation (detection every', every, 'frames, delay', delay, 'sec) -----')
+    print('target switches :', switches, ' followed person', person, 'at end nearest', int(np.argmin([abs(p[0] - cx) for p in persons(t)])))
+    print('center error    : tracked', round(float(np.mean(errorsTracked)), 4), ' last detection', round(float(np.mean(errorsHeld)), 4))
+    print('update time (us):', round(computeTime / max(1, updates) * 1e6, 1))